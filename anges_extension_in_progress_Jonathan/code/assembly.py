@@ -7,33 +7,39 @@ from collections import deque
 # Function to assembly a realizable genome, given a set of adjacencies and RSIs.
 # Arguments:
 #   hom_fams: list of HomFam objects.
-#   adjacencies: IntervalDict
-#   RSIs: IntervalDict
+#   adjacencies: IntervalSelection - see intervals.IntervalStore
+#   RSIs: IntervalSelection
 #   species: String - the species name of the assembled genome.
 # Output:
 #   hom_fams: a list of HomFam objects that define the assembled genome. The
-#             markers are oriented and not doubled.
+#             markers are oriented and not doubled, in the order of their
+#             families (see markers.FAMILY_NAMES).
+# Each CAR is started from the unexplored adjacency, or then RSI, with the
+# smallest key (see intervals.interval_key), and numbered in that order. The
+# CARs, their orientation and their numbers therefore only depend on the
+# intervals and on the order of the families in the input, not on the order
+# of the selections.
 def assemble( hom_fams, adjacencies, RSIs, species ):
     # Preparation:
-    # Create dict of new hom_fams (keyed by IDs) for easy access while adding
-    # loci. To be converted to list at the end of this algorithm.
+    # Create dict of new hom_fams (keyed by family index) for easy access
+    # while adding loci. To be converted to list at the end of this algorithm.
     hom_fam_dict = {}
     # Keep track of the multiplicity of the markers.
     multiplicity = {}
     for hom_fam in hom_fams:
         multiplicity[ hom_fam.id ] = hom_fam.copy_number
-    # Create an IntervalDict for adjacencies to be explored, that only contain
-    # unique markers.
-    adjs_to_explore = intervals.IntervalDict()
+    # Select the adjacencies to be explored, that only contain unique markers.
+    adjs_to_explore = adjacencies.copy()
     for adj in adjacencies.itervalues():
-        if ( multiplicity[ adj.marker_ids[0] ] == 1 and
-                multiplicity[ adj.marker_ids[-1] ] == 1 ):
-            adjs_to_explore.add( adj )
-    # Create a copy of the RSIs IntervalDict, so we can also keep track of
-    # which RSIs have been used.
-    RSIs_to_explore = intervals.IntervalDict()
-    for RSI in RSIs.itervalues():
-        RSIs_to_explore.add( RSI )
+        if not ( multiplicity[ adj.marker_ids[0] ] == 1 and
+                 multiplicity[ adj.marker_ids[-1] ] == 1 ):
+            del adjs_to_explore[ adj.marker_ids ]
+    # Copy the selection of RSIs, so we can also keep track of which RSIs have
+    # been used.
+    RSIs_to_explore = RSIs.copy()
+    # Intervals to start CARs from, in key order.
+    adj_starts = starts( adjs_to_explore )
+    RSI_starts = starts( RSIs_to_explore )
 
     # Main loop:
     current_chromosome = 1
@@ -41,11 +47,11 @@ def assemble( hom_fams, adjacencies, RSIs, species ):
         # Prepare to assemble a single CAR.
         Q = deque()
         if adjs_to_explore:
-            adj = next( adjs_to_explore.itervalues() )
+            adj = next_start( adj_starts, adjs_to_explore )
             Q.appendleft( adj )
             del adjs_to_explore[ adj.marker_ids ]
         else:
-            RSI = next( RSIs_to_explore.itervalues() )
+            RSI = next_start( RSI_starts, RSIs_to_explore )
             Q.appendleft( RSI )
             del RSIs_to_explore[ RSI.marker_ids ]
         CAR = deque()
@@ -107,8 +113,9 @@ def assemble( hom_fams, adjacencies, RSIs, species ):
             if sibling != CAR_list[ i + 1 ]:
                 continue
             undoubled = markers.from_doubled( marker )
-            if not undoubled in hom_fam_dict:
-                hom_fam_dict[ undoubled ] = markers.HomFam(
+            family = marker >> 1
+            if not family in hom_fam_dict:
+                hom_fam_dict[ family ] = markers.HomFam(
                     undoubled,                     # ID
                     [],                         # Loci
                     multiplicity[ marker ],     # Copy number
@@ -127,9 +134,29 @@ def assemble( hom_fams, adjacencies, RSIs, species ):
                 orientation,                    # Orientation
                 ''                              # Comment
                 )
-            hom_fam_dict[ undoubled ].loci.append( locus )
+            hom_fam_dict[ family ].loci.append( locus )
             current_position += 2
         current_chromosome += 1
 
-    hom_fams = hom_fam_dict.values()
+    hom_fams = [ hom_fam_dict[ family ] for family in sorted( hom_fam_dict ) ]
     return hom_fams
+
+
+# Function to get the intervals of a selection in reverse key order (see
+# intervals.interval_key), so that the next one to start a CAR from is the
+# last one.
+def starts( selection ):
+    answer = list( selection.itervalues() )
+    answer.sort( key = lambda I: intervals.interval_key( I.marker_ids ), reverse = True )
+    return answer
+
+# Function to get the next interval to start a CAR from: the first one in key
+# order still in the selection. The intervals already explored are dropped
+# from candidates.
+# Arguments:
+#   candidates: list of Interval - see starts
+#   selection: IntervalSelection - the intervals left to explore, not empty
+def next_start( candidates, selection ):
+    while not candidates[-1].marker_ids in selection:
+        candidates.pop()
+    return candidates.pop()
@@ -0,0 +1,158 @@
+import random
+import sys
+
+from data_structures import weights
+from data_structures.c1p_files import bm
+
+# Check of the compact row store of binary matrices (bm.RowStore) against the
+# original BinaryMatrix.from_file, which parsed each line into a Row or XRow.
+#
+# Random matrix files are written with rows in the three line formats, with
+# telomere rows, X rows, positions and blank lines, and read with float or
+# exact weights (see weights.set_exact). Each line is read into a Row or XRow
+# as the original from_file did (with its 'P start end' parsing fixed) and
+# into a BinaryMatrix with BinaryMatrix._read_lines. Both must give
+# the same rows, also after the same random edits of the list of rows
+# (deletions, insertions, assignments and slices, as the C1P code does).
+#
+# Usage: python bm_check.py [cases [seed]]
+
+
+# Function to build a random matrix line.
+# Arguments:
+#    number: int - number of the row
+# Output:
+#    str
+def random_line( number ):
+    columns = [ str( column ) for column in random.sample( xrange( 40 ), random.randint( 1, 6 ) ) ]
+    if random.random() < 0.2:
+        columns += [ "X" ] + [ str( column ) for column in random.sample( xrange( 40, 60 ), random.randint( 0, 3 ) ) ]
+    if random.random() < 0.2:
+        columns.insert( random.randint( 0, len( columns ) ), "T" )
+    if random.random() < 0.2:
+        start = random.randint( 0, 1000 )
+        columns += [ "P", str( start ), str( start + random.randint( 0, 100 ) ) ]
+    weight = random.choice( [ "1", "0.5", "2.25", repr( random.random() ) ] )
+    species = ",".join( random.sample( [ "A", "B", "C", "D" ], random.randint( 0, 3 ) ) )
+    kind = random.random()
+    if kind < 0.6:
+        return "%d|%s;%s:%s" % ( number, weight, species, " ".join( columns ) )
+    elif kind < 0.8:
+        return "%d|%s:%s" % ( number, species, " ".join( columns ) )
+    return "%s\t%s" % ( weight, " ".join( columns ) )
+
+# Function to parse a line as the original BinaryMatrix.from_file did.
+# Output:
+#    Row or XRow
+def original_row( line ):
+    tok = line.split()
+    first = tok[0].split( '|' )
+    isT = False
+    pos = None
+    if len( first ) > 1:
+        ident = first[0]
+        first = first[1].split( ';' )
+        if len( first ) > 1:
+            weight = weights.parse( first[0] )
+            first = first[1].split( ':' )
+        else:
+            weight = weights.parse( '0.0' )
+            first = first[0].split( ':' )
+        sp = first[0].split( ',' )
+        tok[0] = first[1]
+    else:
+        ident = '0'
+        weight = weights.parse( tok[0] )
+        sp = []
+        del tok[0]
+    if sp == [ '' ]:
+        sp = []
+    X = -1
+    i = 0
+    while i < len( tok ):
+        try:
+            tok[i] = int( tok[i] )
+        except ValueError:
+            if tok[i] == 'T':
+                isT = True
+                del tok[i]
+                i -= 1
+            elif tok[i] == 'X':
+                X = i
+                del tok[i]
+                i -= 1
+            elif tok[i] == 'P':
+                pos = [ int( tok[ i + 1 ] ), int( tok[ i + 2 ] ) ]
+                del tok[ i : i + 3 ]
+                i -= 1
+        i += 1
+    if X == -1:
+        row = bm.Row( set( tok ), ident, weight, sp, isT )
+    else:
+        row = bm.XRow( set( tok[ 0 : X ] ), set( tok[ X : ] ), ident, weight, sp, isT )
+    row._pos = pos
+    return row
+
+# Function to list rows in a comparable form.
+def row_list( rows ):
+    return [ ( row._id, row._weight, row._sp, row._isT, row._isX, row._set,
+               getattr( row, "_Xs", None ), row._pos, str( row ) ) for row in rows ]
+
+# Function to apply the same random edits to two lists of rows.
+# Arguments:
+#    rows: list of Row/XRow
+#    store: RowStore with the same rows
+def edit( rows, store ):
+    for _ in xrange( random.randint( 0, 5 ) ):
+        action = random.randrange( 4 )
+        j = random.randrange( len( rows ) + 1 )
+        if action == 0 and j < len( rows ):
+            del rows[j]
+            del store[j]
+        elif action == 1:
+            row = bm.Row( set( [ j ] ), "new", weights.zero(), [], False )
+            rows.append( row )
+            store.append( row )
+        elif action == 2 and j < len( rows ):
+            rows[j], store[j] = rows[-1], store[-1]
+        else:
+            k = random.randint( j, len( rows ) )
+            if row_list( rows[ j : k ] ) != row_list( store[ j : k ] ):
+                return False
+    return True
+
+# Function to check the row store on random matrices.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    for case in xrange( cases ):
+        lines = []
+        for number in xrange( random.randint( 1, 20 ) ):
+            if random.random() < 0.1:
+                lines.append( "\n" )
+            lines.append( random_line( number + 1 ) + "\n" )
+        weights.set_exact( random.random() < 0.5 )
+        try:
+            matrix = bm.BinaryMatrix()
+            matrix._read_lines( lines )
+            rows = [ original_row( line ) for line in lines if line != "\n" ]
+            ok = ( matrix._height == len( rows ) and row_list( matrix ) == row_list( rows ) and
+                   edit( rows, matrix._rows ) and row_list( matrix ) == row_list( rows ) )
+        finally:
+            weights.set_exact( False )
+        if not ok:
+            print "case %d: %s instead of %s" % ( case, [ str( row ) for row in matrix ],
+                                                  [ str( row ) for row in rows ] )
+            failed += 1
+    return failed
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 1000
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )
@@ -12,7 +12,7 @@ import stak
 
 import math
 import copy
-from decimal import *
+from data_structures import weights
 
 #######################################################
 #    bab.py
@@ -84,13 +84,13 @@ class Logger:
 
 # applies the branch and bound methodology to find the minumum conflicting set of rows of a matrix, m,
 # with the consecutive-ones property using best_score as
-# the best score up till now
-# m - bm.Matrix, prop - bool, tester - Tester, best_score - decimal.Decimal
+# the best score up till now (zero by default). Scores are compared with weights.greater.
+# m - bm.Matrix, prop - bool, tester - Tester, best_score - float (Decimal in exact mode, see weights)
 # return - list of set; the rows that are optimal to remove
-def branch_and_bound(m, prop, tester, best_score = Decimal('0')):
+def branch_and_bound(m, prop, tester, best_score = None):
 	unused = []		# list of the current rows to remove
 	best_unused = []		# list of the optimal rows to remove so far
-	score = Decimal('0')		# current score
+	score = weights.zero()		# current score
 	stack = stak.Stack()		# job stack
 #	min_C1P_sets = []		# list of minimal rows removed that make C1P sets
 	st = 0		# start of removable rows
@@ -98,7 +98,13 @@ def branch_and_bound(m, prop, tester, best_score = Decimal('0')):
 	leaves = 0		# leaves processed / cut
 		
 	# find start of removable rows
-	while st < m._height and m.get_row_info(st)._weight > Decimal('10'):
+	if best_score == None:
+		best_score = weights.zero()
+	#endif
+	
+	ten = weights.parse('10')
+	
+	while st < m._height and m.get_row_info(st)._weight > ten:
 		tester.test(m.get_row_info(st), Job(st, False, False))
 		
 		st += 1
@@ -110,7 +116,7 @@ def branch_and_bound(m, prop, tester, best_score = Decimal('0')):
 #	if prop:
 #		score_left = Decimal('0')
 #	else:
-	score_left = sum([m.get_row_info(i)._weight for i in xrange(st, m._height)]) 
+	score_left = sum([m.get_row_info(i)._weight for i in xrange(st, m._height)], weights.zero()) 
 #	#endif
 		
 	# put first row on stack
@@ -121,7 +127,7 @@ def branch_and_bound(m, prop, tester, best_score = Decimal('0')):
 	while r != None:	
 		# done
 		if r._row == m._height:
-			if best_score < score: #or best_score == Decimal('0'):		# this should always be true but check ayways
+			if weights.greater(score, best_score): #or best_score == 0:		# this should always be true but check ayways
 				# check that unused is a minimum conflicting set
 #				nC1P = True
 			
@@ -149,7 +155,7 @@ def branch_and_bound(m, prop, tester, best_score = Decimal('0')):
 #					print math.exp(best_score)
 #				else:
 #				print ''
-				print str(best_score)
+				print weights.to_string(best_score)
 				sys.stdout.flush()
 #				print ''
 #				#endif
@@ -178,7 +184,7 @@ def branch_and_bound(m, prop, tester, best_score = Decimal('0')):
 #					#endif
 				#endif
 			else:
-				if (score_left + score > best_score):
+				if weights.greater(score_left + score, best_score):
 #					if not prop:
 					score_left = score_left - row._weight
 #					#endif
@@ -188,7 +194,7 @@ def branch_and_bound(m, prop, tester, best_score = Decimal('0')):
 					
 					if r._rem:		# remove r
 						# true if path is traversible so far
-						ad = ((score + score_left) > best_score)# or best_score == Decimal('0')	
+						ad = weights.greater(score + score_left, best_score)# or best_score == 0	
 
 						if ad:
 							unused.append(r._row)
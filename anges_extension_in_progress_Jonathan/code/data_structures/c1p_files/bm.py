@@ -3,8 +3,10 @@
 # Contact: Cedric Chauve (Dept. Mathematics, Simon Fraser University), cedric.chauve@sfu.ca
 
 import sort
-from decimal import *
+import array
 from data_structures import intervals
+from data_structures import markers
+from data_structures import weights
 
 
 #######################################################
@@ -21,7 +23,7 @@ class Row:
 	#
 	# s: set of columns that have a one - set of int
 	# ident: the id of the row - str
-	# weight: the weight of the row - decimal.Decimal
+	# weight: the weight of the row - float (Decimal in exact mode, see weights)
 	# sp: list of species that realizes the row - list of str
 	# isT: True if the row is a telomere - bool
 	def __init__(self, s, ident, weight, sp, isT):
@@ -39,7 +41,7 @@ class Row:
 	#
 	# return: string repesentation of the Row - str
 	def __str__(self):
-		s = self._id + '|' + str(self._weight) + ';'
+		s = self._id + '|' + weights.to_string(self._weight) + ';'
 					
 		for p in xrange(len(self._sp)):
 			s = s + self._sp[p]
@@ -64,7 +66,7 @@ class Row:
 		#endif
 		
 		if self._pos != None:
-			s = s + 'P ' + str(pos[0]) + ' ' + str(pos[1])
+			s = s + 'P ' + str(self._pos[0]) + ' ' + str(self._pos[1])
 		#endif
 		
 		return s
@@ -78,7 +80,7 @@ class XRow:
 	# s: set of columns that have a one - set of int
 	# Xs: set of columns that have an X - set of int
 	# ident: the id of the row - str
-	# weight: the weight of the row - decimal.Decimal
+	# weight: the weight of the row - float (Decimal in exact mode, see weights)
 	# sp: list of species that realizes the row - list of str
 	# isT: True if the row is a telomere - bool
 	def __init__(self, s, Xs, ident, weight, sp, isT):
@@ -97,7 +99,7 @@ class XRow:
 	#
 	# return: string repesentation of the XRow - str
 	def __str__(self):
-		s = self._id + '|' + str(self._weight) + ';'
+		s = self._id + '|' + weights.to_string(self._weight) + ';'
 					
 		for p in xrange(len(self._sp)):
 			s = s + self._sp[p]
@@ -132,7 +134,7 @@ class XRow:
 		#endif
 		
 		if self._pos != None:
-			s = s + 'P ' + str(pos[0]) + ' ' + str(pos[1])
+			s = s + 'P ' + str(self._pos[0]) + ' ' + str(self._pos[1])
 		#endif
 		
 		return s
@@ -158,6 +160,207 @@ def size_comp(a, b):
 	return len(a._set) < len(b._set)
 #enddef
 
+# compact storage of the rows of a binary/ternary matrix, used for matrices read from text
+#
+# the rows read are kept in flat arrays (compressed sparse rows): the columns of row r are
+# _columns[_offsets[r]:_offsets[r + 1]], its X columns (if any) start at _x_offsets[r]
+# weights and species lists are stored once in tables and referred to by index
+# the store behaves as the list of rows of a BinaryMatrix: the Row/XRow of a stored row is
+# only created when it is first accessed, any Row/XRow can also be added or set directly
+class RowStore:
+	# creates a new empty RowStore
+	def __init__(self):
+		self._columns = array.array('l')		# columns of all the rows read, one row after the other
+		self._offsets = array.array('l', [0])		# start of each row read in _columns
+		self._x_offsets = array.array('l')		# start of the X columns of each row read, -1 if not an X row
+		self._ids = []		# id of each row read
+		self._weights = array.array('l')		# index in _weight_table of each row read
+		self._weight_table = []		# distinct weights - list of float (Decimal in exact mode, see weights)
+		self._weight_index = {}		# index in _weight_table of each weight string
+		self._species = array.array('l')		# index in _species_table of each row read
+		self._species_table = []		# distinct species lists - list of tuple of str
+		self._species_index = {}		# index in _species_table of each species string
+		self._telomeres = array.array('b')		# 1 if the row read is a telomere
+		self._positions = {}		# position of the rows read that have one
+		self._rows = []		# rows of the matrix in order - Row/XRow, or int (index of a row read)
+	#enddef
+	
+	# parses a line in the file format of BinaryMatrix.from_file and appends its row
+	#
+	# line: the row - str
+	#
+	# return: True if a row was added (False for blank lines) - bool
+	def add_line(self, line):
+		tok = line.split()
+		
+		if not tok:
+			return False
+		#endif
+		
+		first = tok[0].split('|')
+		
+		if len(first) > 1:		# standard
+			ident = first[0]
+			first = first[1].split(';')
+			
+			if len(first) > 1:
+				weight = first[0]
+				first = first[1].split(':')
+			else:		# weightless
+				weight = '0.0'
+				first = first[0].split(':')
+			#endif
+			
+			sp = first[0]
+			tok[0] = first[1]
+			start = 0
+		else:		# old (testing only)
+			ident = '0'
+			weight = tok[0]
+			sp = ''
+			start = 1
+		#endif
+		
+		if ident == '-1':
+			ident = str(len(self._rows))
+		#endif
+		
+		row = len(self._ids)
+		columns = self._columns
+		x_offset = -1
+		isT = 0
+		i = start
+		
+		if i < len(tok) and tok[i] == '':
+			i += 1
+		#endif
+		
+		# most rows only have columns, convert them all at once
+		if 'T' not in tok and 'X' not in tok and 'P' not in tok:
+			columns.extend(map(int, tok[i:]))
+			i = len(tok)
+		#endif
+		
+		while i < len(tok):
+			t = tok[i]
+			
+			if t == 'T':
+				isT = 1
+			elif t == 'X':
+				x_offset = len(columns)
+			elif t == 'P':
+				self._positions[row] = [int(tok[i + 1]), int(tok[i + 2])]
+				
+				i += 2
+			elif t != '':
+				columns.append(int(t))
+			#endif
+			
+			i += 1
+		#endwhile
+		
+		w = self._weight_index.get(weight)
+		
+		if w == None:
+			w = len(self._weight_table)
+			self._weight_index[weight] = w
+			self._weight_table.append(weights.parse(weight))
+		#endif
+		
+		p = self._species_index.get(sp)
+		
+		if p == None:
+			p = len(self._species_table)
+			self._species_index[sp] = p
+			self._species_table.append(tuple(sp.split(',')) if sp != '' else ())
+		#endif
+		
+		self._offsets.append(len(columns))
+		self._x_offsets.append(x_offset)
+		self._ids.append(ident)
+		self._weights.append(w)
+		self._species.append(p)
+		self._telomeres.append(isT)
+		self._rows.append(row)
+		
+		return True
+	#enddef
+	
+	# creates the Row/XRow of a row read
+	#
+	# row: index of the row read - int
+	#
+	# return: the row - Row/XRow
+	def _make_row(self, row):
+		start = self._offsets[row]
+		end = self._offsets[row + 1]
+		x = self._x_offsets[row]
+		weight = self._weight_table[self._weights[row]]
+		sp = list(self._species_table[self._species[row]])
+		isT = self._telomeres[row] == 1
+		
+		if x == -1:
+			r = Row(set(self._columns[start:end]), self._ids[row], weight, sp, isT)
+		else:
+			r = XRow(set(self._columns[start:x]), set(self._columns[x:end]), self._ids[row], weight, sp, isT)
+		#endif
+		
+		r._pos = self._positions.get(row)
+		
+		return r
+	#enddef
+	
+	# gets the jth row, or a list of rows for a slice
+	#
+	# j: index of the row - int/slice
+	#
+	# return: the row(s) - Row/XRow or list of Row/XRow
+	def __getitem__(self, j):
+		if isinstance(j, slice):
+			return [self[k] for k in xrange(*j.indices(len(self._rows)))]
+		#endif
+		
+		r = self._rows[j]
+		
+		if type(r) is int:
+			r = self._make_row(r)
+			self._rows[j] = r
+		#endif
+		
+		return r
+	#enddef
+	
+	# sets the jth row(s), j: int/slice, row: Row/XRow or list of Row/XRow
+	def __setitem__(self, j, row):
+		self._rows[j] = row
+	#enddef
+	
+	# removes the jth row(s), j: int/slice
+	def __delitem__(self, j):
+		del self._rows[j]
+	#enddef
+	
+	# adds a row at the end, row: Row/XRow
+	def append(self, row):
+		self._rows.append(row)
+	#enddef
+	
+	def __len__(self):
+		return len(self._rows)
+	#enddef
+	
+	# iterates over the rows, creating them as needed
+	def __iter__(self):
+		j = 0
+		
+		while j < len(self._rows):
+			yield self[j]
+			
+			j += 1
+		#endwhile
+	#enddef
+#endclass
+
 # stores a binary matrix in a sparse representation
 class BinaryMatrix:
 	# creates a new empty BinaryMatrix
@@ -215,7 +418,7 @@ class BinaryMatrix:
 
 		i = 1
 		lines = []
-		for key, value in adjacencies.ints.iteritems():
+		for key, value in sorted(adjacencies.ints.iteritems()):
 			# print value.loci
 			for locus in value.loci:
 				list_of_species.append(locus.getSpecies())
@@ -225,88 +428,15 @@ class BinaryMatrix:
 				line = line + species + ","
 			line = line[:-1] + ":"
 			for marker_id in value.marker_ids:
-				line = line + str(int(marker_id[:-2])) + " "
+				line = line + str(int(markers.from_doubled(marker_id))) + " "
 			line = line[:-1]
 			lines.append(line)
 			# add row
 			list_of_species = []
 			i = i + 1
 
-		for line in lines:
-			tok = line.split()
-			first = tok[0].split('|')
-			isT = False
-			pos = None
-									
-			if len(first) > 1:		# standard				
-				ident = first[0]
-				first = first[1].split(';')
-								
-				if len(first) > 1:
-					weight = Decimal(first[0])
-					
-					first = first[1].split(':')
-				else:		# weightless
-					weight = Decimal('0.0')
-											
-					first = first[0].split(':')
-				# endif
-			
-				sp = first[0].split(',')
-				tok[0] = first[1]	
-			else:		# old (testing only)
-				ident = '0'
-				weight = Decimal(tok[0])
-				sp = []
-				
-				del tok[0]
-			#endif
-			
-			if sp == ['']:
-				sp = []
-			#endif
-		
-			X = -1
-			i = 0
-		
-			while i < len(tok):
-				try:
-					tok[i] = int(tok[i])
-				except ValueError:
-					if (tok[i] == 'T'):
-						isT = True
-						
-						del tok[i]
-						
-						i -= 1
-					elif(tok[i] == 'X'):
-						X = i
-						
-						del tok[i]
-						
-						i -= 1
-					elif(tok[i] == 'P'):
-						pos = [tok[i+1], tok[i+2]]
-						
-						del tok[i]
-						del tok[i+1]
-						del tok[i+2]
-						
-						i -= 1
-					#endif
-				#endtry
-				
-				i += 1
-			#endwhile
-		
-			if X == -1:
-				self.add_row(set(tok), ident, weight, sp, isT)					
-			else:
-				self.add_row_info(XRow(set(tok[0:X]), set(tok[X:]), ident, weight, sp, isT))
-			#endif
-			
-			self._rows[-1]._pos = pos
-
+		self._read_lines(lines)
+	#enddef
 
 	# reads a Binary Matrix in from file with file name, file_name, where each line is a row in the matrix
 	# there are 3 different formats accepted for lines
@@ -318,87 +448,34 @@ class BinaryMatrix:
 	# file_name: the file name of the binary matrix - str
 	def from_file(self, file_name):
 		f = file(file_name, 'r')
-		line = f.readline()
-		
-		while line != '':
-			if line != '\n':			
-				tok = line.split()
-				first = tok[0].split('|')
-				isT = False
-				pos = None
-										
-				if len(first) > 1:		# standard				
-					ident = first[0]
-					first = first[1].split(';')
-									
-					if len(first) > 1:
-						weight = Decimal(first[0])
-						
-						first = first[1].split(':')
-					else:		# weightless
-						weight = Decimal('0.0')
-												
-						first = first[0].split(':')
-					# endif
-				
-					sp = first[0].split(',')
-					tok[0] = first[1]	
-				else:		# old (testing only)
-					ident = '0'
-					weight = Decimal(tok[0])
-					sp = []
-					
-					del tok[0]
-				#endif
-				
-				if sp == ['']:
-					sp = []
-				#endif
-			
-				X = -1
-				i = 0
+		
+		try:
+			self._read_lines(f)
+		finally:
+			f.close()
+		#endtry
+	#enddef
+	
+	# appends rows given as lines in the file format (see from_file) to the matrix
+	# the rows are stored in a RowStore, Row/XRow objects are only created when accessed
+	#
+	# lines: the rows - iterable of str
+	def _read_lines(self, lines):
+		if not isinstance(self._rows, RowStore):
+			store = RowStore()
 			
-				while i < len(tok):
-					try:
-						tok[i] = int(tok[i])
-					except ValueError:
-						if (tok[i] == 'T'):
-							isT = True
-							
-							del tok[i]
-							
-							i -= 1
-						elif(tok[i] == 'X'):
-							X = i
-							
-							del tok[i]
-							
-							i -= 1
-						elif(tok[i] == 'P'):
-							pos = [tok[i+1], tok[i+2]]
-							
-							del tok[i]
-							del tok[i+1]
-							del tok[i+2]
-							
-							i -= 1
-						#endif
-					#endtry
-					
-					i += 1
-				#endwhile
+			for r in self._rows:
+				store.append(r)
+			#endfor
 			
-				if X == -1:
-					self.add_row(set(tok), ident, weight, sp, isT)					
-				else:
-					self.add_row_info(XRow(set(tok[0:X]), set(tok[X:]), ident, weight, sp, isT))
-				#endif
-				
-				self._rows[-1]._pos = pos
+			self._rows = store
+		#endif
+		
+		for line in lines:
+			if self._rows.add_line(line):
+				self._height += 1
 			#endif
-			
-			line = f.readline()
-		#endwhile
+		#endfor
 	#enddef
 	
 	# gets the jth row (starting at 0)
@@ -423,13 +500,17 @@ class BinaryMatrix:
 	#
 	# row: set of columns with a 1 - set of int
 	# ident: id of the row - str
-	# weight: weight of the row - decimal.Decimal
+	# weight: weight of the row - float, zero by default
 	# sp: species that realize the row - list of string
 	# isT: True if the row is a telomere - bool
-	def add_row(self, row, ident = '-1', weight = Decimal('0'), sp = [], isT = False):
+	def add_row(self, row, ident = '-1', weight = None, sp = [], isT = False):
 		if ident == '-1':
 			ident = str(self._height)
 		#endif
+		
+		if weight == None:
+			weight = weights.zero()
+		#endif
 	
 		self._rows.append(Row(row, ident, weight, sp, isT))
 			
@@ -497,5 +578,3 @@ class BinaryMatrix:
 	#enddef
 #endclass
 
-# set decimal precision
-getcontext().prec = 20
@@ -158,8 +158,8 @@ class MasterC1P:
             sys.exit(-1)
         #endif
 
-        if self.acs_weight!=1 and not self.acs_file_provided:
-            print("ERROR: weighting ACS by linear interpolation is mandatory currently ")
+        if self.acs_weight not in (0, 1) and not self.acs_file_provided:
+            print("ERROR: ACS are weighted by their number of loci (0) or by linear interpolation (1)")
             sys.exit(-1)
         #endif    
 
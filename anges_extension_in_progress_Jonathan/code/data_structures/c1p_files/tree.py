@@ -4,6 +4,7 @@
 
 import sys
 import copy
+import itertools
 
 #######################################################
 #    tree.py
@@ -12,6 +13,9 @@ import copy
 #
 #######################################################
 
+# numbers the vertices in creation order, see Vertex.__hash__
+vertex_numbers = itertools.count()
+
 # vertex of a directed graph / tree / list
 class Vertex:
 	# creates a new Vertex
@@ -19,6 +23,7 @@ class Vertex:
 	def __init__(self, val):
 		self._value = val		# value of the node
 		self._edges = set([])		# the set of neighbours/children of the node
+		self._number = next(vertex_numbers)	# creation number of the vertex
 		
 	#enddef
 	
@@ -34,8 +39,10 @@ class Vertex:
 		self._edges.remove(vert)
 	#enddef
 	
+	# the creation number rather than the address, so that the edges are
+	# visited in the same order in every run
 	def __hash__(self):
-		return id(self)
+		return self._number
 	#enddef
 #endclass
 
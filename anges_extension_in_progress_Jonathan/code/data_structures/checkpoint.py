@@ -0,0 +1,119 @@
+import os
+import hashlib
+import cPickle
+
+import marker_cache
+
+# Checkpoints of the phases of a MasterScript run.
+#
+# After each phase the state of the run is pickled to the output directory
+# (checkpoint_<phase>), preceded by the key of the phase:
+#   header line        CHECKPOINT_MAGIC
+#   pickled str        key of the phase
+#   pickled object     state of the run after the phase
+# The key of a phase combines the SHA-1 of the input files with the
+# configuration options that the phase and all earlier phases depend on, so a
+# later run resumes from the latest phase whose inputs did not change.
+
+CHECKPOINT_MAGIC = "ANGES-CHECKPOINT 5\n"
+CHECKPOINT_PREFIX = "checkpoint_"
+
+# (phase name, configuration options it depends on), in run order. Each phase
+# also depends on the options of the phases before it.
+PHASES = [ ( "markers", [ "markers_doubled",
+                          "markers_unique",
+                          "markers_universal",
+                          "markers_overlap",
+                          "filter_copy_number",
+                          "filter_by_id",
+                          "species_pairs_from_tree",
+                          "species_pairs_per_clade" ] ),
+           ( "adjacencies", [ "all_match",
+                             "interval_support",
+                             "acs_weight",
+                             "acs_sci",
+                             "acs_mci",
+                             "acs_aci",
+                             "exact_weights",
+                             "intervals_index" ] ),
+           ( "intervals", [ "matching_verify" ] ) ]
+
+PHASE_NAMES = [ phase for phase, _ in PHASES ]
+
+
+# Function to compute the keys of all the phases of a run.
+# Arguments:
+#   file_names: list of str - the input files of the run
+#   options: dict - configuration options, must contain those in PHASES
+# Output:
+#   dict of str - hex digest keyed by phase name
+def phase_keys( file_names, options ):
+    digest = hashlib.sha1( CHECKPOINT_MAGIC )
+    for file_name in file_names:
+        marker_cache.update_digest( digest, file_name )
+    keys = {}
+    for phase, phase_options in PHASES:
+        for option in phase_options:
+            digest.update( repr( ( option, options[ option ] ) ) )
+        keys[ phase ] = digest.copy().hexdigest()
+    return keys
+
+# Function to get the checkpoint file name of a phase.
+def checkpoint_file( directory, phase ):
+    return os.path.join( directory, CHECKPOINT_PREFIX + phase )
+
+# Function to store the state of a run after a phase. The file is written
+# under a temporary name first so that an interrupted run never leaves a
+# truncated checkpoint behind.
+# Arguments:
+#   directory: str - the output directory of the run
+#   phase: str - name of the phase that was completed
+#   key: str - key of the phase, see phase_keys
+#   state: object - anything that can be pickled
+def write_checkpoint( directory, phase, key, state ):
+    file_name = checkpoint_file( directory, phase )
+    file_stream = open( file_name + ".tmp", 'wb' )
+    try:
+        file_stream.write( CHECKPOINT_MAGIC )
+        cPickle.dump( key, file_stream, cPickle.HIGHEST_PROTOCOL )
+        cPickle.dump( state, file_stream, cPickle.HIGHEST_PROTOCOL )
+    finally:
+        file_stream.close()
+    os.rename( file_name + ".tmp", file_name )
+
+# Function to read the state of a run after a phase.
+# Arguments:
+#   directory: str - the output directory of the run
+#   phase: str - name of the phase
+#   key: str - key of the phase, see phase_keys
+# Output:
+#   the stored state, or None if there is no valid checkpoint for this key.
+def read_checkpoint( directory, phase, key ):
+    try:
+        file_stream = open( checkpoint_file( directory, phase ), 'rb' )
+    except IOError:
+        return None
+    try:
+        if file_stream.readline() != CHECKPOINT_MAGIC:
+            return None
+        if cPickle.load( file_stream ) != key:
+            return None
+        return cPickle.load( file_stream )
+    except ( EOFError, ValueError, AttributeError, ImportError,
+             cPickle.UnpicklingError ):
+        return None
+    finally:
+        file_stream.close()
+
+# Function to find the latest phase with a valid checkpoint.
+# Arguments:
+#   directory: str - the output directory of the run
+#   keys: dict of str - keys of the phases, see phase_keys
+# Output:
+#   (phase name, state), or (None, None) if no checkpoint is valid.
+def latest_checkpoint( directory, keys ):
+    for phase in reversed( PHASE_NAMES ):
+        state = read_checkpoint( directory, phase, keys[ phase ] )
+        if state != None:
+            return phase, state
+    return None, None
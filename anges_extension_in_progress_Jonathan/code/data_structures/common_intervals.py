@@ -0,0 +1,383 @@
+import bisect
+
+import markers
+import intervals
+
+# Common intervals of k genomes.
+#
+# A common interval is a set of at least two markers that are contiguous on a
+# chromosome of every genome, in any order. Only the markers found exactly
+# once in every genome are used, the others are ignored as if they were
+# removed from the genomes. Intervals are given by the positions i..j of
+# their markers on a chromosome of the first genome, [i, j].
+#
+# Strong common intervals are those that overlap no other common interval
+# (they form a tree, the common intervals being the strong ones and the
+# unions of consecutive children of their linear nodes). Maximal common
+# intervals are those contained in no other one, they are disjoint.
+#
+# The intervals are enumerated from their generator (Bergeron, Chauve, de
+# Montgolfier and Raffinot, Computing common intervals of K permutations):
+# right[i], the largest j such that [i, j] is common, and left[j], the
+# smallest such i. Overlapping common intervals have a common intersection,
+# so [i, j] is common if and only if j <= right[i] and left[j] <= i. The
+# generator is computed with the algorithm of Uno and Yagiura (Fast
+# algorithms to enumerate all common intervals of two permutations), on the
+# sum over the genomes of max - min - (j - i), max and min being the largest
+# and the smallest positions in the genome of the markers at positions i..j
+# of the first one: the sum is 0 exactly for the common intervals.
+
+# Kinds of common intervals.
+STRONG = "strong"
+MAXIMAL = "maximal"
+ALL = "all"
+KINDS = [ STRONG, MAXIMAL, ALL ]
+
+
+# Function to compute right[i] for every position of a chromosome (see
+# above): the positions are scanned from right to left, keeping the right
+# ends j that can still be those of common intervals, in increasing order of
+# the sum. A right end is dropped when the sum is larger than for a larger
+# right end, it stays larger for every smaller left end.
+# Arguments:
+#    positions: list of sequences of int - for each genome but the first one,
+#               the positions in the genome of the markers of the chromosome.
+#               Positions of different chromosomes must not be consecutive.
+#    length: int - number of markers of the chromosome
+# Output:
+#    list of int - right[i]
+def right_ends( positions, length ):
+    count = len( positions )
+    # For each genome, stacks of the largest and smallest positions of
+    # i..j as step functions of j: the steps start at the (negated) j in
+    # *_starts, ascending, and have the values in *_values.
+    max_starts = [ [] for _ in positions ]
+    max_values = [ [] for _ in positions ]
+    min_starts = [ [] for _ in positions ]
+    min_values = [ [] for _ in positions ]
+    stacks = zip( max_starts, max_values, min_starts, min_values )
+
+    # Sum for [i, j], with the stacks of i.
+    def total( i, j ):
+        answer = -count * ( j - i )
+        for max_start, max_value, min_start, min_value in stacks:
+            answer += max_value[ bisect.bisect_left( max_start, -j ) ] - \
+                      min_value[ bisect.bisect_left( min_start, -j ) ]
+        return answer
+
+    right = [ 0 ] * length
+    # Negated right ends, ascending.
+    candidates = []
+    for i in xrange( length - 1, -1, -1 ):
+        # Right ends where the change of the sum from i+1 to i changes.
+        breaks = []
+        for g in xrange( count ):
+            value = positions[ g ][ i ]
+            max_start = max_starts[ g ]
+            max_value = max_values[ g ]
+            while max_value and max_value[-1] < value:
+                breaks.append( -max_start.pop() )
+                max_value.pop()
+            if max_start:
+                breaks.append( -max_start[-1] )
+            max_start.append( -i )
+            max_value.append( value )
+            min_start = min_starts[ g ]
+            min_value = min_values[ g ]
+            while min_value and min_value[-1] > value:
+                breaks.append( -min_start.pop() )
+                min_value.pop()
+            if min_start:
+                breaks.append( -min_start[-1] )
+            min_start.append( -i )
+            min_value.append( value )
+        candidates.append( -i )
+
+        # The sum kept its order between the breaks, drop the right ends just
+        # before a break with a larger sum than the one after it.
+        for j in breaks:
+            after = bisect.bisect_right( candidates, -j ) - 1
+            if after < 0:
+                continue
+            after_total = total( i, -candidates[ after ] )
+            while after + 1 < len( candidates ) and \
+                    total( i, -candidates[ after + 1 ] ) > after_total:
+                del candidates[ after + 1 ]
+
+        # The sums are 0 for a suffix of the candidates, i itself included.
+        low = 0
+        high = len( candidates ) - 1
+        while low < high:
+            middle = ( low + high ) // 2
+            if total( i, -candidates[ middle ] ) == 0:
+                high = middle
+            else:
+                low = middle + 1
+        right[ i ] = -candidates[ low ]
+    return right
+
+
+# Table answering minimum (or maximum) queries over ranges of a sequence in
+# constant time (sparse table).
+class Range_table:
+
+    # Constructor
+    # values: list of int
+    # function: min or max
+    def __init__( self, values, function ):
+        self.function = function
+        self.levels = [ list( values ) ]
+        width = 1
+        while 2 * width <= len( values ):
+            previous = self.levels[-1]
+            self.levels.append( [ function( previous[k], previous[k + width] )
+                                  for k in xrange( len( values ) - 2 * width + 1 ) ] )
+            width *= 2
+
+    # Function to get the minimum (maximum) of values[first..last].
+    def query( self, first, last ):
+        level = ( last - first + 1 ).bit_length() - 1
+        values = self.levels[ level ]
+        return self.function( values[ first ], values[ last - ( 1 << level ) + 1 ] )
+
+    # Function to find the first position at or after first with a value
+    # smaller than bound, for a table of minimums.
+    # Output:
+    #    int - the position, len(values) if there is none
+    def first_below( self, first, bound ):
+        # Skip the blocks of values not below bound, largest first.
+        position = first
+        for level in xrange( len( self.levels ) - 1, -1, -1 ):
+            values = self.levels[ level ]
+            if position < len( values ) and values[ position ] >= bound:
+                position += 1 << level
+        return position
+
+
+# Common intervals of genomes, see above.
+class Common_intervals:
+
+    # Constructor
+    # genomes: list of Genome - at least two genomes, the positions of the
+    #          intervals are those of the first one
+    def __init__( self, genomes ):
+        self.genomes = genomes
+        counts = {}
+        for genome in genomes:
+            for chrom in genome.chromosomes.itervalues():
+                for marker_id in chrom.ids:
+                    counts[ marker_id ] = counts.get( marker_id, 0 ) + 1
+        # Markers found in every genome, but not twice in one of them.
+        shared = set( marker_id for marker_id, count in counts.iteritems()
+                      if count == len( genomes ) )
+        for genome in genomes:
+            seen = set()
+            for chrom in genome.chromosomes.itervalues():
+                for marker_id in chrom.ids:
+                    if marker_id in seen:
+                        shared.discard( marker_id )
+                    seen.add( marker_id )
+
+        # For each genome, the position of each shared marker (positions of
+        # two chromosomes are one apart) and its (chromosome, index).
+        self.places = []
+        positions = []
+        for genome in genomes:
+            place = {}
+            position = {}
+            p = 0
+            for key, chrom in genome.chromosomes.iteritems():
+                for index, marker_id in enumerate( chrom.ids ):
+                    if marker_id in shared:
+                        place[ marker_id ] = ( key, index )
+                        position[ marker_id ] = p
+                        p += 1
+                p += 1
+            self.places.append( place )
+            positions.append( position )
+
+        # Chromosomes of the first genome: (key, marker IDs, right, left).
+        self.chromosomes = []
+        for key, chrom in genomes[0].chromosomes.iteritems():
+            ids = [ marker_id for marker_id in chrom.ids if marker_id in shared ]
+            if len( ids ) < 2:
+                continue
+            others = [ [ position[ marker_id ] for marker_id in ids ]
+                       for position in positions[1:] ]
+            right = right_ends( others, len( ids ) )
+            reverse = right_ends( [ list( reversed( p ) ) for p in others ], len( ids ) )
+            left = [ len( ids ) - 1 - reverse[ len( ids ) - 1 - j ]
+                     for j in xrange( len( ids ) ) ]
+            self.chromosomes.append( ( key, ids, right, left ) )
+
+    def __repr__(self):
+        return "Common_intervals {}".format(
+            [ genome.species for genome in self.genomes ] )
+
+    # Function to tell if [i, j] is a single doubled marker.
+    def trivial( self, number, i, j ):
+        ids = self.chromosomes[ number ][1]
+        return j == i + 1 and ids[ i ] == markers.sibling( ids[ j ] )
+
+    # Generator over all the common intervals.
+    # Output:
+    #    yields (chromosome number, i, j), in the order of the chromosomes
+    #    and of i then j
+    def all_intervals( self ):
+        for number, ( _, ids, right, left ) in enumerate( self.chromosomes ):
+            length = len( ids )
+            # Right ends j with left[j] <= i, as a union-find of the next
+            # such j. They are removed while i decreases.
+            following = range( length + 1 )
+            removed = [ [] for _ in xrange( length + 1 ) ]
+            for j in xrange( length ):
+                removed[ left[ j ] ].append( j )
+            found = []
+            for i in xrange( length - 1, -1, -1 ):
+                for j in removed[ i + 1 ]:
+                    following[ j ] = j + 1
+                j = self.next_end( following, i + 1 )
+                ends = []
+                while j <= right[ i ]:
+                    if not self.trivial( number, i, j ):
+                        ends.append( j )
+                    j = self.next_end( following, j + 1 )
+                found.append( ( i, ends ) )
+            for i, ends in reversed( found ):
+                for j in ends:
+                    yield number, i, j
+
+    # Function to find the next right end left in a union-find (see
+    # all_intervals), compressing the paths followed.
+    @staticmethod
+    def next_end( following, j ):
+        root = j
+        while following[ root ] != root:
+            root = following[ root ]
+        while following[ j ] != root:
+            following[ j ], j = root, following[ j ]
+        return root
+
+    # Generator over the maximal common intervals.
+    # Output:
+    #    yields (chromosome number, i, j), in the order of the chromosomes
+    #    and of i
+    def maximal_intervals( self ):
+        for number, ( _, ids, right, _ ) in enumerate( self.chromosomes ):
+            reach = -1
+            for i in xrange( len( ids ) ):
+                if right[ i ] > reach:
+                    reach = right[ i ]
+                    if right[ i ] > i and not self.trivial( number, i, right[ i ] ):
+                        yield number, i, right[ i ]
+
+    # Generator over the strong common intervals. From each i, the common
+    # intervals [i, j] are followed by increasing j (see above), skipping
+    # those overlapped by an interval [a, right[a]] with i < a <= j, until
+    # one is overlapped on the left by an interval [left[b], b] with
+    # left[b] < i <= b < j.
+    # Output:
+    #    yields (chromosome number, i, j), in the order of the chromosomes
+    #    and of i then j
+    def strong_intervals( self ):
+        for number, ( _, ids, right, left ) in enumerate( self.chromosomes ):
+            length = len( ids )
+            lefts = Range_table( left, min )
+            rights = Range_table( right, max )
+            for i in xrange( length ):
+                # Intervals ending after limit are overlapped on the left.
+                limit = lefts.first_below( i, i )
+                j = i
+                while True:
+                    # Next common interval [i, j].
+                    j = lefts.first_below( j + 1, i + 1 )
+                    if j > right[ i ] or j > limit:
+                        break
+                    reach = rights.query( i + 1, j )
+                    while reach > j:
+                        j = reach
+                        reach = rights.query( i + 1, j )
+                    if j > limit:
+                        break
+                    if not self.trivial( number, i, j ):
+                        yield number, i, j
+
+    # Function to get the marker IDs of an interval, sorted.
+    def marker_ids( self, number, i, j ):
+        return sorted( self.chromosomes[ number ][1][ i : j + 1 ] )
+
+    # Function to get an interval in range form, without building it: the
+    # chromosome of the first genome and the indices in it of the first and
+    # last markers of the interval. The interval is made of the markers of
+    # the range found once in every genome.
+    # Output:
+    #    (chromosome key, first index, last index)
+    def range( self, number, i, j ):
+        key, ids, _, _ = self.chromosomes[ number ]
+        place = self.places[0]
+        return key, place[ ids[ i ] ][1], place[ ids[ j ] ][1]
+
+    # Function to get an interval as an unordered Interval, with its locus
+    # in each genome.
+    def interval( self, number, i, j ):
+        marker_ids = self.marker_ids( number, i, j )
+        loci = []
+        for genome, place in zip( self.genomes, self.places ):
+            key = place[ marker_ids[0] ][0]
+            chrom = genome.chromosomes[ key ]
+            indices = [ place[ marker_id ][1] for marker_id in marker_ids ]
+            loci.append( markers.Locus( genome.species,
+                                        key,
+                                        chrom.starts[ min( indices ) ],
+                                        max( chrom.ends[ index ] for index in indices ),
+                                        0, '' ) )
+        return intervals.Interval(
+            id=''.join( map( markers.extremity_name, marker_ids ) ),
+            marker_ids=marker_ids,
+            loci=loci,
+            order=intervals.Order( 0 ),
+            weight=1,
+            comment='',
+            )
+
+    # Generator over the common intervals of a kind.
+    # Arguments:
+    #    kind: STRONG, MAXIMAL or ALL
+    # Output:
+    #    yields (chromosome number, i, j)
+    def intervals_of( self, kind ):
+        if kind == STRONG:
+            return self.strong_intervals()
+        elif kind == MAXIMAL:
+            return self.maximal_intervals()
+        return self.all_intervals()
+
+    # Function to get the common intervals of a kind. There can be a number
+    # of common intervals quadratic in the length of the genomes, use
+    # write_ranges for ALL.
+    # Arguments:
+    #    kind: STRONG, MAXIMAL or ALL
+    # Output:
+    #    IntervalDict
+    def find( self, kind ):
+        ints = intervals.IntervalDict()
+        for number, i, j in self.intervals_of( kind ):
+            ints.add( self.interval( number, i, j ) )
+        return ints
+
+    # Function to write the common intervals of a kind in range form (see
+    # range) as they are enumerated, one line per interval: the species of
+    # the genomes, the chromosome and the first and last indices, separated
+    # by tabs.
+    # Arguments:
+    #    file_stream: file
+    #    kind: STRONG, MAXIMAL or ALL
+    # Output:
+    #    int - the number of intervals written
+    def write_ranges( self, file_stream, kind ):
+        species = '\t'.join( genome.species for genome in self.genomes )
+        count = 0
+        for number, i, j in self.intervals_of( kind ):
+            file_stream.write( "%s\t%s\t%d\t%d\n" % ( ( species, ) + self.range( number, i, j ) ) )
+            count += 1
+        return count
@@ -0,0 +1,169 @@
+import random
+import StringIO
+import sys
+
+import genomes
+import markers
+import common_intervals
+
+# Check of the common intervals against brute force.
+#
+# Random genomes of doubled markers are built, from a few reversals of a
+# common order or from shuffled ones, with some markers missing or repeated
+# and split in chromosomes. Their common intervals of each kind are compared
+# with those found by testing every range of the first genome against the
+# definitions (see common_intervals), and the ranges of all_common_intervals
+# are read back to the marker IDs of the intervals.
+#
+# Usage: python data_structures/common_intervals_check.py [cases [seed]]
+
+
+# Function to build a random genome.
+# Arguments:
+#    species: str
+#    genes: int - number of genes of the common order
+# Output:
+#    Genome - with the doubled markers of the genes, on 1 to 3 chromosomes
+def random_genome( species, genes ):
+    order = range( genes )
+    orientations = [ 1 ] * genes
+    if random.random() < 0.5:
+        for _ in xrange( random.randint( 0, 3 ) ):
+            a, b = sorted( random.sample( xrange( genes + 1 ), 2 ) )
+            order[ a : b ] = reversed( order[ a : b ] )
+            orientations[ a : b ] = [ -o for o in reversed( orientations[ a : b ] ) ]
+    else:
+        random.shuffle( order )
+        orientations = [ random.choice( [ 1, -1 ] ) for _ in order ]
+    # Missing and repeated genes.
+    kept = [ ( gene, o ) for gene, o in zip( order, orientations )
+             if random.random() > 0.05 ]
+    for _ in xrange( random.randint( 0, 2 ) ):
+        kept.insert( random.randint( 0, len( kept ) ),
+                     ( random.randrange( genes + 2 ), random.choice( [ 1, -1 ] ) ) )
+    ids = []
+    for gene, orientation in kept:
+        pair = [ 2 * gene, 2 * gene + 1 ]
+        if orientation < 0:
+            pair.reverse()
+        ids.extend( pair )
+
+    genome = genomes.Genome( species )
+    cuts = sorted( random.sample( xrange( 1, max( len( ids ), 2 ) ),
+                                  min( max( len( ids ) - 1, 0 ), random.randint( 0, 2 ) ) ) )
+    for number, ( a, b ) in enumerate( zip( [ 0 ] + cuts, cuts + [ len( ids ) ] ) ):
+        key = "c%d" % number
+        loci = [ markers.Locus( species, key, 10 * k, 10 * k + 5, 1, '' )
+                 for k in xrange( b - a ) ]
+        genome.chromosomes[ key ] = genomes.Chromosome.from_markers(
+            ids[ a : b ], loci, [ 1 ] * ( b - a ), True )
+    return genome
+
+# Function to find the common intervals of genomes by brute force.
+# Output:
+#    dict of set - (chromosome key, i, j) keyed by kind, i and j being
+#    positions among the shared markers of the chromosome of the first genome
+def brute_force( gens ):
+    # Markers found exactly once in every genome.
+    shared = None
+    for genome in gens:
+        counts = {}
+        for chrom in genome.chromosomes.itervalues():
+            for marker_id in chrom.ids:
+                counts[ marker_id ] = counts.get( marker_id, 0 ) + 1
+        once = set( marker_id for marker_id, count in counts.iteritems() if count == 1 )
+        shared = once if shared == None else shared & once
+    chromosomes = [ [ [ marker_id for marker_id in chrom.ids if marker_id in shared ]
+                      for chrom in genome.chromosomes.itervalues() ]
+                    for genome in gens ]
+
+    # A set is common if it is contiguous on a chromosome of every genome.
+    def common( markers_set ):
+        for genome_chromosomes in chromosomes[1:]:
+            if not any( sum( 1 for marker_id in ids if marker_id in markers_set ) == len( markers_set )
+                        and contiguous( ids, markers_set ) for ids in genome_chromosomes ):
+                return False
+        return True
+
+    def contiguous( ids, markers_set ):
+        found = [ k for k, marker_id in enumerate( ids ) if marker_id in markers_set ]
+        return found[-1] - found[0] == len( found ) - 1
+
+    # All the common intervals, trivial ones included.
+    found = set()
+    trivial = set()
+    for key, chrom in gens[0].chromosomes.iteritems():
+        ids = [ marker_id for marker_id in chrom.ids if marker_id in shared ]
+        for i in xrange( len( ids ) ):
+            for j in xrange( i + 1, len( ids ) ):
+                if common( set( ids[ i : j + 1 ] ) ):
+                    found.add( ( key, i, j ) )
+                    if j == i + 1 and ids[ i ] == markers.sibling( ids[ j ] ):
+                        trivial.add( ( key, i, j ) )
+
+    def overlap( a, b ):
+        return a[0] == b[0] and ( a[1] < b[1] <= a[2] < b[2] or b[1] < a[1] <= b[2] < a[2] )
+
+    def contains( a, b ):
+        return a != b and a[0] == b[0] and a[1] <= b[1] and b[2] <= a[2]
+
+    answer = {}
+    answer[ common_intervals.ALL ] = found - trivial
+    answer[ common_intervals.STRONG ] = set(
+        a for a in found - trivial if not any( overlap( a, b ) for b in found ) )
+    answer[ common_intervals.MAXIMAL ] = set(
+        a for a in found - trivial if not any( contains( b, a ) for b in found ) )
+    return answer
+
+# Function to check the common intervals of random genomes.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    for case in xrange( cases ):
+        genes = random.randint( 1, 8 )
+        gens = [ random_genome( "S%d" % k, genes )
+                 for k in xrange( random.randint( 2, 4 ) ) ]
+        found = common_intervals.Common_intervals( gens )
+        expected = brute_force( gens )
+        for kind in common_intervals.KINDS:
+            intervals = [ ( found.chromosomes[ number ][0], i, j )
+                          for number, i, j in found.intervals_of( kind ) ]
+            if len( set( intervals ) ) != len( intervals ) or set( intervals ) != expected[ kind ]:
+                print "case %d, %s: %s instead of %s" % (
+                    case, kind, sorted( intervals ), sorted( expected[ kind ] ) )
+                failed += 1
+                break
+        else:
+            if not check_ranges( found, gens[0] ):
+                print "case %d: wrong ranges" % case
+                failed += 1
+    return failed
+
+# Function to check that the ranges of the common intervals (see
+# Common_intervals.write_ranges) give back their marker IDs.
+def check_ranges( found, genome ):
+    stream = StringIO.StringIO()
+    found.write_ranges( stream, common_intervals.ALL )
+    lines = stream.getvalue().splitlines()
+    expected = list( found.all_intervals() )
+    if len( lines ) != len( expected ):
+        return False
+    for line, ( number, i, j ) in zip( lines, expected ):
+        fields = line.split( '\t' )
+        key, first, last = fields[ -3 ], int( fields[ -2 ] ), int( fields[ -1 ] )
+        ids = [ marker_id for marker_id in genome.chromosomes[ key ].ids[ first : last + 1 ]
+                if marker_id in found.places[0] ]
+        if sorted( ids ) != found.marker_ids( number, i, j ):
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 2000
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )
@@ -1,219 +1,423 @@
-import genomes
 import markers
 import intervals
-import itertools
+import array
 import collections
 
-class Genome_pairs_index:
+# Number of bits used by the second marker of an adjacency key.
+KEY_SHIFT = 32
 
-    # Constructor: minimalist, populate this datastructure with the
-    # 'index_...' functions
-    def __init__( self ):
-        self.pairs = {}
-        self.species = ''
+# Default number of species kept by a Genome_cache.
+CACHE_SIZE = 16
+
+# Function to encode an unordered pair of doubled markers (ints) as a single
+# integer, the same for both orders of the pair.
+# Arguments:
+#    marker_id1, marker_id2: int - doubled marker IDs
+# Output:
+#    int - the smaller ID followed by the larger ID, packed in one integer.
+def adjacency_key( marker_id1, marker_id2 ):
+    if marker_id1 > marker_id2:
+        marker_id1, marker_id2 = marker_id2, marker_id1
+    return ( marker_id1 << KEY_SHIFT ) | marker_id2
+
+
+# Adjacencies of a genome of doubled markers, encoded as integer keys (see
+# adjacency_key). One record per pair of neighbouring markers that are not
+# the head and tail of the same marker, in chromosome order:
+#    keys: array of int - key of the pair
+#    chromosome_numbers: array of int - chromosome of the pair, index in
+#                        'chromosomes', a list of (name, Chromosome)
+#    firsts, lasts: array of int - positions of the markers of the pair in
+#                   the chromosome
+# The pairs of neighbouring unique markers separated by repeats (the pairs of
+# a stripped genome that span repeats) are recorded as well, in the order of
+# their last marker, so that one Genome_adjacency_keys gives both the
+# adjacencies and the RSIs of a genome (see find_intervals_all).
+# Nothing else is allocated until pairs are looked up, so two genomes can be
+# intersected on their keys first (see shared_keys) and only the shared
+# adjacencies indexed and turned into loci.
+class Genome_adjacency_keys:
+
+    def __init__( self, genome ):
+        self.species = genome.species
+        self.chromosomes = []
+        self.keys = array.array( 'l' )
+        self.chromosome_numbers = array.array( 'l' )
+        self.firsts = array.array( 'l' )
+        self.lasts = array.array( 'l' )
+        self.records = {}
+        self.fingerprints = {}
+
+        for key,chrom in genome.chromosomes.iteritems():
+            number = len( self.chromosomes )
+            self.chromosomes.append( ( key, chrom ) )
+            ids = chrom.ids
+            copy_numbers = chrom.copy_numbers
+            previous_unique = None
+            for i in xrange( len(chrom) ):
+                if copy_numbers[i] == 1:
+                    if ( previous_unique != None and i - previous_unique > 1 and
+                            ids[previous_unique] != markers.sibling( ids[i] ) ):
+                        self.add_record( number, previous_unique, i, ids )
+                    previous_unique = i
+                if i < len(chrom) - 1 and ids[i] != markers.sibling( ids[i+1] ):
+                    self.add_record( number, i, i+1, ids )
 
     def __repr__(self):
-        #Return the direct representation of Genome_pairs class
-        return "Genome_pairs_index {}".format(self.species)
+        return "Genome_adjacency_keys {}".format(self.species)
 
+    def __len__( self ):
+        return len( self.keys )
 
-    # Function to process a genome and get a dictionary of adjacent pairs of markers.
-    # Arguments:
-    #    genome: a Genome object
-    # Post-condition:
-    #    'pairs' will have the following structure:
-    #    dictionary, keyed with marker IDs, each element is a:
-    #     -> dictionary, keyed with marker IDs, each element is a:
-    #         -> list, where each element is a:
-    #             -> tuple, containing the pair of markers corresponding to the
-    #                dictionary keys for this list, followed by the locus of the
-    #                pair.
-    #
-    #    The orientations of the loci indicate which marker comes first in the pair.
-    #    Example: pair ('a', 'b') will appear twice: under key 'a' with positive
-    #    orientation, and under key 'b' with negative orientation.
-    def index_pairs( self, genome ):
-        self.species = genome.species
+    def add_record( self, number, first, last, ids ):
+        self.keys.append( adjacency_key( ids[first], ids[last] ) )
+        self.chromosome_numbers.append( number )
+        self.firsts.append( first )
+        self.lasts.append( last )
 
-        for key,chrom in genome.chromosomes.iteritems():
-            # Is this chromosome long enough for an adjacency?
-            if len( chrom ) < 2: continue
+    # Function to get the keys shared with another genome.
+    # Arguments:
+    #    other: Genome_adjacency_keys
+    # Output:
+    #    set of int
+    def shared_keys( self, other ):
+        return set( self.keys ).intersection( other.keys )
 
-            # Loop over the chromosome
-            for i in xrange( len(chrom) ):
-                # Add new entry to pairs dictionary
-                if not chrom[i].id in self.pairs:
-                    self.pairs[ chrom[i].id ] = {}
-
-                # Index the pair with marker to the right, if not head/tail pair.
-                if i < len(chrom) - 1 and chrom[i].id != markers.sibling( chrom[i+1].id ):
-                    if not chrom[i+1].id in self.pairs[ chrom[i].id ]:
-                        self.pairs[ chrom[i].id ][ chrom[i+1].id ] = []
-                    self.pairs[ chrom[i].id ][ chrom[i+1].id ].append(
-                            ( markers.Locus( genome.species,
-                                             key,
-                                             chrom[i].locus.start,
-                                             chrom[i+1].locus.end,
-                                             1, '' ),
-                              chrom[i],
-                              chrom[i+1] ) )
-                # Index the pair with marker to the left
-                if i > 0 and chrom[i].id != markers.sibling( chrom[i-1].id ):
-                    if not chrom[i-1].id in self.pairs[ chrom[i].id ]:
-                        self.pairs[ chrom[i].id ][ chrom[i-1].id ] = []
-                    self.pairs[ chrom[i].id ][ chrom[i-1].id ].append(
-                            ( markers.Locus( genome.species,
-                                             key,
-                                             chrom[i-1].locus.start,
-                                             chrom[i].locus.end,
-                                             -1, '' ),
-                              chrom[i-1],
-                              chrom[i] ) )
-
-
-    # Function to search the indexed genome for the give pair of markers.
+    # Function to index the records of the given keys, for query.
+    # Arguments:
+    #    keys: set of int - the keys to index, usually shared_keys
+    def index_keys( self, keys ):
+        self.records = {}
+        for record, key in enumerate( self.keys ):
+            if key in keys:
+                self.records.setdefault( key, [] ).append( record )
+
+    # Function to search the indexed keys for the given pair of markers.
     # Arguments:
     #    marker1, marker2: the ordered pair of markers to search for.
     # Output:
-    #    A list of tuples, see format in comments for indexing function.
+    #    A list of tuples (chromosome number, first, last, orientation),
+    #    sorted by chromosome and then by position of marker1: first and last
+    #    are the positions of the markers of the pair in the chromosome, and
+    #    the orientation is negative if marker2 comes first.
     def query( self, marker_id1, marker_id2 ):
         answer = []
-        # Can we find the pair?
-        if marker_id1 in self.pairs and marker_id2 in self.pairs[ marker_id1 ]:
-            answer = self.pairs[ marker_id1 ][ marker_id2 ]
+        for record in self.records.get( adjacency_key( marker_id1, marker_id2 ), [] ):
+            number = self.chromosome_numbers[ record ]
+            first = self.firsts[ record ]
+            last = self.lasts[ record ]
+            ids = self.chromosomes[ number ][1].ids
+            # Sort by chromosome, then by position of marker1 (right
+            # neighbours before left ones).
+            if ids[first] == marker_id1 and ids[last] == marker_id2:
+                answer.append( ( number, first, 0, last, 1 ) )
+            if ids[last] == marker_id1 and ids[first] == marker_id2:
+                answer.append( ( number, last, 1, first, -1 ) )
+        answer.sort()
+        return [ ( number, min( i, j ), max( i, j ), orientation )
+                 for number, i, _, j, orientation in answer ]
+
+    # Function to get the marker IDs of a record or of a pair found by query,
+    # from the first marker to the last one in the full chromosome.
+    # Arguments:
+    #    genome: Genome - the genome these keys were built from
+    def full_ids( self, genome, number, first, last ):
+        key, chrom = self.chromosomes[ number ]
+        return list( genome.chromosomes[ key ].ids \
+                         [ chrom.indices[first] : chrom.indices[last]+1 ] )
+
+    # Function to get the positions of the first and last markers of a record
+    # or of a pair found by query, in the full chromosome.
+    def full_span( self, number, first, last ):
+        indices = self.chromosomes[ number ][1].indices
+        return indices[first], indices[last]
+
+    # Function to get the fingerprints of the markers of a record or of a
+    # pair found by query, computed on first use and kept with the keys until
+    # the end of the comparison (see matching_pairs): the hash of their IDs
+    # in chromosome order and in reverse order, or the hash of their sorted
+    # IDs with all_match. Spans can only match if one of their fingerprints
+    # is equal.
+    # Arguments:
+    #    genome: Genome - the genome these keys were built from
+    #    number, first, last: the record or pair
+    #    all_match: boolean
+    # Output:
+    #    tuple of int - the fingerprint in chromosome order comes first
+    def span_fingerprints( self, genome, number, first, last, all_match ):
+        key = ( number, first, last, all_match )
+        fingerprints = self.fingerprints.get( key )
+        if fingerprints == None:
+            ids = self.full_ids( genome, number, first, last )
+            if all_match:
+                fingerprints = ( hash( tuple( sorted( ids ) ) ), )
+            else:
+                fingerprints = ( hash( tuple( ids ) ), hash( tuple( reversed( ids ) ) ) )
+            self.fingerprints[ key ] = fingerprints
+        return fingerprints
+
+    # Function to get the locus of a record or of a pair found by query.
+    def locus( self, number, first, last, orientation ):
+        key, chrom = self.chromosomes[ number ]
+        return markers.Locus( self.species,
+                              key,
+                              chrom.starts[first],
+                              chrom.ends[last],
+                              orientation, '' )
+
+
+# Least recently used cache of the adjacency keys of the species compared in
+# a run. A species is compared in several pairs, but is only encoded once
+# while it stays in the cache. Entries are keyed by species and remember the
+# genome they were built from, a different genome of the same species
+# replaces them. The entries are not pickled with the cache.
+class Genome_cache:
+
+    # Constructor
+    # size: int - maximum number of entries kept
+    def __init__( self, size=CACHE_SIZE ):
+        self.size = size
+        self.entries = collections.OrderedDict()
 
-        return answer
+    def __repr__(self):
+        return "Genome_cache {}/{}".format(len(self.entries), self.size)
 
+    def __getstate__( self ):
+        return { "size": self.size }
 
-# Function to find the adjacencies between two genomes.
-# Arguments:
-#    genome1, genome2: Genome objects
-# Output:
-#    An IntervalDict of adjacencies
-def find_adjacencies( genome1, genome2, all_match ):
-    adjs, _ = find_intervals( genome1, genome2, all_match, strip=False)
-    return adjs
+    def __setstate__( self, state ):
+        self.__init__( state[ "size" ] )
 
-# Function to find the RSIs between two genomes.
-# Arguments:
-#    genome1, genome2: Genome objects
-# Output:
-#    An IntervalDict of RSIs
-def find_RSIs( genome1, genome2, all_match):
-    _, RSIs = find_intervals( genome1, genome2, all_match, strip=True )
-    return RSIs
+    def __len__( self ):
+        return len( self.entries )
+
+    def clear( self ):
+        self.entries.clear()
 
-# Function to find the adjacencies and repeat spanning intervals between two
-# genomes.
+    # Function to get the adjacency keys of a genome, building them if they
+    # are not cached.
+    # Arguments:
+    #    genome: Genome
+    # Output:
+    #    Genome_adjacency_keys
+    def get( self, genome ):
+        key = genome.species
+        entry = self.entries.pop( key, None )
+        if entry == None or entry[0] is not genome:
+            entry = ( genome, Genome_adjacency_keys( genome ) )
+        # (Re)insert as the most recently used entry.
+        if self.size > 0:
+            self.entries[ key ] = entry
+            while len( self.entries ) > self.size:
+                self.entries.popitem( last=False )
+        return entry[1]
+
+
+# Function to find the adjacencies and the repeat spanning intervals between
+# two genomes in a single pass: the genomes are encoded once, with the pairs
+# spanning repeats (see Genome_adjacency_keys), instead of once unstripped
+# and once stripped.
 # Arguments:
 #    genome1, genome2: Genome objects
-#    strip: boolean - whether to strip given genomes or not.
+#    cache: Genome_cache - adjacency keys of earlier comparisons, None to
+#           build them for this comparison only.
 # Output:
 #    adjs, RSIs: IntervalDict objects
-def find_intervals( genome1, genome2, all_match, strip):
-    # NOTE: There might be trouble with RSIs that are the delimited at front
-    #       and back by the same marker.
-
-    # Only strip genomes (to find RSIs) if instructed in arguments
-    stripped1 = genome1
-    stripped2 = genome2
-    if strip:
-        stripped1 = strip_genome_unique( stripped1 )
-        stripped2 = strip_genome_unique( stripped2 )
-
-    # Index one genome, loop over the other.
-    index = Genome_pairs_index()
-    index.index_pairs( stripped1 )
-
+def find_intervals_all( genome1, genome2, all_match, cache=None ):
+    if cache == None:
+        cache = Genome_cache( 2 )
+    index = cache.get( genome1 )
+    keys2 = cache.get( genome2 )
+
+    # Adjacencies between unique markers are also kept with the RSIs, as in
+    # the stripped genomes, and both results are copied to new IntervalDicts
+    # at the end, so that they come out in the order of genome2.
     ints = intervals.IntervalDict()
-    for key,chrom in stripped2.chromosomes.iteritems():
-        for i in xrange( len(chrom) - 1 ):
-            pair2 = ( chrom[i].id, chrom[i+1].id )
-            if markers.are_siblings( *pair2 ):
-                continue
-            full_ids2 = [ marker.id for marker in
-                         genome2.chromosomes[ key ] \
-                             [ chrom[i].index : chrom[i+1].index+1 ] ]
-            pairs = index.query( *pair2 )
-            # Find all pairs in the index with a full match (or all match)
-            matches = []
-            match_ids = []
-            for pair1 in pairs:
-                # do we have a match between pair1 and pair2?
-                
-                full_ids1 = [ marker.id for marker in
-                              genome1.chromosomes[ pair1[0].chromosome ] \
-                                  [ pair1[1].index : pair1[2].index+1 ] ]
-
-                cmp_result, _ = compare_marker_intervals(
-                    full_ids1,
-                    full_ids2, 
-                    all_match
-                    )
-                if cmp_result:
-                    matches.append( pair1 )
-                    match_ids = full_ids1
-
-            if matches:
-                # Add a new interval to ints if not already there, and add the
-                # loci from matches to it. If the interval is already there, it
-                # must already have the loci from matches.
-                if not full_ids2 in ints:
-                    ints.add( intervals.Interval(
-                        id=''.join(full_ids2),
-                        marker_ids=full_ids2,
-                        loci=[l for l, _, _ in matches],
-                        order=intervals.Order( 1 ),
-                        weight=1,
-                        comment='',
-                        ) )
-                # Add the newly found locus in genome 2 to the interval.
-                interval = ints[match_ids]
-                locus2 = markers.Locus(
-                    species=genome2.species,
-                    chromosome=key,
-                    start=chrom[i].locus.start,
-                    end=chrom[i+1].locus.end,
-                    orientation=1,
-                    comment='',
-                    )
-                if interval.marker_ids == list( reversed( full_ids2 ) ):
-                    locus2.orientation *= -1
-                interval.loci.append( locus2 )
-
-    # Filter the ints to distinguish repeat spanning intervals.
+    stripped_ints = intervals.IntervalDict()
+    for match in matching_pairs( genome1, genome2, index, keys2, all_match ):
+        record, full_ids2 = match[0], match[1]
+        if len( full_ids2 ) > 2:
+            add_match( stripped_ints, index, keys2, *match )
+            continue
+        add_match( ints, index, keys2, *match )
+        _, chrom = keys2.chromosomes[ keys2.chromosome_numbers[ record ] ]
+        if ( chrom.copy_numbers[ keys2.firsts[ record ] ] == 1 and
+                chrom.copy_numbers[ keys2.lasts[ record ] ] == 1 and
+                not full_ids2 in stripped_ints ):
+            stripped_ints.add( ints[ full_ids2 ] )
+
     adjs = intervals.IntervalDict()
-    RSIs = intervals.IntervalDict()
     for interval in ints.itervalues():
-        if len( interval.marker_ids ) == 2:
-            adjs.add( interval )
-        else:
-            RSIs.add ( interval )
+        adjs.add( interval )
+    RSIs = intervals.IntervalDict()
+    for interval in stripped_ints.itervalues():
+        if len( interval.marker_ids ) > 2:
+            RSIs.add( interval )
 
     return adjs, RSIs
 
+# Generator over the pairs of genome2 that match pairs of genome1.
+# Arguments:
+#    genome1, genome2: Genome objects
+#    index, keys2: Genome_adjacency_keys of genome1 and genome2
+# Output:
+#    yields tuples (record, full_ids2, matches, match_ids), in the order of
+#    the records of genome2: the record of keys2, its marker IDs, the pairs
+#    of index it matches (see Genome_adjacency_keys.query) and the marker IDs
+#    of the last one.
+def matching_pairs( genome1, genome2, index, keys2, all_match ):
+    # Index the adjacencies of one genome that the other one also has and
+    # loop over those of the other.
+    shared = index.shared_keys( keys2 )
+    index.index_keys( shared )
+
+    for record in xrange( len( keys2 ) ):
+        if not keys2.keys[ record ] in shared:
+            continue
+        number = keys2.chromosome_numbers[ record ]
+        first = keys2.firsts[ record ]
+        last = keys2.lasts[ record ]
+        ids = keys2.chromosomes[ number ][1].ids
+        pair2 = ( ids[first], ids[last] )
+        pairs = index.query( *pair2 )
+        start2, end2 = keys2.full_span( number, first, last )
+        full_ids2 = None
+        # The fingerprints a matching pair of genome1 can have, computed for
+        # the first candidate that needs them.
+        targets = None
+        # Find all pairs in the index with a full match (or all match)
+        matches = []
+        match_ids = []
+        for pair1 in pairs:
+            # do we have a match between pair1 and pair2? Only spans of the
+            # same length can match. The end markers are those of pair2 (in
+            # either order), so spans of two markers always match, longer
+            # spans only if their fingerprints do.
+            start1, end1 = index.full_span( *pair1[:3] )
+            if end1 - start1 != end2 - start2:
+                continue
+            if end2 - start2 > 1:
+                if targets == None:
+                    targets = keys2.span_fingerprints( genome2, number, first, last, all_match )
+                fingerprint1 = index.span_fingerprints( genome1, pair1[0], pair1[1], pair1[2],
+                                                        all_match )[0]
+                if not fingerprint1 in targets:
+                    continue
+            if full_ids2 == None:
+                full_ids2 = keys2.full_ids( genome2, number, first, last )
+            full_ids1 = index.full_ids( genome1, *pair1[:3] )
+
+            cmp_result, _ = compare_marker_intervals(
+                full_ids1,
+                full_ids2, 
+                all_match
+                )
+            if cmp_result:
+                matches.append( pair1 )
+                match_ids = full_ids1
+
+        if matches:
+            yield record, full_ids2, matches, match_ids
+    # Only keep the fingerprints of one species pair at a time.
+    index.index_keys( () )
+    index.fingerprints.clear()
+    keys2.fingerprints.clear()
+
+# Function to add a match found by matching_pairs to an IntervalDict.
+# Arguments:
+#    ints: IntervalDict - where to add the match
+#    index, keys2: Genome_adjacency_keys given to matching_pairs
+#    record, full_ids2, matches, match_ids: the match
+def add_match( ints, index, keys2, record, full_ids2, matches, match_ids ):
+    # Add a new interval to ints if not already there, and add the
+    # loci from matches to it. If the interval is already there, it
+    # must already have the loci from matches.
+    if not full_ids2 in ints:
+        ints.add( intervals.Interval(
+            id=''.join( map( markers.extremity_name, full_ids2 ) ),
+            marker_ids=full_ids2,
+            loci=[ index.locus( *pair1 ) for pair1 in matches ],
+            order=intervals.Order( 1 ),
+            weight=1,
+            comment='',
+            ) )
+    # Add the newly found locus in genome 2 to the interval.
+    interval = ints[match_ids]
+    locus2 = keys2.locus( keys2.chromosome_numbers[ record ],
+                          keys2.firsts[ record ],
+                          keys2.lasts[ record ],
+                          1 )
+    if interval.marker_ids == list( reversed( full_ids2 ) ):
+        locus2.orientation *= -1
+    interval.loci.append( locus2 )
+
+
+
+# Merges intervals found in several comparisons into one database. The loci
+# of an interval found again are kept with a set of their keys (see
+# locus_key), so only the new ones are appended, and the loci of the
+# intervals that were merged are sorted once, by finish, instead of after
+# every merge.
+class Interval_merger:
+
+    # Constructor
+    # ints: IntervalDict - database to update.
+    def __init__( self, ints ):
+        self.ints = ints
+        # (interval, set of locus keys) keyed by id of the intervals of ints
+        # that were found again.
+        self.merged = {}
 
+    def __repr__(self):
+        return "Interval_merger {}/{}".format(len(self.merged), len(self.ints))
 
-# Function to add new adjacencies to an existing database of adjacencies,
-# updating the weights of the adjacencies along the way.
-# Arguments:
-#    adjacencies: IntervalDict - database to update.
-#    new_adjacencies: IntervalDict, intervals to add to existing database.
-def add_intervals( ints, new_ints ):
-    for interval in new_ints.itervalues():
-        if interval.marker_ids not in ints:
-            ints.add( interval )
-        else:
-            found = ints[interval.marker_ids]
-            new_loci = interval.loci
-            if found.marker_ids == list( reversed( interval.marker_ids ) ):
-                for locus in new_loci:
+    # Function to add new intervals to the database.
+    # Arguments:
+    #    new_ints: IntervalDict or list of Interval, intervals to add to
+    #              existing database.
+    def add( self, new_ints ):
+        if isinstance( new_ints, intervals.IntervalDict ):
+            new_ints = new_ints.itervalues()
+        for interval in new_ints:
+            if interval.marker_ids not in self.ints:
+                self.ints.add( interval )
+                continue
+            found = self.ints[interval.marker_ids]
+            entry = self.merged.get( id( found ) )
+            if entry == None:
+                # Remove duplicate loci
+                keys = set()
+                loci = []
+                for locus in found.loci:
+                    key = locus_key( locus )
+                    if not key in keys:
+                        keys.add( key )
+                        loci.append( locus )
+                found.loci = loci
+                entry = self.merged[ id( found ) ] = ( found, keys )
+            keys = entry[1]
+            reverse = found.marker_ids == list( reversed( interval.marker_ids ) )
+            for locus in interval.loci:
+                if reverse:
                     locus.orientation *= -1
-            found.loci += new_loci
-            # Remove duplicate loci
-            found.loci = sorted( found.loci )
-            found.loci = [ locus for locus, _ in \
-                           itertools.groupby( found.loci ) ]
+                key = locus_key( locus )
+                if not key in keys:
+                    keys.add( key )
+                    found.loci.append( locus )
+
+    # Function to sort the loci of the intervals that were found again, once
+    # all the intervals are added.
+    # Output:
+    #    IntervalDict - the database
+    def finish( self ):
+        for found, _ in self.merged.itervalues():
+            found.loci.sort( key=locus_key )
+        self.merged = {}
+        return self.ints
+
+# Function to get the key of a locus, equal for the loci that are equal.
+def locus_key( locus ):
+    return ( locus.species, locus.chromosome, locus.start, locus.end, locus.orientation )
 
 # Function to set the weights of adjacencies.
 # Currently just counts the number of occurences of the adjacencies.
@@ -226,19 +430,6 @@ def set_interval_weights( ints ):
 
 # Auxilary functions:
 
-# Function to return a genome with only unique markers
-# Arguments:
-#     genome: Genome
-# Output:
-#     A new genome that is a copy of 'genome', but without markers with
-#     a 'copy_number' greater than 1
-def strip_genome_unique( genome ):
-    stripped_genome = genomes.Genome( genome.species )
-    for key,chrom in genome.chromosomes.iteritems():
-        stripped_genome.chromosomes[ key ] = [ marker for marker in chrom if marker.copy_number == 1 ]
-
-    return stripped_genome
-
 # Function to check if two lists of doubled marker IDs are equivalent.
 # This function checks for positive and negative orientation.
 # Arguments:
@@ -0,0 +1,91 @@
+import random
+import sys
+
+import intervals
+import markers
+import comparisons
+import support_check
+
+# Check of comparisons.find_intervals_all against a plain intersection of
+# sets of adjacencies.
+#
+# Pairs of random genomes with repeated families are built as in
+# support_check. The adjacencies of each genome (pairs of neighbouring
+# markers that are not the two extremities of a marker) and its repeat
+# spanning intervals (spans between neighbouring unique markers with only
+# repeats between them) are listed with their loci, and the intervals of
+# both genomes are intersected on their canonical keys (see
+# intervals.interval_key). find_intervals_all must find the same adjacencies
+# and RSIs, with the loci of both genomes.
+#
+# Usage: python data_structures/comparisons_check.py [cases [seed]]
+
+
+# Function to list the adjacencies and RSIs of a genome.
+# Output:
+#    adjs, RSIs: dict of set - loci (species, chromosome, start, end) keyed
+#    by interval key
+def genome_intervals( genome ):
+    adjs = {}
+    RSIs = {}
+    for key, chrom in genome.chromosomes.iteritems():
+        ids = chrom.ids
+        for i in xrange( len( ids ) - 1 ):
+            if ids[i] != markers.sibling( ids[i+1] ):
+                locus = ( genome.species, key, chrom.starts[i], chrom.ends[i+1] )
+                adjs.setdefault( intervals.interval_key( ids[ i : i + 2 ] ), set() ).add( locus )
+        unique = [ i for i in xrange( len( ids ) ) if chrom.copy_numbers[i] == 1 ]
+        for i, j in zip( unique, unique[1:] ):
+            if j - i > 1 and ids[i] != markers.sibling( ids[j] ):
+                locus = ( genome.species, key, chrom.starts[i], chrom.ends[j] )
+                RSIs.setdefault( intervals.interval_key( ids[ i : j + 1 ] ), set() ).add( locus )
+    return adjs, RSIs
+
+# Function to intersect the intervals of two genomes.
+# Output:
+#    dict of set - loci in both genomes keyed by the interval keys they share
+def intersect( found1, found2 ):
+    return dict( ( key, loci | found2[ key ] ) for key, loci in found1.iteritems()
+                 if key in found2 )
+
+# Function to get the loci of the intervals found by find_intervals_all, in
+# the form of genome_intervals.
+def found_loci( ints ):
+    return dict( ( intervals.interval_key( interval.marker_ids ),
+                   set( ( locus.species, locus.chromosome, locus.start, locus.end )
+                        for locus in interval.loci ) )
+                 for interval in ints.itervalues() )
+
+# Function to check find_intervals_all on random pairs of genomes.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    for case in xrange( cases ):
+        genes = random.randint( 1, 12 )
+        copy_numbers = [ random.choice( [ 1, 1, 1, 2, 3 ] ) for _ in xrange( genes ) ]
+        markers.set_family_names( [ str( gene ) for gene in xrange( genes ) ] )
+        genome1 = support_check.random_genome( "A", genes, copy_numbers )
+        genome2 = support_check.random_genome( "B", genes, copy_numbers )
+
+        adjs1, RSIs1 = genome_intervals( genome1 )
+        adjs2, RSIs2 = genome_intervals( genome2 )
+        adjs, RSIs = comparisons.find_intervals_all( genome1, genome2, False )
+        for kind, found, expected in [ ( "adjacencies", adjs, intersect( adjs1, adjs2 ) ),
+                                       ( "RSIs", RSIs, intersect( RSIs1, RSIs2 ) ) ]:
+            if len( found ) != len( found_loci( found ) ) or found_loci( found ) != expected:
+                print "case %d, %s: %s instead of %s" % (
+                    case, kind, sorted( found_loci( found ).items() ), sorted( expected.items() ) )
+                failed += 1
+                break
+    return failed
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 1000
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )
@@ -1,49 +1,116 @@
 import markers
 
 import sys
+import array
 import bisect
 
 
 # Genome data structure, kept ordered, allows in-order insertions.
-# Represents the genome as the chromosomes dictionary of ordered
-# lists of Marker objects.
+# Represents the genome as the chromosomes dictionary of Chromosome objects.
 class Genome:
 
     # Constructor
     # species: string, which species the genome is of.
-    # chromosomes: a dictionary of list of Marker objects.
+    # chromosomes: a dictionary of Chromosome objects.
     def __init__( self, species ):
         self.species = species
         self.chromosomes = {}
 
     # Add locus in order to correct chromosome.
-    # NOTE: this function does not set the 'index' field of inserted marker objects.
+    # NOTE: this function does not set the 'index' field of inserted markers,
+    #       use get_genomes to build whole genomes.
     def add_marker( self, id, locus, copy_number ):
         chrom = locus.chromosome
         if not chrom in self.chromosomes:
-            self.chromosomes[chrom] = []
+            self.chromosomes[chrom] = Chromosome.from_markers(
+                [], [], [], isinstance( id, ( int, long ) ) )
 
         # Insert the marker into correct chromosome in order.
-        i = bisect.bisect_left( [x.locus.start for x in self.chromosomes[chrom]], locus.start )
-        self.chromosomes[chrom].insert( i, Marker( id, locus, copy_number, 0 ) )
+        current_chrom = self.chromosomes[chrom]
+        i = bisect.bisect_left( current_chrom.starts, locus.start )
+        current_chrom.insert( i, id, locus, copy_number, 0 )
 
     # Find index of a marker in a chromosome, given its start location in the chromosome.
     # Returns negative index if not found.
     def find_marker( self, chrom, location ):
         current_chrom = self.chromosomes[chrom]
-        i = bisect.bisect_left( [x.locus.start for x in current_chrom], location )
-        if current_chrom[i].locus.start == location:
+        i = bisect.bisect_left( current_chrom.starts, location )
+        if i < len( current_chrom ) and current_chrom.starts[i] == location:
             return i
         else:
             return -sys.maxint-1
 
 
+# Markers of a chromosome in order, stored as parallel arrays:
+#    ids: array of int (doubled markers) or list of str - marker identities.
+#    starts, ends: array of int - positions of the markers.
+#    copy_numbers: array of int - copy number of each marker.
+#    indices: array of int - index of each marker in the full chromosome (they
+#             differ from the positions in the arrays for stripped genomes).
+#    loci: list of Locus - locus of each marker.
+# Indexing a Chromosome gives Marker objects built on the fly, use the arrays
+# directly in loops over whole genomes.
+class Chromosome(object):
+    __slots__ = ('ids', 'starts', 'ends', 'copy_numbers', 'indices', 'loci')
+
+    def __init__( self, ids, starts, ends, copy_numbers, indices, loci ):
+        self.ids = ids
+        self.starts = starts
+        self.ends = ends
+        self.copy_numbers = copy_numbers
+        self.indices = indices
+        self.loci = loci
+
+    # Builds a Chromosome from markers given in order, their indices are their
+    # positions.
+    # Arguments:
+    #    ids: list of marker identities
+    #    loci: list of Locus
+    #    copy_numbers: list of int
+    #    int_ids: boolean - True if all ids are ints (stored in an array)
+    @staticmethod
+    def from_markers( ids, loci, copy_numbers, int_ids ):
+        return Chromosome(
+            array.array( 'l', ids ) if int_ids else list( ids ),
+            array.array( 'l', [ locus.start for locus in loci ] ),
+            array.array( 'l', [ locus.end for locus in loci ] ),
+            array.array( 'l', copy_numbers ),
+            array.array( 'l', xrange( len( ids ) ) ),
+            list( loci ) )
+
+    # Inserts a marker at position i.
+    def insert( self, i, id, locus, copy_number, index ):
+        self.ids.insert( i, id )
+        self.starts.insert( i, locus.start )
+        self.ends.insert( i, locus.end )
+        self.copy_numbers.insert( i, copy_number )
+        self.indices.insert( i, index )
+        self.loci.insert( i, locus )
+
+    def __len__( self ):
+        return len( self.ids )
+
+    def __getitem__( self, i ):
+        if isinstance( i, slice ):
+            return [ self[j] for j in xrange( *i.indices( len( self.ids ) ) ) ]
+        return Marker( self.ids[i], self.loci[i], self.copy_numbers[i], self.indices[i] )
+
+    def __iter__( self ):
+        for i in xrange( len( self.ids ) ):
+            yield self[i]
+
+    def __repr__(self):
+        return "Chromosome ids={}".format(list(self.ids))
+
+
 # Simplified data structure for a marker, with the following fields:
 #    id: string - identity.
 #    locus: Locus - position in genome.
 #    copy_number: int - the number of markers with this ID in the ancestral genome.
 #    index: int - index of this marker in chromosome in Genome object.
-class Marker:
+class Marker(object):
+    __slots__ = ('id', 'locus', 'copy_number', 'index')
+
     def __init__( self, id, locus, copy_number, index ):
         self.id = id
         self.locus = locus
@@ -51,11 +118,14 @@ class Marker:
         self.index = index
 
     def __repr__(self):
-        #Return the direct representation of Genome_pairs_index class
+        #Return the direct representation of Marker class
         return "Marker id={} locus={} copy_number={} index={}".format(self.id, self.locus, self.copy_number, self.index)
 
 
 # Get dictionary of sorted genomes
+# The loci are gathered per (species, chromosome) and each bucket is sorted
+# once, markers with the same start are kept in reverse input order (as
+# successive in-order insertions would).
 # Inpus:
 # hom_fams: a list of HomFam objects
 # species: a list of species whos genomes we want
@@ -67,17 +137,33 @@ def get_genomes(hom_fams,species):
     # Create for each species in list
     for s in species:
         genomes[s] = Genome(s)
-    # Add markers in place
+    # Gather the markers of each chromosome, in order of first appearance.
+    buckets = {}
+    bucket_order = []
+    int_ids = True
+    n = 0
     for hom_fam in hom_fams:
+        if not isinstance( hom_fam.id, ( int, long ) ):
+            int_ids = False
         for locus in hom_fam.loci:
-            if locus.species in species:
-                genomes[locus.species].add_marker( hom_fam.id, locus, hom_fam.copy_number )
-
-    # Set marker indices
-    for key1, genome in genomes.iteritems():
-        for key2, chrom in genome.chromosomes.iteritems():
-            for i in xrange( len( chrom ) ):
-                chrom[i].index = i
+            if locus.species in genomes:
+                key = ( locus.species, locus.chromosome )
+                bucket = buckets.get( key )
+                if bucket == None:
+                    bucket = buckets[ key ] = []
+                    bucket_order.append( key )
+                bucket.append( ( locus.start, n, hom_fam.id, locus, hom_fam.copy_number ) )
+                n -= 1
+
+    # Sort each chromosome once and build its arrays.
+    for key in bucket_order:
+        bucket = buckets[ key ]
+        bucket.sort()
+        genomes[ key[0] ].chromosomes[ key[1] ] = Chromosome.from_markers(
+            [ entry[2] for entry in bucket ],
+            [ entry[3] for entry in bucket ],
+            [ entry[4] for entry in bucket ],
+            int_ids )
 
     return genomes
 
@@ -0,0 +1,85 @@
+import random
+import sys
+
+import markers
+import genomes
+
+# Check of genomes.get_genomes, which sorts the markers of each chromosome
+# once, against the original construction, inserting each locus in order with
+# Genome.add_marker (a bisect on the starts).
+#
+# Random families, named by strings or by doubled markers, are given random
+# loci on a few chromosomes of a few species, with many equal starts, and
+# genomes are built for some of the species. Both constructions must give
+# the same chromosomes, with the same markers (ids, loci, copy numbers) in the
+# same order and their positions as indices.
+#
+# Usage: python data_structures/genomes_check.py [cases [seed]]
+
+SPECIES = [ "A", "B", "C" ]
+
+
+# Function to build random families.
+# Arguments:
+#    int_ids: boolean - name the families by ints, as doubled markers
+# Output:
+#    list of HomFam
+def random_hom_fams( int_ids ):
+    hom_fams = []
+    for number in xrange( random.randint( 0, 15 ) ):
+        loci = [ markers.Locus( random.choice( SPECIES ), random.choice( [ "1", "2" ] ),
+                                start, start + random.randint( 0, 3 ), 0, "" )
+                 for start in [ random.randint( 0, 20 ) for _ in xrange( random.randint( 0, 4 ) ) ] ]
+        hom_fams.append( markers.HomFam( number if int_ids else "f%d" % number,
+                                         loci, random.randint( 1, 3 ), "" ) )
+    return hom_fams
+
+# Function to build genomes as the original get_genomes did.
+# Output:
+#    dict of Genome keyed by species
+def original_genomes( hom_fams, species ):
+    gens = {}
+    for s in species:
+        gens[s] = genomes.Genome( s )
+    for hom_fam in hom_fams:
+        for locus in hom_fam.loci:
+            if locus.species in species:
+                gens[ locus.species ].add_marker( hom_fam.id, locus, hom_fam.copy_number )
+    for genome in gens.itervalues():
+        for chrom in genome.chromosomes.itervalues():
+            for i in xrange( len( chrom ) ):
+                chrom.indices[i] = i
+    return gens
+
+# Function to list the chromosomes of genomes in a comparable form.
+def genome_list( gens ):
+    return sorted( ( species, key, list( chrom.ids ), list( chrom.starts ), list( chrom.ends ),
+                     list( chrom.copy_numbers ), list( chrom.indices ),
+                     [ id( locus ) for locus in chrom.loci ] )
+                   for species, genome in gens.iteritems()
+                   for key, chrom in genome.chromosomes.iteritems() )
+
+# Function to check get_genomes on random families.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    for case in xrange( cases ):
+        hom_fams = random_hom_fams( random.random() < 0.5 )
+        species = random.sample( SPECIES, random.randint( 1, len( SPECIES ) ) )
+        found = genome_list( genomes.get_genomes( hom_fams, species ) )
+        expected = genome_list( original_genomes( hom_fams, species ) )
+        if found != expected:
+            print "case %d: %s instead of %s" % ( case, found, expected )
+            failed += 1
+    return failed
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 1000
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )
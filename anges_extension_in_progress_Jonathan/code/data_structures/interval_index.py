@@ -0,0 +1,204 @@
+import array
+import struct
+import cPickle
+
+import markers
+import intervals
+import weights
+
+# Indexed binary files of intervals, with random access by interval id and by
+# endpoint marker.
+#
+# Layout:
+#   header line        INDEX_MAGIC
+#   8 bytes            offset of the index (little endian, unsigned)
+#   records            one pickled tuple per interval, see to_record
+#   pickled dict       the index:
+#                        "offsets"   - array of record offsets (as a string)
+#                        "ids"       - record number keyed by interval id
+#                        "endpoints" - array of record numbers (as a string)
+#                                      keyed by endpoint marker name
+# Markers are stored by name (<family>_h, <family>_t) so that a file does not
+# depend on the doubled marker encoding of the run that wrote it.
+
+INDEX_MAGIC = "ANGES-INTERVALS 1\n"
+INDEX_SUFFIX = ".idx"
+OFFSET_FORMAT = "<Q"
+
+
+# Function to encode an interval as a tuple of plain values.
+# Arguments:
+#   interval: Interval
+# Output:
+#   tuple - (id, marker names, order type, weight string, comment, loci)
+def to_record( interval ):
+    return ( interval.id,
+             [ markers.extremity_name( m ) for m in interval.marker_ids ],
+             interval.order.order_type,
+             weights.to_string( interval.weight ),
+             interval.comment,
+             [ ( l.species, l.chromosome, l.start, l.end, l.orientation, l.comment )
+               for l in interval.loci ] )
+
+# Function to decode an interval encoded by to_record. Markers are looked up
+# in the families of the run (see markers.find_extremity), reading a file never
+# changes the marker encoding.
+# Arguments:
+#   record: tuple
+# Output:
+#   Interval. Raises KeyError if a marker is not a family of the run.
+def from_record( record ):
+    ident, names, order_type, weight, comment, loci = record
+    marker_ids = []
+    for name in names:
+        marker = markers.find_extremity( name )
+        if marker == None:
+            raise KeyError( "unknown marker in interval %s: %s" % ( ident, name ) )
+        marker_ids.append( marker )
+    return intervals.Interval( ident,
+                               marker_ids,
+                               [ markers.Locus( *l ) for l in loci ],
+                               intervals.Order( order_type ),
+                               weights.parse( weight ),
+                               comment )
+
+# Function to write intervals to an indexed file.
+# Arguments:
+#   file_name: str - the file to write to
+#   ints: IntervalDict, IntervalSelection or list of Interval - the intervals
+#         to write
+def write_index_file( file_name, ints ):
+    if isinstance( ints, ( intervals.IntervalDict, intervals.IntervalSelection ) ):
+        ints = ints.itervalues()
+    offsets = array.array( 'l' )
+    ids = {}
+    endpoints = {}
+
+    file_stream = open( file_name, 'wb' )
+    try:
+        file_stream.write( INDEX_MAGIC )
+        file_stream.write( struct.pack( OFFSET_FORMAT, 0 ) )
+        for interval in ints:
+            record = to_record( interval )
+            number = len( offsets )
+            offsets.append( file_stream.tell() )
+            cPickle.dump( record, file_stream, cPickle.HIGHEST_PROTOCOL )
+            ids.setdefault( record[0], number )
+            names = record[1]
+            if names:
+                for name in set( [ names[0], names[-1] ] ):
+                    endpoints.setdefault( name, array.array( 'l' ) ).append( number )
+
+        index_offset = file_stream.tell()
+        cPickle.dump( { "offsets": offsets.tostring(),
+                        "ids": ids,
+                        "endpoints": dict( ( name, numbers.tostring() )
+                                           for name, numbers in endpoints.iteritems() ) },
+                      file_stream, cPickle.HIGHEST_PROTOCOL )
+        file_stream.seek( len( INDEX_MAGIC ) )
+        file_stream.write( struct.pack( OFFSET_FORMAT, index_offset ) )
+    finally:
+        file_stream.close()
+
+
+# Class to read an indexed intervals file. Only the index is loaded when the
+# file is opened, intervals are read from disk when asked for. Reading an
+# interval with a marker that is not a family of the run raises KeyError (see
+# from_record).
+class IntervalIndex:
+    # IntervalIndex constructor
+    # file_name - str: the indexed file to open (see write_index_file)
+    # Raises ValueError if the file is not an indexed intervals file.
+    def __init__( self, file_name ):
+        self.file_name = file_name
+        self.file_stream = open( file_name, 'rb' )
+        try:
+            if self.file_stream.readline() != INDEX_MAGIC:
+                raise ValueError( "not an indexed intervals file: %s" % file_name )
+            size = struct.calcsize( OFFSET_FORMAT )
+            index_offset, = struct.unpack( OFFSET_FORMAT, self.file_stream.read( size ) )
+            self.file_stream.seek( index_offset )
+            index = cPickle.load( self.file_stream )
+        except:
+            self.file_stream.close()
+            raise
+        self.offsets = array.array( 'l' )
+        self.offsets.fromstring( index[ "offsets" ] )
+        self.ids = index[ "ids" ]
+        self.endpoints = index[ "endpoints" ]
+    #enddef
+
+    def __len__( self ):
+        return len( self.offsets )
+    #enddef
+
+    def close( self ):
+        self.file_stream.close()
+    #enddef
+
+    # Reads the interval with the given record number.
+    def read( self, number ):
+        self.file_stream.seek( self.offsets[ number ] )
+        return from_record( cPickle.load( self.file_stream ) )
+    #enddef
+
+    # Returns the interval with id ident, None if there is none.
+    def get( self, ident ):
+        number = self.ids.get( ident )
+        if number == None:
+            return None
+        return self.read( number )
+    #enddef
+
+    # Returns the record numbers of the intervals with the marker named name
+    # (e.g. "12_h") as an endpoint.
+    def numbers_with( self, name ):
+        numbers = array.array( 'l' )
+        numbers.fromstring( self.endpoints.get( name, "" ) )
+        return numbers
+    #enddef
+
+    # Returns the intervals with the marker named name as an endpoint.
+    def intervals_with( self, name ):
+        return [ self.read( number ) for number in self.numbers_with( name ) ]
+    #enddef
+
+    # Returns the intervals with at least one endpoint in names, in file order.
+    # names - iterable of str: marker names, e.g. the markers of a component
+    def intervals_touching( self, names ):
+        numbers = set()
+        for name in names:
+            numbers.update( self.numbers_with( name ) )
+        return [ self.read( number ) for number in sorted( numbers ) ]
+    #enddef
+
+    # Returns the intervals with both endpoints in names, in file order.
+    # names - iterable of str: marker names, e.g. the markers of a component
+    def intervals_within( self, names ):
+        names = set( names )
+        numbers = set()
+        for name in names:
+            numbers.update( self.numbers_with( name ) )
+        answer = []
+        for number in sorted( numbers ):
+            interval = self.read( number )
+            if ( markers.extremity_name( interval.marker_ids[0] ) in names and
+                    markers.extremity_name( interval.marker_ids[-1] ) in names ):
+                answer.append( interval )
+        return answer
+    #enddef
+
+    # Iterates over all the intervals, in file order.
+    def __iter__( self ):
+        for number in xrange( len( self.offsets ) ):
+            yield self.read( number )
+    #enddef
+
+    # Returns an IntervalDict with the given intervals, all of them by default.
+    def to_interval_dict( self, ints=None ):
+        answer = intervals.IntervalDict()
+        for interval in ( self if ints == None else ints ):
+            answer.add( interval )
+        return answer
+    #enddef
+#endclass
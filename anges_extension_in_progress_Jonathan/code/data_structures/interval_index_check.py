@@ -0,0 +1,149 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import markers
+import intervals
+import interval_index
+import weights
+
+# Check of the indexed intervals files (interval_index) by round trip.
+#
+# Random intervals, with float or exact weights (see weights.set_exact), are
+# written with interval_index.write_index_file and read back with an
+# IntervalIndex after the families are renumbered, as in a later run. The
+# intervals read, by iteration, by id and by endpoint (intervals_with,
+# intervals_touching and intervals_within), must be the ones written, with
+# their markers named as before, and the ones that a scan of the written
+# intervals selects. Reading an interval with a family that is not in the
+# run must raise KeyError without adding the family.
+#
+# Usage: python data_structures/interval_index_check.py [cases [seed]]
+
+FAMILIES = 8
+
+
+# Function to build random intervals.
+# Output:
+#    list of Interval - some ids are repeated
+def random_intervals():
+    ints = []
+    for number in xrange( random.randint( 0, 20 ) ):
+        marker_ids = [ random.randrange( 2 * FAMILIES ) for _ in xrange( random.randint( 1, 5 ) ) ]
+        loci = [ markers.Locus( random.choice( [ "A", "B" ] ), "c1", start, start + 5,
+                                random.choice( [ -1, 0, 1 ] ), random.choice( [ "", "note" ] ) )
+                 for start in random.sample( xrange( 100 ), random.randint( 0, 3 ) ) ]
+        ints.append( intervals.Interval(
+            id=str( random.randint( 0, number ) ),
+            marker_ids=marker_ids,
+            loci=loci,
+            order=intervals.Order( random.randint( 0, 1 ) ),
+            weight=weights.parse( random.choice( [ "1", "0.25", repr( random.random() ) ] ) ),
+            comment=random.choice( [ "", "a comment" ] ),
+            ) )
+    return ints
+
+# Function to list intervals in a comparable form, with their markers by
+# name.
+def interval_list( ints ):
+    return [ ( interval.id, [ markers.extremity_name( m ) for m in interval.marker_ids ],
+               interval.order.order_type, interval.weight, interval.comment,
+               [ ( l.species, l.chromosome, l.start, l.end, l.orientation, l.comment )
+                 for l in interval.loci ] )
+             for interval in ints ]
+
+# Function to check the reading of an indexed file.
+# Arguments:
+#    index: IntervalIndex
+#    ints: list of Interval - the intervals written, as interval_list
+#    names: list of str - the marker names of the run
+# Output:
+#    str - the first difference found, None if there is none
+def compare( index, ints, names ):
+    if interval_list( index ) != ints:
+        return "intervals %s" % interval_list( index )
+    ids = [ interval[0] for interval in ints ]
+    for ident in set( ids ) | set( [ "none" ] ):
+        found = index.get( ident )
+        expected = ints[ ids.index( ident ) ] if ident in ids else None
+        if ( interval_list( [ found ] )[0] if found != None else None ) != expected:
+            return "id %s" % ident
+    for name in names:
+        expected = [ interval for interval in ints if name in ( interval[1][0], interval[1][-1] ) ]
+        if interval_list( index.intervals_with( name ) ) != expected:
+            return "endpoint %s" % name
+    selected = set( random.sample( names, random.randint( 0, len( names ) ) ) )
+    touching = [ interval for interval in ints
+                 if interval[1][0] in selected or interval[1][-1] in selected ]
+    within = [ interval for interval in ints
+               if interval[1][0] in selected and interval[1][-1] in selected ]
+    if ( interval_list( index.intervals_touching( selected ) ) != touching or
+            interval_list( index.intervals_within( selected ) ) != within ):
+        return "markers %s" % sorted( selected )
+    return None
+
+# Function to check indexed files of random intervals.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    directory = tempfile.mkdtemp()
+    file_name = os.path.join( directory, "intervals" + interval_index.INDEX_SUFFIX )
+    try:
+        for case in xrange( cases ):
+            weights.set_exact( random.random() < 0.5 )
+            try:
+                families = [ "f%d" % family for family in xrange( FAMILIES ) ]
+                markers.set_family_names( families )
+                ints = random_intervals()
+                interval_index.write_index_file( file_name, ints )
+                ints = interval_list( ints )
+
+                # A later run, with the families in another order.
+                random.shuffle( families )
+                markers.set_family_names( families )
+                names = [ markers.extremity_name( m ) for m in xrange( 2 * FAMILIES ) ]
+                index = interval_index.IntervalIndex( file_name )
+                try:
+                    error = compare( index, ints, names )
+                finally:
+                    index.close()
+
+                # A run without one of the families.
+                missing = families.pop()
+                markers.set_family_names( families )
+                index = interval_index.IntervalIndex( file_name )
+                try:
+                    for number in xrange( len( index ) ):
+                        unknown = missing + "_h" in ints[ number ][1] or missing + "_t" in ints[ number ][1]
+                        try:
+                            index.read( number )
+                            if unknown:
+                                error = error or "interval %d read without %s" % ( number, missing )
+                        except KeyError:
+                            if not unknown:
+                                error = error or "interval %d not read" % number
+                    if markers.FAMILY_NAMES != families:
+                        error = error or "families %s added" % markers.FAMILY_NAMES[ len( families ) : ]
+                finally:
+                    index.close()
+            finally:
+                weights.set_exact( False )
+            if error != None:
+                print "case %d: %s, written %s" % ( case, error, ints )
+                failed += 1
+    finally:
+        shutil.rmtree( directory )
+    return failed
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 500
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )
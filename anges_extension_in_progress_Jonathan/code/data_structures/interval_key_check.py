@@ -0,0 +1,112 @@
+import random
+import sys
+
+import intervals
+
+# Check of the canonical interval keys of IntervalDict (see
+# intervals.interval_key) against a list of the intervals it holds.
+#
+# Random intervals are added to and deleted from an IntervalDict, looked up
+# by their marker IDs or their reverse. The markers include -1 and -2, whose
+# tuples hash alike, so that some distinct intervals have the same hash, and
+# some intervals are palindromes. After each operation the IntervalDict must
+# hold exactly the intervals of the list, an interval and its reverse being
+# the same, find each of them by endpoint, keep no empty endpoint entry and,
+# while no two keys have the same hash, iterate in the order of a dict keyed
+# by the hash of the key (the original IntervalDict).
+#
+# Usage: python data_structures/interval_key_check.py [cases [seed]]
+
+MARKERS = [ -2, -1, 0, 1, 2, 3 ]
+
+
+# Function to draw random marker IDs, sometimes a palindrome.
+def random_ids():
+    ids = [ random.choice( MARKERS ) for _ in xrange( random.randint( 1, 3 ) ) ]
+    if random.random() < 0.2:
+        ids += ids[ -2::-1 ]
+    return ids
+
+# Function to find an interval of a list by its marker IDs or their reverse.
+# Output:
+#    index in the list, None if it is not there
+def find( held, ids ):
+    for k, interval in enumerate( held ):
+        if interval.marker_ids == ids or interval.marker_ids == ids[::-1]:
+            return k
+    return None
+
+# Function to compare an IntervalDict with the list of intervals it holds.
+# Arguments:
+#    ints: IntervalDict
+#    held: list of Interval
+#    by_hash: dict of Interval keyed by the hash of their key, None once
+#             two keys had the same hash
+# Output:
+#    str - the first difference found, None if there is none
+def compare( ints, held, by_hash ):
+    if len( ints ) != len( held ):
+        return "%d intervals instead of %d" % ( len( ints ), len( held ) )
+    for interval in held:
+        for ids in ( interval.marker_ids, interval.marker_ids[::-1] ):
+            if not ids in ints or ints[ ids ] is not interval:
+                return "%s not found" % ids
+    for marker in MARKERS:
+        found = sorted( id( interval ) for interval in ints.intervals_with( marker ) )
+        expected = sorted( id( interval ) for interval in held
+                           if marker in ( interval.marker_ids[0], interval.marker_ids[-1] ) )
+        if found != expected:
+            return "endpoint %d" % marker
+    if [ marker for marker, keys in ints.endpoints.iteritems() if not keys ]:
+        return "empty endpoints"
+    if by_hash != None and list( ints.itervalues() ) != by_hash.values():
+        return "order %s instead of %s" % ( list( ints.itervalues() ), by_hash.values() )
+    return None
+
+# Function to check random operations on IntervalDicts.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    for case in xrange( cases ):
+        ints = intervals.IntervalDict()
+        held = []
+        by_hash = {}
+        error = None
+        for number in xrange( random.randint( 1, 40 ) ):
+            ids = random_ids()
+            k = find( held, ids )
+            if k != None and random.random() < 0.5:
+                del ints[ ids ]
+                del held[k]
+                if by_hash != None:
+                    del by_hash[ hash( intervals.interval_key( ids ) ) ]
+            elif k == None:
+                if ids in ints:
+                    error = "%s found before it is added" % ids
+                    break
+                interval = intervals.Interval( str( number ), ids, [], intervals.Order( 1 ), 1, '' )
+                ints.add( interval )
+                held.append( interval )
+                if by_hash != None:
+                    if hash( intervals.interval_key( ids ) ) in by_hash:
+                        by_hash = None
+                    else:
+                        by_hash[ hash( intervals.interval_key( ids ) ) ] = interval
+            error = compare( ints, held, by_hash )
+            if error != None:
+                break
+        if error != None:
+            print "case %d: %s, intervals %s" % ( case, error, [ i.marker_ids for i in held ] )
+            failed += 1
+    return failed
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 1000
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )
@@ -1,16 +1,19 @@
-from decimal import *
+import array
+import bisect
 
 import markers
+import weights
 
 
 # intervals of markers and adjacencies, syntenies
 class Interval:
     # Interval constructor
     # ident - str: the interval identity
-    # marker_ids - list of strings: the list of marker IDs in the interval
+    # marker_ids - list of int: the list of doubled marker IDs in the interval (see markers.to_doubled)
     # loci - list of Locus: the list of loci the interval is at
     # order - Order: the ordering of the intrerval (linear, unordered)
-    # weight - Decimal: the weight of the interval (~probability of appearance in the ancestor)
+    # weight - float: the weight of the interval (~probability of appearance in the ancestor), Decimal in exact
+    #          mode (see weights)
     # comment - str: comment
     def __init__(self, id, marker_ids, loci, order, weight, comment):
         self.id = id
@@ -22,7 +25,7 @@ class Interval:
     #enddef
 
     def __repr__(self):
-        #Return the direct representation of Genome_pairs_index class
+        #Return the direct representation of Interval class
         return "id={} marker_ids={} loci={} order={} weight={} comment={}".format(self.id, self.marker_ids, self.loci, self.order, self.weight, self.comment)
 
     def getWeight(self):
@@ -39,10 +42,10 @@ class Interval:
             comment_str = ""
         #endif
 
-        string = ">" + self.id +  " " + str(self.weight) + " " + str(self.order) + " "
+        string = ">" + self.id +  " " + weights.to_string(self.weight) + " " + str(self.order) + " "
 
         for m in self.marker_ids:
-            string = string + " " + m
+            string = string + " " + markers.extremity_name(m)
         #endfor
 
         return string + comment_str
@@ -75,9 +78,11 @@ class Interval:
     # reads an interval from a file
     # file_stream - the file_stream to read from
     # first_line - the first line of the file_stream if already read from otherwise None
+    # file_name - str: name of the file (for error messages)
+    # report - ParseReport: where to record errors in loci, printed if None
     # Return - Interval
     @staticmethod
-    def from_file(file_stream, first_line):
+    def from_file(file_stream, first_line, file_name="", report=None):
         if first_line == None:
             line = file_stream.readline()
         else:
@@ -101,7 +106,7 @@ class Interval:
                 #endif
 
                 if interval != None:
-                    locus = markers.Locus.from_string(line)
+                    locus = markers.parse_locus(line, None, file_name, report)
 
                     if locus != None:
                         interval.loci.append(locus)
@@ -151,7 +156,7 @@ class Interval:
         ident = split[0].strip()
 
         try:
-            weight = Decimal(split[1].strip())
+            weight = weights.parse(split[1].strip())
         except:
             print("Warning: weight not a number for interval. String: \'" + string + "\'")
 
@@ -169,7 +174,15 @@ class Interval:
         marker_ids = []
 
         for i in xrange(3, len(split)):
-            marker_ids.append( split[i].strip() )
+            marker_id = markers.extremity_from_name( split[i].strip() )
+
+            if marker_id == None:
+                print("Warning: not a doubled marker in interval. String: \'" + string + "\'")
+
+                return None
+            #endif
+
+            marker_ids.append( marker_id )
         #endfor
 
         order = Order(order_type)
@@ -212,61 +225,74 @@ class Order:
     #enddef
 #enddef
 
+# Canonical key of a list of marker IDs: the smaller of ids and reversed(ids)
+# as a tuple, so that an interval and its reverse have the same key. Keys are
+# compared whole, distinct intervals never share one.
+def interval_key( ids ):
+    ids1 = tuple( ids )
+    ids2 = ids1[::-1]
+    if ids1 < ids2:
+        return ids1
+    else:
+        return ids2
+
 # Class to store intervals. Offers average constant time lookup, insertion and
 # deletion based on marker ID list, and average constant time query of intervals
 # that contain a specified ID as endpoint.
 class IntervalDict:
     def __init__( self ):
-        # Main interval dictionary.
+        # Main interval dictionary, keyed by the canonical tuple of the marker
+        # IDs (see key).
         self.ints = {}
         # To look up intervals by endpoint, keep an additional dictionary that
-        # maps each marker ID to a list keys for 'ints' (list of marker IDs).
+        # maps each marker ID to the set of keys in 'ints' of the intervals
+        # with this endpoint.
         self.endpoints = {}
+        # Optional inverted index that maps each marker ID to the set of keys
+        # of the intervals containing it, built by the first containment query
+        # (see marker_index) and kept up to date from then on.
+        self.containing = None
 
     def __repr__(self):
         #Return the direct representation 
         return "Intervals={} Endpoints={} ".format(self.ints, self.endpoints)
 
 
-    # Custom hash function for list of marker IDs, hashes ids and reversed(ids)
-    # to the same value. The results will be the keys in the internal dict.
-    def hash_ids( self, ids ):
-        ids1 = tuple( ids )
-        ids2 = tuple( reversed( ids ) )
-        if ''.join(ids1) < ''.join(ids2):
-            return hash(ids1)
-        else:
-            return hash(ids2)
+    # Canonical key of a list of marker IDs, see interval_key.
+    def key( self, ids ):
+        return interval_key( ids )
 
     def __getitem__( self, ids ):
-        return self.ints[self.hash_ids(ids)]
+        return self.ints[self.key(ids)]
 
     def __setitem__( self, ids, interval ):
-        self.ints[self.hash_ids(ids)] = interval
+        key = self.key(ids)
+        self.ints[key] = interval
         # Manage endpoint database:
-        id1, id2 = ids[0], ids[-1]
-        if id1 not in self.endpoints:
-            self.endpoints[ id1 ] = []
-        if id2 not in self.endpoints:
-            self.endpoints[ id2 ] = []
-        self.endpoints[ id1 ].append( ids )
-        self.endpoints[ id2 ].append( ids )
+        for endpoint in ( key[0], key[-1] ):
+            keys = self.endpoints.get( endpoint )
+            if keys == None:
+                keys = self.endpoints[ endpoint ] = set()
+            keys.add( key )
+        if self.containing != None:
+            self.index_key( key )
 
     def __delitem__( self, ids ):
-        del self.ints[self.hash_ids(ids)]
+        key = self.key(ids)
+        del self.ints[key]
         # Manage endpoint database:
-        id1, id2 = ids[0], ids[-1]
-        for i, ids_other in enumerate( self.endpoints[ id1 ] ):
-            if ids == ids_other:
-                del self.endpoints[ id1 ][i]
-        for i, ids_other in enumerate( self.endpoints[ id2 ] ):
-            if ids == ids_other:
-                del self.endpoints[ id2 ][i]
-        if not self.endpoints[ id1 ]:
-            del self.endpoints[ id1 ]
-        if not self.endpoints[ id2 ]:
-            del self.endpoints[ id2 ]
-
+        for endpoint in ( key[0], key[-1] ):
+            keys = self.endpoints.get( endpoint )
+            if keys != None:
+                keys.discard( key )
+                if not keys:
+                    del self.endpoints[ endpoint ]
+        if self.containing != None:
+            for marker in set( key ):
+                keys = self.containing[ marker ]
+                keys.discard( key )
+                if not keys:
+                    del self.containing[ marker ]
 
     def __iter__( self ):
         return iter(self.ints)
@@ -275,7 +301,7 @@ class IntervalDict:
         return self.ints.itervalues()
 
     def __contains__( self, ids ):
-        return self.hash_ids(ids) in self.ints
+        return self.key(ids) in self.ints
 
     def __len__( self ):
         return len(self.ints)
@@ -288,10 +314,42 @@ class IntervalDict:
 
     def intervals_with( self, identity ):
         if identity in self.endpoints:
-            return [ self[ ids ] for ids in self.endpoints[ identity ] ]
+            return [ self.ints[ key ] for key in self.endpoints[ identity ] ]
         else:
             return []
 
+    # Adds the key of an interval to the marker index.
+    def index_key( self, key ):
+        for marker in key:
+            keys = self.containing.get( marker )
+            if keys == None:
+                keys = self.containing[ marker ] = set()
+            keys.add( key )
+
+    # Returns the marker index (see containing), building it if needed.
+    def marker_index( self ):
+        if self.containing == None:
+            self.containing = {}
+            for key in self.ints:
+                self.index_key( key )
+        return self.containing
+
+    # Returns the intervals that contain the marker ID identity anywhere, in
+    # key order.
+    def intervals_containing( self, identity ):
+        keys = self.marker_index().get( identity, () )
+        return [ self.ints[ key ] for key in sorted( keys ) ]
+
+    # Returns the intervals that contain both marker IDs id1 and id2, in key
+    # order.
+    def intervals_containing_both( self, id1, id2 ):
+        index = self.marker_index()
+        keys1 = index.get( id1, set() )
+        keys2 = index.get( id2, set() )
+        if len( keys1 ) > len( keys2 ):
+            keys1, keys2 = keys2, keys1
+        return [ self.ints[ key ] for key in sorted( key for key in keys1 if key in keys2 ) ]
+
     @property
     def total_weight( self ):
         answer = 0
@@ -299,42 +357,255 @@ class IntervalDict:
             answer += interval.weight
         return answer
 
-# reads intervals from a file
-# file_name - str: the name of the file to read from
-# interval_list - list of Interval: the list to add to (Default = [])
-# Return - list of Interval: the list of intervals read
-def read_intervals_file(file_name, interval_list = []):
-    file_stream = open(file_name)
+# Class to store a fixed set of intervals by columns, each interval in a row
+# numbered in the iteration order of the intervals it is built from:
+#   marker_ids, offsets - the marker IDs of all the rows end to end, the IDs of
+#                         row r are marker_ids[ offsets[r]:offsets[r+1] ]
+#   weights             - the weight of each row
+#   intervals           - side table of the Interval objects (loci, order,
+#                         comment)
+# Subsets of the stored intervals (e.g. realizable, discarded, explored) are
+# IntervalSelection masks over the store rather than copied IntervalDicts.
+class IntervalStore:
+    # IntervalStore constructor
+    # ints - IntervalDict or list of Interval: the intervals to store
+    def __init__( self, ints ):
+        if isinstance( ints, IntervalDict ):
+            ints = ints.itervalues()
+        self.intervals = []
+        self.offsets = array.array( 'l', [ 0 ] )
+        self.marker_ids = array.array( 'l' )
+        self.weights = weights.column()
+        # Row keyed by interval key (see interval_key).
+        self.rows = {}
+        # Rows keyed by endpoint marker ID.
+        self.endpoints = {}
+        # Rows keyed by the marker IDs they contain, see rows_containing.
+        self.containing = None
+        for interval in ints:
+            row = len( self.intervals )
+            self.intervals.append( interval )
+            self.marker_ids.extend( interval.marker_ids )
+            self.offsets.append( len( self.marker_ids ) )
+            self.weights.append( interval.weight )
+            self.rows[ interval_key( interval.marker_ids ) ] = row
+            for endpoint in set( [ interval.marker_ids[0], interval.marker_ids[-1] ] ):
+                self.endpoints.setdefault( endpoint, [] ).append( row )
+
+    def __repr__( self ):
+        return "IntervalStore {} intervals".format( len( self ) )
+
+    def __len__( self ):
+        return len( self.intervals )
+
+    # Returns the marker IDs of a row.
+    def row_ids( self, row ):
+        return self.marker_ids[ self.offsets[ row ]:self.offsets[ row + 1 ] ]
+
+    # Returns the row of the interval with the given marker IDs, None if it is
+    # not stored.
+    def row( self, ids ):
+        return self.rows.get( interval_key( ids ) )
+
+    # Returns the rows that contain the marker ID identity anywhere, in order.
+    # The index of all the markers is built by the first call.
+    def rows_containing( self, identity ):
+        if self.containing == None:
+            self.containing = {}
+            for row in xrange( len( self ) ):
+                for marker in set( self.row_ids( row ) ):
+                    self.containing.setdefault( marker, array.array( 'l' ) ).append( row )
+        return self.containing.get( identity, () )
+
+    # Returns an IntervalSelection of the given intervals, none by default.
+    # ints - IntervalDict or list of Interval: stored intervals
+    def select( self, ints=() ):
+        selection = IntervalSelection( self )
+        if isinstance( ints, IntervalDict ):
+            ints = ints.itervalues()
+        for interval in ints:
+            selection.add( interval )
+        return selection
+
+    # Returns an IntervalSelection of all the stored intervals.
+    def select_all( self ):
+        return IntervalSelection( self, bytearray( '\x01' ) * len( self ) )
+
+# Table to complement selection masks with bytearray.translate.
+COMPLEMENT_TABLE = bytearray( [ 1, 0 ] ) + bytearray( 254 )
+
+# Class to select a subset of the intervals of an IntervalStore with a mask,
+# one byte per row. It can be used instead of an IntervalDict of stored
+# intervals: it has the same lookup, insertion, deletion and endpoint queries,
+# iterates over the intervals in row order, and is copied or complemented
+# without copying the intervals.
+class IntervalSelection:
+    # IntervalSelection constructor
+    # store - IntervalStore: the intervals to select from
+    # mask - bytearray: 1 for the selected rows, no row is selected by default
+    def __init__( self, store, mask=None ):
+        self.store = store
+        if mask == None:
+            mask = bytearray( len( store ) )
+        self.mask = mask
+        self.count = mask.count( '\x01' )
+        # No row before first is selected.
+        self.first = 0
+
+    def __repr__( self ):
+        return "IntervalSelection {}/{} intervals".format( self.count, len( self.store ) )
+
+    # Returns the row of the selected interval with the given marker IDs.
+    # Raises KeyError if it is not selected.
+    def selected_row( self, ids ):
+        row = self.store.row( ids )
+        if row == None or not self.mask[ row ]:
+            raise KeyError( ids )
+        return row
+
+    def __getitem__( self, ids ):
+        return self.store.intervals[ self.selected_row( ids ) ]
+
+    def __delitem__( self, ids ):
+        self.mask[ self.selected_row( ids ) ] = 0
+        self.count -= 1
+
+    # Selects a stored interval. Raises KeyError if it is not in the store.
+    def add( self, interval ):
+        row = self.store.row( interval.marker_ids )
+        if row == None:
+            raise KeyError( interval.marker_ids )
+        if not self.mask[ row ]:
+            self.mask[ row ] = 1
+            self.count += 1
+            self.first = min( self.first, row )
+
+    def __contains__( self, ids ):
+        row = self.store.row( ids )
+        return row != None and self.mask[ row ] == 1
+
+    def __len__( self ):
+        return self.count
+
+    def __nonzero__( self ):
+        return self.count > 0
+
+    # Iterates over the selected rows in order.
+    def iterrows( self ):
+        mask = self.mask
+        while self.first < len( mask ) and not mask[ self.first ]:
+            self.first += 1
+        for row in xrange( self.first, len( mask ) ):
+            if mask[ row ]:
+                yield row
+
+    def __iter__( self ):
+        for row in self.iterrows():
+            yield interval_key( self.store.intervals[ row ].marker_ids )
+
+    def itervalues( self ):
+        intervals = self.store.intervals
+        for row in self.iterrows():
+            yield intervals[ row ]
 
-    line = file_stream.readline()
+    def intervals_with( self, identity ):
+        return [ self.store.intervals[ row ]
+                 for row in self.store.endpoints.get( identity, () )
+                 if self.mask[ row ] ]
+
+    # Returns the selected intervals that contain the marker ID identity
+    # anywhere, in row order.
+    def intervals_containing( self, identity ):
+        return [ self.store.intervals[ row ]
+                 for row in self.store.rows_containing( identity )
+                 if self.mask[ row ] ]
+
+    # Returns the selected intervals that contain both marker IDs id1 and id2,
+    # in row order. The rows of the rarer marker are looked up in the sorted
+    # rows of the other one.
+    def intervals_containing_both( self, id1, id2 ):
+        rows1 = self.store.rows_containing( id1 )
+        rows2 = self.store.rows_containing( id2 )
+        if len( rows1 ) > len( rows2 ):
+            rows1, rows2 = rows2, rows1
+        answer = []
+        position = 0
+        for row in rows1:
+            position = bisect.bisect_left( rows2, row, position )
+            if position == len( rows2 ):
+                break
+            if rows2[ position ] == row and self.mask[ row ]:
+                answer.append( self.store.intervals[ row ] )
+        return answer
 
-    while len(line) > 0:
+    @property
+    def total_weight( self ):
+        answer = 0
+        column = self.store.weights
+        for row in self.iterrows():
+            answer += column[ row ]
+        return answer
+
+    # Returns a selection of the same rows.
+    def copy( self ):
+        return IntervalSelection( self.store, bytearray( self.mask ) )
+
+    # Returns a selection of the rows not in this one.
+    def complement( self ):
+        return IntervalSelection( self.store, self.mask.translate( COMPLEMENT_TABLE ) )
+
+# Generator over the Interval objects in the lines of an intervals file (see
+# Interval.__str__ for the format). Lines before the first interval and loci of
+# malformed intervals are skipped.
+# lines - iterable of str: the lines to parse
+# file_name - str: name of the file the lines come from
+# report - ParseReport: where to record errors in loci, printed if None
+# Return - yields Interval objects in file order
+def read_intervals(lines, file_name, report=None):
+    interval = None
+    for line_number, line in enumerate(lines, 1):
         trunc_line = line.strip()
 
-        if len(trunc_line) > 0:
-            if trunc_line[0] == '>':
-                # read first interval
-                interval, line = Interval.from_file(file_stream, trunc_line)
-                if interval != None:
-                    interval_list.append(interval)
-                #endif
+        if len(trunc_line) == 0:
+            continue
+        #endif
 
-                # read the rest of the intervals
-                while len(line) > 0:
-                    interval, line = Interval.from_file(file_stream, line)
-                    if interval != None:
-                        interval_list.append(interval)
-                    #endif
-                #endwhile
-            else:
-                line = file_stream.readline()
+        if trunc_line[0] == '>':
+            if interval != None:
+                yield interval
+            #endif
+            interval = Interval.opening_from_string(trunc_line)
+        elif interval != None:
+            locus = markers.parse_locus(trunc_line, line_number, file_name, report)
+
+            if locus != None:
+                interval.loci.append(locus)
             #endif
-        else:
-            line = file_stream.readline()
         #endif
+    #endfor
+
+    if interval != None:
+        yield interval
     #endif
+#enddef
 
-    file_stream.close()
+# reads intervals from a file
+# file_name - str: the name of the file to read from
+# interval_list - list of Interval: the list to add to (Default = new list)
+# report - ParseReport: where to record errors in loci, printed if None
+# Return - list of Interval: the list of intervals read
+def read_intervals_file(file_name, interval_list = None, report = None):
+    if interval_list == None:
+        interval_list = []
+    #endif
+
+    file_stream = open(file_name)
+
+    try:
+        interval_list.extend(read_intervals(file_stream, file_name, report))
+    finally:
+        file_stream.close()
+    #endtry
 
     return interval_list
 #enddef
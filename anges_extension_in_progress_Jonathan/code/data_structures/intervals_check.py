@@ -0,0 +1,98 @@
+import random
+import sys
+
+import intervals
+
+# Check of the containment queries of IntervalDict and IntervalSelection
+# (intervals_containing, intervals_containing_both) against brute force.
+#
+# Random intervals are added to an IntervalDict, some of them before its
+# marker index is built by a first query and some after, and some are
+# deleted again. The same intervals are stored in an IntervalStore, with a
+# random selection of them. Every marker and pair of markers is then queried
+# and compared with a scan of the intervals.
+#
+# Usage: python data_structures/intervals_check.py [cases [seed]]
+
+MARKERS = 24
+
+
+# Function to build a random interval of distinct markers.
+def random_interval( number ):
+    marker_ids = random.sample( xrange( MARKERS ), random.randint( 2, 6 ) )
+    return intervals.Interval(
+        id=str( number ),
+        marker_ids=marker_ids,
+        loci=[],
+        order=intervals.Order( 0 ),
+        weight=1,
+        comment='',
+        )
+
+# Function to compare the answers of a query with the intervals expected.
+# Output:
+#    True if they are the same intervals in the same order
+def same( found, expected ):
+    return [ id( interval ) for interval in found ] == [ id( interval ) for interval in expected ]
+
+# Function to check an IntervalDict against a scan of its intervals.
+def check_dict( ints ):
+    ordered = [ ints.ints[ key ] for key in sorted( ints.ints ) ]
+    for m1 in xrange( MARKERS ):
+        expected = [ interval for interval in ordered if m1 in interval.marker_ids ]
+        if not same( ints.intervals_containing( m1 ), expected ):
+            return False
+        for m2 in xrange( MARKERS ):
+            both = [ interval for interval in expected if m2 in interval.marker_ids ]
+            if not same( ints.intervals_containing_both( m1, m2 ), both ):
+                return False
+    return True
+
+# Function to check an IntervalSelection against a scan of its intervals.
+def check_selection( selection ):
+    selected = list( selection.itervalues() )
+    for m1 in xrange( MARKERS ):
+        expected = [ interval for interval in selected if m1 in interval.marker_ids ]
+        if not same( selection.intervals_containing( m1 ), expected ):
+            return False
+        for m2 in xrange( MARKERS ):
+            both = [ interval for interval in expected if m2 in interval.marker_ids ]
+            if not same( selection.intervals_containing_both( m1, m2 ), both ):
+                return False
+    return True
+
+# Function to check the containment queries on random intervals.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    for case in xrange( cases ):
+        ints = intervals.IntervalDict()
+        for number in xrange( random.randint( 0, 30 ) ):
+            ints.add( random_interval( number ) )
+        ok = check_dict( ints )
+        # Changes after the index is built.
+        for number in xrange( random.randint( 0, 10 ) ):
+            ints.add( random_interval( 100 + number ) )
+        for key in random.sample( list( ints ), len( ints ) // 3 ):
+            del ints[ key ]
+        ok = ok and check_dict( ints )
+
+        store = intervals.IntervalStore( ints )
+        selection = store.select( [ interval for interval in ints.itervalues()
+                                    if random.random() < 0.7 ] )
+        ok = ok and check_selection( selection ) and check_selection( store.select_all() )
+        if not ok:
+            print "case %d failed" % case
+            failed += 1
+    return failed
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 300
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )
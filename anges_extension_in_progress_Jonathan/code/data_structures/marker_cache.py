@@ -0,0 +1,188 @@
+import sys
+import array
+import hashlib
+import cPickle
+
+import markers
+
+# Columnar binary cache of a parsed homologous families file.
+#
+# The cache is written next to the input file (<file name>.cache) and holds
+# the parsed families as integer columns plus interned string tables:
+#   header line        CACHE_MAGIC
+#   pickled dict       key, string tables, column lengths, parse report
+#   arrays             one array.array per column, in COLUMNS order
+# The key combines the SHA-1 of the input file with the cache format, so a
+# change to either invalidates the cache.
+
+CACHE_MAGIC = "ANGES-HOMFAM-CACHE 2\n"
+CACHE_SUFFIX = ".cache"
+
+# (column name, array typecode), family columns first, then locus columns.
+COLUMNS = [ ( "family_id", "i" ),          # index in 'strings'
+            ( "family_copy_number", "i" ),
+            ( "family_comment", "i" ),     # index in 'strings'
+            ( "locus_family", "i" ),       # index of the family of the locus
+            ( "locus_species", "i" ),      # index in 'species'
+            ( "locus_chromosome", "i" ),   # index in 'chromosomes'
+            ( "locus_start", "l" ),
+            ( "locus_end", "l" ),
+            ( "locus_orientation", "b" ),
+            ( "locus_comment", "i" ) ]     # index in 'strings'
+
+
+# Function to compute the cache key of a homologous families file.
+# Arguments:
+#   file_name: str - the homologous families file
+# Output:
+#   str - hex digest identifying the file contents and the cache format
+def cache_key( file_name ):
+    digest = hashlib.sha1()
+    update_digest( digest, file_name )
+    digest.update( CACHE_MAGIC + sys.byteorder )
+    digest.update( repr( [ array.array( t ).itemsize for _, t in COLUMNS ] ) )
+    return digest.hexdigest()
+
+# Function to feed the contents of a file to a hashlib digest.
+# Arguments:
+#   digest: hashlib object
+#   file_name: str - the file to hash
+def update_digest( digest, file_name ):
+    file_stream = open( file_name, 'rb' )
+    try:
+        block = file_stream.read( 1 << 20 )
+        while block:
+            digest.update( block )
+            block = file_stream.read( 1 << 20 )
+    finally:
+        file_stream.close()
+
+# Function to encode families as columns and string tables.
+# Arguments:
+#   hom_fams: list of HomFam objects
+# Output:
+#   tables: dict of lists of str - 'strings', 'species' and 'chromosomes'
+#   columns: dict of array.array - keyed by the names in COLUMNS
+def to_columns( hom_fams ):
+    strings = StringTable()
+    species = StringTable()
+    chromosomes = StringTable()
+    columns = dict( ( name, array.array( t ) ) for name, t in COLUMNS )
+
+    for i, hom_fam in enumerate( hom_fams ):
+        columns[ "family_id" ].append( strings.index( hom_fam.id ) )
+        columns[ "family_copy_number" ].append( hom_fam.copy_number )
+        columns[ "family_comment" ].append( strings.index( hom_fam.comment ) )
+        for locus in hom_fam.loci:
+            columns[ "locus_family" ].append( i )
+            columns[ "locus_species" ].append( species.index( locus.species ) )
+            columns[ "locus_chromosome" ].append(
+                chromosomes.index( locus.chromosome ) )
+            columns[ "locus_start" ].append( locus.start )
+            columns[ "locus_end" ].append( locus.end )
+            columns[ "locus_orientation" ].append( locus.orientation )
+            columns[ "locus_comment" ].append( strings.index( locus.comment ) )
+
+    tables = { "strings": strings.values,
+               "species": species.values,
+               "chromosomes": chromosomes.values }
+    return tables, columns
+
+# Function to decode families from columns and string tables, see to_columns.
+# Arguments:
+#   tables: dict of lists of str
+#   columns: dict of array.array
+# Output:
+#   list of HomFam objects
+def from_columns( tables, columns ):
+    strings = tables[ "strings" ]
+    species = tables[ "species" ]
+    chromosomes = tables[ "chromosomes" ]
+    hom_fams = [ markers.HomFam( strings[ ident ], [], copy_number,
+                                 strings[ comment ] )
+                 for ident, copy_number, comment in
+                 zip( columns[ "family_id" ],
+                      columns[ "family_copy_number" ],
+                      columns[ "family_comment" ] ) ]
+    for f, s, c, start, end, o, comment in zip( columns[ "locus_family" ],
+                                                columns[ "locus_species" ],
+                                                columns[ "locus_chromosome" ],
+                                                columns[ "locus_start" ],
+                                                columns[ "locus_end" ],
+                                                columns[ "locus_orientation" ],
+                                                columns[ "locus_comment" ] ):
+        hom_fams[ f ].loci.append( markers.Locus( species[ s ],
+                                                  chromosomes[ c ],
+                                                  start, end, o,
+                                                  strings[ comment ] ) )
+    return hom_fams
+
+# Function to store the parsed families of a file in its cache.
+# Arguments:
+#   file_name: str - the homologous families file that was parsed
+#   key: str - cache key of the file, see cache_key
+#   hom_fams: list of HomFam objects - the parsed families
+#   report: ParseReport - problems found while parsing
+def write_cache( file_name, key, hom_fams, report ):
+    tables, columns = to_columns( hom_fams )
+    header = { "key": key,
+               "tables": tables,
+               "lengths": [ len( columns[ name ] ) for name, _ in COLUMNS ],
+               "report": report.entries }
+
+    file_stream = open( file_name + CACHE_SUFFIX, 'wb' )
+    try:
+        file_stream.write( CACHE_MAGIC )
+        cPickle.dump( header, file_stream, cPickle.HIGHEST_PROTOCOL )
+        for name, _ in COLUMNS:
+            columns[ name ].tofile( file_stream )
+    finally:
+        file_stream.close()
+
+# Function to read the parsed families of a file from its cache.
+# Arguments:
+#   file_name: str - the homologous families file
+#   key: str - cache key of the file, see cache_key
+# Output:
+#   (list of HomFam objects, ParseReport), or None if there is no valid cache
+#   for this key.
+def read_cache( file_name, key ):
+    try:
+        file_stream = open( file_name + CACHE_SUFFIX, 'rb' )
+    except IOError:
+        return None
+    try:
+        if file_stream.readline() != CACHE_MAGIC:
+            return None
+        header = cPickle.load( file_stream )
+        if header[ "key" ] != key:
+            return None
+        columns = {}
+        for ( name, t ), length in zip( COLUMNS, header[ "lengths" ] ):
+            columns[ name ] = array.array( t )
+            columns[ name ].fromfile( file_stream, length )
+    except ( EOFError, ValueError, KeyError, cPickle.UnpicklingError ):
+        return None
+    finally:
+        file_stream.close()
+
+    report = markers.ParseReport( file_name )
+    report.entries = header[ "report" ]
+    return from_columns( header[ "tables" ], columns ), report
+
+
+# Interned table of strings, each string is stored once and referred to by its
+# index.
+class StringTable:
+    def __init__( self ):
+        self.values = []
+        self.indices = {}
+
+    # Returns the index of string in the table, adding it if needed.
+    def index( self, string ):
+        i = self.indices.get( string )
+        if i == None:
+            i = len( self.values )
+            self.indices[ string ] = i
+            self.values.append( string )
+        return i
@@ -0,0 +1,96 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import markers
+import marker_cache
+import markers_check
+
+# Check of the columnar cache of homologous families (marker_cache) by round
+# trip.
+#
+# Random homologous families files are written as in markers_check, some with
+# coordinates beyond 32 bits, and parsed with markers.iter_hom_fams. The
+# families and the parse report read back from the cache must be the ones
+# that were written, and the cache must be ignored once the file changes or
+# if it is truncated.
+#
+# Usage: python data_structures/marker_cache_check.py [cases [seed]]
+
+
+# Function to write a random homologous families file.
+# Arguments:
+#    file_name: str
+def write_random_file( file_name ):
+    lines = markers_check.random_file()
+    if random.random() < 0.3:
+        start = random.randint( 0, 1 << 40 )
+        lines += [ ">big\n", "A.1:%d-%d +\n" % ( start, start + random.randint( 0, 1 << 20 ) ) ]
+    file_stream = open( file_name, 'w' )
+    try:
+        file_stream.writelines( lines )
+    finally:
+        file_stream.close()
+
+# Function to parse a homologous families file.
+# Output:
+#    list of HomFam objects, ParseReport
+def parse( file_name ):
+    report = markers.ParseReport( file_name )
+    return list( markers.iter_hom_fams( file_name, report ) ), report
+
+# Function to check the cache of random files.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    directory = tempfile.mkdtemp()
+    file_name = os.path.join( directory, "families" )
+    try:
+        for case in xrange( cases ):
+            write_random_file( file_name )
+            hom_fams, report = parse( file_name )
+            key = marker_cache.cache_key( file_name )
+            marker_cache.write_cache( file_name, key, hom_fams, report )
+
+            cached = marker_cache.read_cache( file_name, key )
+            if cached == None:
+                print "case %d: cache not read back" % case
+                failed += 1
+                continue
+            cached_fams, cached_report = cached
+            if ( markers_check.family_list( cached_fams ) != markers_check.family_list( hom_fams ) or
+                    cached_report.entries != report.entries ):
+                print "case %d: %s, %s instead of %s, %s" % (
+                    case, markers_check.family_list( cached_fams ), cached_report.entries,
+                    markers_check.family_list( hom_fams ), report.entries )
+                failed += 1
+                continue
+
+            # A changed file or a truncated cache must not be read.
+            file_stream = open( file_name, 'a' )
+            file_stream.write( ">f\n" )
+            file_stream.close()
+            changed = marker_cache.read_cache( file_name, marker_cache.cache_key( file_name ) )
+            cache_name = file_name + marker_cache.CACHE_SUFFIX
+            file_stream = open( cache_name, 'r+b' )
+            file_stream.truncate( random.randrange( os.path.getsize( cache_name ) ) )
+            file_stream.close()
+            if changed != None or marker_cache.read_cache( file_name, key ) != None:
+                print "case %d: stale or truncated cache read" % case
+                failed += 1
+    finally:
+        shutil.rmtree( directory )
+    return failed
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 500
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )
@@ -1,6 +1,13 @@
+import re
+
 
 # locus
-class Locus:
+# Loci are the most numerous objects of a run, so they use __slots__ instead of
+# a per-instance __dict__, and species/chromosome names are interned so that
+# all loci on a chromosome share the same two strings.
+class Locus(object):
+    __slots__ = ('species', 'chromosome', 'start', 'end', 'orientation', 'comment')
+
     # Locus constructor.
     # Parameters
     # species: str - species name
@@ -10,8 +17,8 @@ class Locus:
     # orientation: int - locus orientation (positive for forwards, negative for reversed and 0 for unoriented)
     # comment: str - comment
     def __init__(self, species, chromosome, start, end, orientation, comment):
-        self.species = species
-        self.chromosome = chromosome
+        self.species = intern(species)
+        self.chromosome = intern(chromosome)
         self.start = start
         self.end = end
         if self.start > self.end: raise ValueError("The Locus ends before it begins.")
@@ -79,9 +86,12 @@ class Locus:
     # <species name> <chromosome name> <start> <end> <orientation> #<comment>
     # Parameters
     # string - str: the string to parse
+    # line_number - int: line of the string in its file (for error messages)
+    # hom_fam_dir - str: name of the file being parsed (for error messages)
+    # report - ParseReport: where to record errors, printed if None
     # Return Locus - the locus in the file (None on failure)
     @staticmethod
-    def from_string(string,line_number, hom_fam_dir):
+    def from_string(string, line_number, hom_fam_dir, report=None):
         #assert type(string) is str
 
         trunc_str = string.strip()
@@ -109,14 +119,14 @@ class Locus:
             try:
                 start = int(split_str[2])
             except:
-                print("Syntax Error at line {} (file: {}): '{}'\n\t Start coordinate not an integer for locus. ".format(line_number,hom_fam_dir,full_str))
+                Locus.syntax_error(report, line_number, hom_fam_dir, full_str, "Start coordinate not an integer for locus.")
                 return None
             #endtry
 
             try:
-                end = int(split_str[2])
+                end = int(split_str[3])
             except:
-                print("Syntax Error at line {} (file: {}): '{}'\n\t End coordinate not an integer for locus. ".format(line_number,hom_fam_dir,full_str))
+                Locus.syntax_error(report, line_number, hom_fam_dir, full_str, "End coordinate not an integer for locus.")
                 return None
             #endtry
 
@@ -129,10 +139,10 @@ class Locus:
                     orientation = 1
                 elif trunc_str[0] == '-':
                     orientation = -1
-                elif trunc_str[0].lower == 'x':
+                elif trunc_str[0].lower() == 'x':
                     orientation = 0
                 else:
-                    print("Syntax Error at line {} (file: {}): '{}'\n\t Unknown orientation for locus. ".format(line_number,hom_fam_dir,full_str))
+                    Locus.syntax_error(report, line_number, hom_fam_dir, full_str, "Unknown orientation for locus.")
                     return None
                 #endif
             #endif
@@ -140,51 +150,50 @@ class Locus:
             return Locus(species, chromosome, start, end, orientation, comment)
         #endif
         # using old format
-        species, trunc_str = Locus.obj_split(trunc_str, ".", 2, full_str, "species")
+        species, trunc_str = Locus.obj_split(trunc_str, ".", 2, full_str, "species", report, line_number)
         if trunc_str == None:
             return None
         #endif
 
-        chromosome, trunc_str = Locus.obj_split(trunc_str, ":", 2, full_str, "chromosome")
+        chromosome, trunc_str = Locus.obj_split(trunc_str, ":", 2, full_str, "chromosome", report, line_number)
         if trunc_str == None:
             return None
         #endif
 
-        start, trunc_str = Locus.obj_split(trunc_str, "-", 2, full_str, "start")
+        start, trunc_str = Locus.obj_split(trunc_str, "-", 2, full_str, "start", report, line_number)
         if trunc_str == None:
             return None
         #endif
         try:
             start = int(start)
         except:
-            print("Syntax Error at line {} (file: {}): '{}'\n\t Start coordinate not an integer for locus. ".format(line_number,hom_fam_dir,full_str))
+            Locus.syntax_error(report, line_number, hom_fam_dir, full_str, "Start coordinate not an integer for locus.")
             return None
         #endtry
 
-        end, trunc_str = Locus.obj_split(trunc_str, " ", 1, full_str, "end")
-        if trunc_str == None:
-            return None
+        end, trunc_str = Locus.obj_split(trunc_str, " ", 1, full_str, "end", report, line_number)
+        if trunc_str == None: # no orientation given
+            trunc_str = ""
         #endif
         try:
             end = int(end)
         except:
-            print("Syntax Error at line {} (file: {}): '{}'\n\t End coordinate not an integer for locus. ".format(line_number,hom_fam_dir,full_str))
+            Locus.syntax_error(report, line_number, hom_fam_dir, full_str, "End coordinate not an integer for locus.")
             return None
         #endtry
 
+        trunc_str = trunc_str.strip()
         if len(trunc_str) == 0:
             orientation = 0
         else:
-            trunc_str = trunc_str.strip()
-
             if trunc_str[0] == '+':
                 orientation = 1
             elif trunc_str[0] == '-':
                 orientation = -1
-            elif trunc_str[0].lower == 'x':
+            elif trunc_str[0].lower() == 'x':
                 orientation = 0
             else:
-                print("Syntax Error at line {} (file: {}): '{}'\n\t Unknown orientation for locus. ".format(line_number,hom_fam_dir,full_str))
+                Locus.syntax_error(report, line_number, hom_fam_dir, full_str, "Unknown orientation for locus.")
                 return None
             #endif
         #endif
@@ -199,9 +208,11 @@ class Locus:
     # size - int
     # full_string - str
     # warning name - str
+    # report - ParseReport: where to record the warning, printed if None
+    # line_number - int: line of full_string in its file
     # Return - str, str
     @staticmethod
-    def obj_split(string, delimiter, size, full_string, warning_name):
+    def obj_split(string, delimiter, size, full_string, warning_name, report=None, line_number=None):
         #assert type(string) is str
         #assert type(delimiter) is str
         #assert type(size) is int
@@ -211,7 +222,12 @@ class Locus:
         split = string.split(delimiter, 1)
 
         if len(split) < size:
-            print("Warning: could not process " + warning_name + " for locus. String: \'" + full_string + "\'")
+            message = "Warning: could not process " + warning_name + " for locus. String: \'" + full_string + "\'"
+            if report == None:
+                print(message)
+            else:
+                report.add(line_number, full_string, message)
+            #endif
 
             return None, None
         #endif
@@ -223,6 +239,23 @@ class Locus:
         return split[0], split[1]
     #enddef
 
+    # Static auxilary method for from_string: reports a syntax error in a locus
+    # string, either by printing it or by recording it in report.
+    # Parameters:
+    # report - ParseReport or None
+    # line_number - int
+    # hom_fam_dir - str: name of the file being parsed
+    # full_str - str: the locus string
+    # message - str: description of the error
+    @staticmethod
+    def syntax_error(report, line_number, hom_fam_dir, full_str, message):
+        if report == None:
+            print("Syntax Error at line {} (file: {}): '{}'\n\t {} ".format(line_number, hom_fam_dir, full_str, message))
+        else:
+            report.add(line_number, full_str, "Syntax Error: " + message)
+        #endif
+    #enddef
+
     def isOverlap(self, other):
         """
         isOverlap: compares two locus and returns True if the two are overlapped
@@ -286,7 +319,9 @@ class Locus:
 
 
 # homologous family
-class HomFam:
+class HomFam(object):
+    __slots__ = ('id', 'loci', 'copy_number', 'comment')
+
     # HomFam constructor
     # ident - str: marker identity
     # loci - list of Locus: hom. family loci
@@ -415,12 +450,14 @@ class HomFam:
     # parses a HomFam from a string
     # see opening_str for format
     # string - str: the string to parse
+    # report - ParseReport: where to record warnings, printed if None
+    # line_number - int: line of the string in its file
     @staticmethod
-    def opening_from_string(string):
+    def opening_from_string(string, report=None, line_number=None):
         trunc_line = string.strip()
 
         if len(trunc_line) < 0 or trunc_line[0] != '>':
-            print("Warning: not a hom. family. String: \'" + string + "\'")
+            HomFam.parse_warning(report, line_number, string, "Warning: not a hom. family.")
 
             return None
         #endfor
@@ -438,7 +475,7 @@ class HomFam:
         if len(split[0]) > 0:
             ident = split[0][1:] 
         else:
-            print("Warning: hom. family missing identity: \'" + string + "\'")
+            HomFam.parse_warning(report, line_number, string, "Warning: hom. family missing identity.")
 
             return None
         #endif
@@ -451,49 +488,249 @@ class HomFam:
                 try:
                     copy_number = int(copy_number)
                 except:
-                    print("Warning: copy number not an integer for homology family. String : \'" + string + "\'")
+                    HomFam.parse_warning(report, line_number, string, "Warning: copy number not an integer for homology family.")
                     return None
                 #endtry
             else:
-                print("Warning: unknown information in hom. family. String: \'" + string + "\'")
+                HomFam.parse_warning(report, line_number, string, "Warning: unknown information in hom. family.")
             #endif
         #endif
 
         return HomFam(ident, [], copy_number, comment)
     #enddef
 
+    # reports a problem with the opening string of a HomFam, either by printing
+    # it or by recording it in report
+    # report - ParseReport or None
+    # line_number - int
+    # string - str: the opening string
+    # message - str: description of the problem
+    @staticmethod
+    def parse_warning(report, line_number, string, message):
+        if report == None:
+            print(message + " String: \'" + string + "\'")
+        else:
+            report.add(line_number, string.strip(), message)
+        #endif
+    #enddef
+
+
+
+#endclass
+
+
+# diagnostics collected while parsing a homologous families file
+class ParseReport:
+    # ParseReport constructor
+    # file_name - str: name of the file being parsed
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.entries = [] # list of (line number, offending string, message)
+    #enddef
+
+    # records a problem found while parsing
+    # line_number - int: line of the offending string in the file
+    # string - str: the offending string
+    # message - str: description of the problem
+    def add(self, line_number, string, message):
+        self.entries.append((line_number, string, message))
+    #enddef
+
+    def __len__(self):
+        return len(self.entries)
+    #enddef
+
+    def __iter__(self):
+        return iter(self.entries)
+    #enddef
+
+    # returns a string with one problem per line in the format
+    # <file name>:<line number>: <message> '<string>'
+    # Return - str
+    def __str__(self):
+        string = ""
 
+        for line_number, entry, message in self.entries:
+            string = string + "{}:{}: {} '{}'\n".format(self.file_name, line_number, message, entry)
+        #endfor
 
+        return string
+    #enddef
+
+    # writes the string representation to file
+    # file_stream - file: file stream to write to
+    def to_file(self, file_stream):
+        file_stream.write(str(self))
+    #enddef
 #endclass
 
 
+# Precompiled patterns for the two common locus formats, see Locus.from_string.
+# They only accept lines that Locus.from_string parses the same way, anything
+# else goes through Locus.from_string.
+# <species name>.<chromosome name>:<start>-<end> <orientation> <name> #<comment>
+LOCUS_DOTTED = re.compile(r"([^.\s#]+)\.([^:\s#]+):(\d+)-(\d+)(?: +([-+xX])[^\s#]*(?:\s+[^\s#]+)?)?\s*(?:#(.*))?$")
+# <species name> <chromosome name> <start> <end> <orientation> ... #<comment>
+LOCUS_SPACED = re.compile(r"([^\s#]+)\s+([^\s#]+)\s+(\d+)\s+(\d+)(?:\s+([-+xX])[^\s#]*(?:\s+[^#]*?)?)?\s*(?:#(.*))?$")
+ORIENTATIONS = {'+': 1, '-': -1, 'x': 0, 'X': 0, None: 0}
+
+# Function that parses a locus from a stripped line of a homologous families
+# file, trying the precompiled patterns before Locus.from_string.
+# Arguments:
+#   string: str - the stripped line
+#   line_number: int - line of string in the file
+#   file_name: str - name of the file
+#   report: ParseReport - where to record errors, printed if None
+# Output:
+#   Locus - the parsed locus (None on failure)
+def parse_locus( string, line_number, file_name, report=None ):
+    match = LOCUS_DOTTED.match( string ) or LOCUS_SPACED.match( string )
+    try:
+        if match == None:
+            return Locus.from_string( string, line_number, file_name, report )
+        species, chromosome, start, end, orientation, comment = match.groups()
+        return Locus( species,
+                      chromosome,
+                      int( start ),
+                      int( end ),
+                      ORIENTATIONS[ orientation ],
+                      comment or "" )
+    except ValueError as error: # raised by the Locus constructor
+        Locus.syntax_error( report, line_number, file_name, string, str( error ) )
+        return None
+
+# Generator over the HomFam objects in the lines of a homologous families file.
+# Lines before the first family and loci of malformed families are skipped.
+# Arguments:
+#   lines: iterable of str - the lines to parse
+#   file_name: str - name of the file the lines come from
+#   report: ParseReport - where to record errors, printed if None
+#   first_line_number: int - line number of the first line in the file
+# Output:
+#   yields HomFam objects in file order
+def read_hom_fams( lines, file_name, report=None, first_line_number=1 ):
+    hom_fam = None
+    for line_number, line in enumerate( lines, first_line_number ):
+        trunc_line = line.strip()
+        if len( trunc_line ) == 0:
+            continue
+        if trunc_line[0] == '>':
+            if hom_fam != None:
+                yield hom_fam
+            hom_fam = HomFam.opening_from_string( trunc_line, report, line_number )
+        elif hom_fam != None:
+            locus = parse_locus( trunc_line, line_number, file_name, report )
+            if locus != None:
+                hom_fam.loci.append( locus )
+    if hom_fam != None:
+        yield hom_fam
+
+# Generator over the HomFam objects of a homologous families file, reading
+# the file lazily.
+# Arguments:
+#   file_name: str - the name of the file to read from
+#   report: ParseReport - where to record errors, printed if None
+# Output:
+#   yields HomFam objects in file order
+def iter_hom_fams( file_name, report=None ):
+    file_stream = open( file_name )
+    try:
+        for hom_fam in read_hom_fams( file_stream, file_name, report ):
+            yield hom_fam
+    finally:
+        file_stream.close()
+
+
+# Doubled markers are encoded as integers: the head extremity of the marker
+# family with index i is 2*i and its tail extremity is 2*i+1, so the sibling of
+# an extremity x is x ^ 1. The family names are kept in a symbol table and are
+# only looked up when writing output.
+FAMILY_NAMES = [] # family name of each index
+FAMILY_INDEX = {} # index of each family name
+
+# Function that returns the index of a marker family, adding it to the symbol
+# table if needed.
+# Arguments:
+#    name: string - the family (undoubled marker) name
+# Output:
+#    int - the index of the family
+def family_index( name ):
+    i = FAMILY_INDEX.get( name )
+    if i == None:
+        i = len( FAMILY_NAMES )
+        FAMILY_INDEX[ name ] = i
+        FAMILY_NAMES.append( name )
+    return i
+
+# Function that replaces the family symbol table, used to restore the
+# encoding of a previous run (doubled markers are only meaningful with the
+# table they were created with).
+# Arguments:
+#    names: list of strings - the family name of each index
+def set_family_names( names ):
+    FAMILY_NAMES[:] = names
+    FAMILY_INDEX.clear()
+    for i, name in enumerate( FAMILY_NAMES ):
+        FAMILY_INDEX[ name ] = i
+
 # Function that returns the sibling of the head/tail of an oriented, doubled marker.
 # Arguments:
-#    marker: string
+#    marker: int
 # Output:
-#    string - the 'sibling' of marker
+#    int - the 'sibling' of marker
 def sibling( marker ):
-    if marker[ -2 : ] == "_h":
-        return marker[ : -2 ] + "_t"
-    elif marker[ -2 : ] == "_t":
-        return marker[ : -2 ] + "_h"
-    return ""
+    return marker ^ 1
 
 # Function that tells if two markers are siblings.
 # Arguments:
-#   marker1, marker2: string
+#   marker1, marker2: int
 # Output:
 #   boolean: if marker1 and marker2 are siblings.
 def are_siblings( marker1, marker2 ):
-    return marker1 == sibling( marker2 )
+    return marker1 == marker2 ^ 1
 
 # Functions that translate between doubled / undoubled markers.
 # Arguments:
-#   marker: string
+#   marker: (to) string - family name, (from) int - extremity
 # Output:
-#   (to) (string, string)
-#   (from) string
+#   (to) (int, int) - head and tail extremities
+#   (from) string - family name
 def to_doubled( marker ):
-    return ( marker + "_h", marker + "_t" )
+    i = family_index( marker )
+    return ( 2 * i, 2 * i + 1 )
 def from_doubled( marker ):
-    return marker[:-2]
+    return FAMILY_NAMES[ marker >> 1 ]
+
+# Functions that translate between doubled markers and their names in files,
+# <family name>_h for heads and <family name>_t for tails.
+# Arguments:
+#   marker: (to) int - extremity, (from) string - name
+# Output:
+#   (to) string - name
+#   (from) int - extremity, None if the name is not a doubled marker
+def extremity_name( marker ):
+    if marker & 1:
+        return FAMILY_NAMES[ marker >> 1 ] + "_t"
+    return FAMILY_NAMES[ marker >> 1 ] + "_h"
+def extremity_from_name( name ):
+    if name[ -2 : ] == "_h":
+        return to_doubled( name[ : -2 ] )[0]
+    elif name[ -2 : ] == "_t":
+        return to_doubled( name[ : -2 ] )[1]
+    return None
+
+# Function like extremity_from_name that only finds the extremities of the
+# families already in the symbol table, without adding new ones.
+# Output:
+#   int - extremity, None if the name is not a doubled marker of a known family
+def find_extremity( name ):
+    if name[ -2 : ] == "_h":
+        side = 0
+    elif name[ -2 : ] == "_t":
+        side = 1
+    else:
+        return None
+    i = FAMILY_INDEX.get( name[ : -2 ] )
+    if i == None:
+        return None
+    return 2 * i + side
@@ -0,0 +1,142 @@
+import random
+import sys
+from StringIO import StringIO
+
+import markers
+
+# Check of the streaming homologous families reader (markers.read_hom_fams)
+# against the original one, a loop of HomFam.from_file parsing every locus
+# with Locus.from_string.
+#
+# Random homologous families files are written with loci in both formats,
+# with or without orientation, names and comments, with extra blanks, and
+# with malformed lines (coordinates that are not integers, unknown
+# orientations, missing fields, comments, lines before the first family and
+# families without identity). Both readers must give the same families, with
+# the same loci in the same order; the lines the original reader rejects
+# must be in the report of the streaming one.
+#
+# Usage: python data_structures/markers_check.py [cases [seed]]
+
+
+# Function to build a random locus line.
+# Output:
+#    str
+def random_locus():
+    species = random.choice( [ "A", "sp_1", "Sp2" ] )
+    chromosome = random.choice( [ "1", "chrX", "c_2" ] )
+    start = random.randint( 0, 1000 )
+    end = start + random.randint( 0, 100 )
+    coordinates = [ str( start ), str( end ) ]
+    if random.random() < 0.05:
+        coordinates[ random.randrange( 2 ) ] = random.choice( [ "a", "1.5" ] )
+    orientation = random.choice( [ "", "", "+", "-", "x", "X", "+1", "?" ] )
+    blank = random.choice( [ " ", "  ", "\t" ] )
+    if random.random() < 0.5:
+        fields = [ species + "." + chromosome + ":" + "-".join( coordinates ) ]
+    else:
+        fields = [ species, chromosome ] + coordinates
+    if orientation:
+        fields.append( orientation )
+        if random.random() < 0.3:
+            fields.append( random.choice( [ "name", "n1 n2" ] ) )
+    line = blank.join( fields )
+    if random.random() < 0.3:
+        line += random.choice( [ "", " " ] ) + "#" + random.choice( [ "", "a comment", "x#y" ] )
+    if random.random() < 0.05:
+        line = random.choice( [ species, species + "." + chromosome, "#" + line ] )
+    return random.choice( [ "", " ", "\t" ] ) + line + random.choice( [ "", " " ] )
+
+# Function to build a random homologous families file.
+# Output:
+#    list of str - the lines of the file
+def random_file():
+    lines = []
+    if random.random() < 0.2:
+        lines.append( random_locus() )
+    for number in xrange( random.randint( 0, 6 ) ):
+        opening = random.choice( [ ">f%d" % number, ">f%d 2" % number, ">f%d #c" % number,
+                                   ">f%d x" % number, "> f%d" % number ] )
+        lines.append( opening )
+        for _ in xrange( random.randint( 0, 5 ) ):
+            lines.append( random.choice( [ random_locus(), random_locus(), "" ] ) )
+    return [ line + "\n" for line in lines ]
+
+# Function to read the families of a file as the original
+# MasterMarkers.parseHomFamilies did.
+# Output:
+#    list of HomFam
+def original_hom_fams( file_stream ):
+    hom_fam_list = []
+    line = file_stream.readline()
+    while len( line ) > 0:
+        trunc_line = line.strip()
+        if len( trunc_line ) > 0 and trunc_line[0] == '>':
+            while len( line ) > 0:
+                hom_fam, line = markers.HomFam.from_file( file_stream, line, 1, "check" )
+                if hom_fam != None:
+                    hom_fam_list.append( hom_fam )
+        else:
+            line = file_stream.readline()
+    return hom_fam_list
+
+# Function to find the locus lines that the original reader rejects: the
+# lines of well-formed families that Locus.from_string does not parse.
+# Output:
+#    set of int - line numbers
+def rejected_lines( lines ):
+    rejected = set()
+    hom_fam = None
+    for line_number, line in enumerate( lines, 1 ):
+        trunc_line = line.strip()
+        if len( trunc_line ) == 0 or trunc_line[0] == '#':
+            continue
+        if trunc_line[0] == '>':
+            hom_fam = markers.HomFam.opening_from_string( trunc_line )
+        elif hom_fam != None and markers.Locus.from_string( trunc_line, line_number, "check" ) is None:
+            rejected.add( line_number )
+    return rejected
+
+# Function to list families in a comparable form.
+def family_list( hom_fams ):
+    return [ ( hom_fam.id, hom_fam.copy_number, hom_fam.comment,
+               [ ( locus.species, locus.chromosome, locus.start, locus.end,
+                   locus.orientation, locus.comment ) for locus in hom_fam.loci ] )
+             for hom_fam in hom_fams ]
+
+# Function to check the streaming reader on random files.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    for case in xrange( cases ):
+        lines = random_file()
+        # The original reader prints the problems it finds.
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            expected = family_list( original_hom_fams( StringIO( "".join( lines ) ) ) )
+            rejected = rejected_lines( lines )
+        finally:
+            sys.stdout = stdout
+        report = markers.ParseReport( "check" )
+        found = family_list( markers.read_hom_fams( lines, "check", report ) )
+        # The report also has the warnings about family openings.
+        openings = set( line_number for line_number, line in enumerate( lines, 1 )
+                        if line.strip().startswith( '>' ) )
+        reported = set( line_number for line_number, _, _ in report ) - openings
+        if found != expected or reported != rejected:
+            print "case %d: %s instead of %s, problems at lines %s instead of %s" % (
+                case, found, expected, sorted( reported ), sorted( rejected ) )
+            failed += 1
+    return failed
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 2000
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )
@@ -0,0 +1,104 @@
+import itertools
+import random
+import sys
+
+import markers
+import intervals
+import comparisons
+
+# Check of comparisons.Interval_merger, which keeps the loci of merged
+# intervals in sets of keys and sorts them once, against the original
+# merging, which added the intervals of each comparison to the database and
+# sorted and deduplicated the loci of an interval every time it was found
+# again.
+#
+# Random batches of intervals (one per comparison) are drawn on a few
+# markers, some reversed, with loci that often repeat across batches, some
+# in the other orientation or with another comment. Both mergings must give
+# the same intervals in the same order, with the same loci in the same order.
+#
+# Usage: python data_structures/merger_check.py [cases [seed]]
+
+
+# Function to draw random batches of intervals.
+# Output:
+#    list of lists of (marker IDs, list of locus fields), one list per batch
+def random_batches():
+    batches = []
+    for _ in xrange( random.randint( 1, 6 ) ):
+        batch = {}
+        for _ in xrange( random.randint( 0, 6 ) ):
+            marker_ids = [ random.randrange( 6 ) for _ in xrange( random.randint( 2, 3 ) ) ]
+            if random.random() < 0.5:
+                marker_ids.reverse()
+            loci = [ ( random.choice( [ "A", "B" ] ), "1", start, start + 2,
+                       random.choice( [ -1, 1 ] ), random.choice( [ "", "x" ] ) )
+                     for start in random.sample( xrange( 6 ), random.randint( 1, 3 ) ) ]
+            batch[ intervals.interval_key( marker_ids ) ] = ( marker_ids, loci )
+        batches.append( batch.values() )
+    return batches
+
+# Function to build the intervals of a batch, new objects on each call.
+# Output:
+#    list of Interval
+def batch_intervals( batch, number ):
+    return [ intervals.Interval(
+        id="%d.%d" % ( number, k ),
+        marker_ids=list( marker_ids ),
+        loci=[ markers.Locus( *fields ) for fields in loci ],
+        order=intervals.Order( 1 ),
+        weight=1,
+        comment='',
+        ) for k, ( marker_ids, loci ) in enumerate( batch ) ]
+
+# Function to add the intervals of a comparison to a database as the
+# original add_intervals did.
+def original_add( ints, new_ints ):
+    for interval in new_ints:
+        if interval.marker_ids not in ints:
+            ints.add( interval )
+        else:
+            found = ints[ interval.marker_ids ]
+            new_loci = interval.loci
+            if found.marker_ids == list( reversed( interval.marker_ids ) ):
+                for locus in new_loci:
+                    locus.orientation *= -1
+            found.loci += new_loci
+            found.loci = sorted( found.loci )
+            found.loci = [ locus for locus, _ in itertools.groupby( found.loci ) ]
+
+# Function to list intervals in a comparable form.
+def interval_list( ints ):
+    return [ ( interval.id, interval.marker_ids,
+               [ comparisons.locus_key( locus ) + ( locus.comment, ) for locus in interval.loci ] )
+             for interval in ints.itervalues() ]
+
+# Function to check the merging of random batches of intervals.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    for case in xrange( cases ):
+        batches = random_batches()
+        expected = intervals.IntervalDict()
+        for number, batch in enumerate( batches ):
+            original_add( expected, batch_intervals( batch, number ) )
+        found = intervals.IntervalDict()
+        merger = comparisons.Interval_merger( found )
+        for number, batch in enumerate( batches ):
+            merger.add( batch_intervals( batch, number ) )
+        merger.finish()
+        if interval_list( found ) != interval_list( expected ):
+            print "case %d: %s instead of %s" % ( case, interval_list( found ), interval_list( expected ) )
+            failed += 1
+    return failed
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 1000
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )
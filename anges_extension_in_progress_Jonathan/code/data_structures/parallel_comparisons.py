@@ -0,0 +1,55 @@
+import multiprocessing
+
+# Parallel comparison of species pairs.
+#
+# The genomes are stored in a module global before the pool is created, so
+# the forked workers inherit them (with a copy of the genome cache) and only
+# species names are sent to the workers. Each worker returns the intervals
+# found for one pair as lists, in the iteration order of their IntervalDicts,
+# and the results are yielded in species pair order: merging them with an
+# Interval_merger gives the same intervals, in the same order, as a serial
+# run.
+
+# Genomes keyed by species and their Genome_cache, shared with the workers.
+shared_genomes = {}
+shared_cache = None
+
+
+# Worker function: compares one species pair.
+# Arguments:
+#   job: (function, str, str, boolean) - comparisons.find_intervals_all,
+#        the two species and all_match
+# Output:
+#   tuple of lists of Interval objects, the adjacencies and the RSIs
+def compare_pair( job ):
+    function, species1, species2, all_match = job
+    ints = function( shared_genomes[ species1 ], shared_genomes[ species2 ],
+                     all_match, shared_cache )
+    return tuple( list( found.itervalues() ) for found in ints )
+
+# Generator of the intervals found for each species pair, using a pool of
+# processes.
+# Arguments:
+#   function: comparisons.find_intervals_all
+#   species_pairs: list of pairs of species
+#   gens: dict of Genome objects keyed by species
+#   all_match: boolean
+#   workers: int - number of worker processes
+#   cache: Genome_cache - each worker uses its own copy
+# Output:
+#   tuples of lists of Interval objects (adjacencies and RSIs), one per
+#   species pair, in species pair order.
+def compare_pairs( function, species_pairs, gens, all_match, workers, cache=None ):
+    global shared_genomes, shared_cache
+    shared_genomes = gens
+    shared_cache = cache
+    jobs = [ ( function, pair[0], pair[1], all_match ) for pair in species_pairs ]
+    pool = multiprocessing.Pool( workers )
+    shared_genomes = {}
+    shared_cache = None
+    try:
+        for ints in pool.imap( compare_pair, jobs ):
+            yield ints
+    finally:
+        pool.close()
+        pool.join()
@@ -8,6 +8,14 @@ from data_structures import markers
 from data_structures import intervals
 from data_structures import genomes
 from data_structures import comparisons
+from data_structures import marker_cache
+from data_structures import parallel_comparisons
+from data_structures import checkpoint
+from data_structures import species_tree
+from data_structures import interval_index
+from data_structures import support
+from data_structures import common_intervals
+from data_structures import weights
 
 import optimization
 import assembly
@@ -79,46 +87,78 @@ class MasterMarkers:
         return species_pairs
     #enddef
 
+    def pairsFromSpeciesTree(self, species_set, tree_file_dir, per_clade, log):
+        """
+        Populating the species_pairs list with the informative pairs of the Newick species tree (see species_tree.informative_pairs)
+        The pairs file stream must have been opened on the tree file.
+        per_clade - int: maximum number of species taken from each clade, 0 for no limit
+        """
+        try:
+            tree = species_tree.read_newick(self.pairs_file_stream)
+            tree_species = species_tree.leaves(tree)
+            species_pairs = species_tree.informative_pairs(tree, species_set, per_clade)
+        except ValueError as error:
+            log.write( "{}  ERROR (master.py) - invalid species tree file {}: {}\n"
+                       .format(strtime(), tree_file_dir, error))
+            sys.exit()
+        finally:
+            self.pairs_file_stream.close()
+        missing = [species for species in tree_species if species not in species_set]
+        if missing:
+            log.write( "{}  {} species of the species tree are not listed in the homologous families file: {}\n"
+                       .format(strtime(), len(missing), " ".join(missing)))
+        log.write( "{}  Selected {} informative species pairs from the species tree ({} species).\n"
+                   .format(strtime(), len(species_pairs), len(tree_species)))
+        log.flush()
+
+        return species_pairs
+    #enddef
+
     # reads hom. families from a file
-    # file_name - str: the name of the file to read from
-    # hom_fam_list - list of HomFam: the list to add to (Default = [])
+    # hom_fam_dir - str: the name of the file to read from
+    # use_cache - bool: reuse/write the columnar cache next to the file
     # Return - list of HomFam: the list of hom. familes read
-    def parseHomFamilies(self, hom_fam_dir, log):
+    def parseHomFamilies(self, hom_fam_dir, log, use_cache=False):
         """
         Populates hom_fam_list
+        Problems found in the file are collected in a markers.ParseReport and
+        written to the log instead of being printed line by line.
+        With use_cache, the parsed families are stored in a binary cache next
+        to the file (see marker_cache) and reloaded from it while the file is
+        unchanged.
         """
-        hom_fam_list = []
-        line_number = 1
-        line = self.hom_fams_file_stream.readline()
-        while len(line) > 0:
-            trunc_line = line.strip()
-
-            if len(trunc_line) > 0:
-                if trunc_line[0] == '>':
-                    # read first hom. family
-                    hom_fam, line = markers.HomFam.from_file(self.hom_fams_file_stream, trunc_line, line_number, hom_fam_dir)
-                    if hom_fam != None:
-                        hom_fam_list.append(hom_fam)
-                    #endif
-
-                    # read the rest of the hom. families
-                    while len(line) > 0:
-                        hom_fam, line = markers.HomFam.from_file(self.hom_fams_file_stream, line, line_number, hom_fam_dir)
-                        if hom_fam != None:
-                            hom_fam_list.append(hom_fam)
-                        #endif
-                    #endwhile
-                else:
-                    line = self.hom_fams_file_stream.readline()
-                    line_number = line_number + 1
-                #endif
-            else:
-                line = self.hom_fams_file_stream.readline()
-                line_number = line_number + 1
+        self.hom_fams_file_stream.close()
+
+        cached = None
+        if use_cache:
+            key = marker_cache.cache_key(hom_fam_dir)
+            cached = marker_cache.read_cache(hom_fam_dir, key)
+        #endif
+
+        if cached != None:
+            hom_fam_list, report = cached
+            log.write( "{}  Loaded homologous families from cache {}.\n"
+                   .format( strtime(), hom_fam_dir + marker_cache.CACHE_SUFFIX ) )
+        else:
+            report = markers.ParseReport(hom_fam_dir)
+            hom_fam_list = list(markers.iter_hom_fams(hom_fam_dir, report))
+
+            if use_cache:
+                try:
+                    marker_cache.write_cache(hom_fam_dir, key, hom_fam_list, report)
+                except IOError:
+                    log.write( "{}  WARNING (master.py) - could not write cache file: {}\n"
+                           .format( strtime(), hom_fam_dir + marker_cache.CACHE_SUFFIX ) )
+                #endtry
             #endif
         #endif
 
-        self.hom_fams_file_stream.close()
+        if len(report) > 0:
+            print("{} problems found in homologous families file {}, see log.".format(len(report), hom_fam_dir))
+            log.write( "{}  {} problems found in homologous families file:\n"
+                   .format( strtime(), len(report) ) )
+            report.to_file(log)
+        #endif
 
         log.write( "{}  Read homologous families from file.\n"
                .format( strtime() ) )
@@ -241,36 +281,47 @@ class MasterAdjacencies:
     def getRepeatClusterListInt(self):
         return self.repeat_cluster_int
 
-    def solveAdjacencies(self, species_pairs, gens, output_directory, log, all_match):
-        for pair in species_pairs:
-            new_adjacencies = comparisons.find_adjacencies( gens[ pair[0] ],
-                                                            gens[ pair[1] ], all_match)
-            comparisons.add_intervals( self.adjacencies, new_adjacencies )
-        comparisons.set_interval_weights( self.adjacencies )
+    # The adjacencies of the species pairs are added by MasterGenConstruction.compareSpeciesPairs.
+    # species_support, coefficients - weight the adjacencies by the coefficients of the species containing them
+    #                                 (see support.set_tree_weights) instead of counting their loci
+    def solveAdjacencies(self, output_directory, log, species_support=None, coefficients=None):
+        if coefficients != None:
+            support.set_tree_weights( self.adjacencies, species_support, coefficients )
+        else:
+            comparisons.set_interval_weights( self.adjacencies )
         log.write( "{}  Found {} adjacencies with total weight of {}.\n"
                    .format( strtime(),
                       len( self.adjacencies ),
-                      self.adjacencies.total_weight ) )
+                      weights.to_string( self.adjacencies.total_weight ) ) )
         log.flush()
         intervals.write_intervals(log, self.adjacencies, output_directory + "/adjacencies")
     #enddef
 
-    def selectMaxAdjacencies(self, hom_fam_list, output_directory, log):
-        self.realizable_adjacencies, self.repeat_cluster, self.repeat_cluster_int = optimization.opt_adjacencies(hom_fam_list, self.adjacencies)
+    # The realizable adjacencies are a selection of the stored adjacencies (see intervals.IntervalStore), in the
+    # order of the adjacencies file.
+    # verify - bool: check the b-matching of the adjacencies (see optimization.verify_b_matching)
+    def selectMaxAdjacencies(self, hom_fam_list, output_directory, log, verify=False):
+        try:
+            max_adjacencies, self.repeat_cluster, self.repeat_cluster_int = optimization.opt_adjacencies(hom_fam_list, self.adjacencies, verify)
+        except ValueError as error:
+            log.write( "{}  ERROR (master.py) - realizable adjacencies failed verification: {}\n"
+                       .format(strtime(), error) )
+            sys.exit()
+        if verify:
+            log.write( "{}  Verified the realizable adjacencies.\n".format(strtime()) )
+        self.realizable_adjacencies = intervals.IntervalStore(self.adjacencies).select(max_adjacencies)
         intervals.write_intervals(log, self.realizable_adjacencies, 
                          output_directory + "/realizable_adjacencies",
                         )
         log.write( "{}  Found {} realizable adjacencies with total weight of {}.\n"
-               .format(strtime(),len(self.realizable_adjacencies), self.realizable_adjacencies.total_weight ) )
+               .format(strtime(),len(self.realizable_adjacencies), weights.to_string(self.realizable_adjacencies.total_weight) ) )
         log.write( "{}  Found {} repeat clusters.\n"
                 .format(strtime(), len(self.repeat_cluster)))
         log.flush()
     #enddef
 
     def trackDiscardedAdjacencies(self, output_directory, log):
-        for adj in self.adjacencies.itervalues():
-            if not adj.marker_ids in self.realizable_adjacencies:
-                self.discarded_adjacencies.add( adj )
+        self.discarded_adjacencies = self.realizable_adjacencies.complement()
         intervals.write_intervals(log, self.discarded_adjacencies, output_directory + "/discarded_adjacencies")
     #enddef
 #endclass
@@ -294,13 +345,15 @@ class MasterRSI:
         return self.discarded_RSIs
     #enddef
 
-    def solveRSIs(self, species_pairs, gens, output_directory, log, all_match):
-        for pair in species_pairs:
-            new_RSIs = comparisons.find_RSIs(gens[ pair[0] ], gens[ pair[1] ], all_match)
-            comparisons.add_intervals( self.RSIs, new_RSIs )
-        comparisons.set_interval_weights( self.RSIs )
+    # The RSIs of the species pairs are added by MasterGenConstruction.compareSpeciesPairs.
+    # species_support, coefficients - see MasterAdjacencies.solveAdjacencies
+    def solveRSIs(self, output_directory, log, species_support=None, coefficients=None):
+        if coefficients != None:
+            support.set_tree_weights( self.RSIs, species_support, coefficients )
+        else:
+            comparisons.set_interval_weights( self.RSIs )
         log.write( "{}  Found {} repeat spanning intervals with total weight of"
-        " {}.\n" .format( strtime(), len( self.RSIs ), self.RSIs.total_weight ) )
+        " {}.\n" .format( strtime(), len( self.RSIs ), weights.to_string( self.RSIs.total_weight ) ) )
         log.flush()
         intervals.write_intervals(log, self.RSIs, output_directory + "/RSIs")
     #enddef
@@ -318,16 +371,14 @@ class MasterRSI:
                    .format(
                     strtime(),
                     len(self.realizable_RSIs ),
-                    self.realizable_RSIs.total_weight 
+                    weights.to_string(self.realizable_RSIs.total_weight)
                     )
                 )
         log.flush()
     #enddef
     
     def trackDiscardedRSIs(self, output_directory, log):
-        for RSI in self.RSIs.itervalues():
-            if not RSI.marker_ids in self.realizable_RSIs:
-                self.discarded_RSIs.add( RSI )
+        self.discarded_RSIs = self.realizable_RSIs.complement()
         intervals.write_intervals(log, self.discarded_RSIs, output_directory + "/discarded_RSIs")
     #enddef
 #endclass
@@ -340,6 +391,9 @@ class MasterGenConstruction:
         self.ancestor_hom_fams = []
         self.gens = {}
         self.RSI_strings = []
+        self.genome_cache = comparisons.Genome_cache()
+        self.support = None
+        self.common_intervals = {}
     #enddef
 
     def getGenomes(self):
@@ -349,6 +403,11 @@ class MasterGenConstruction:
     def getAdjacencies(self):
         return self.adj
 
+    # size - int: number of species kept in the genome cache
+    def setGenomeCacheSize(self, size):
+        self.genome_cache.size = size
+    #enddef
+
     # writes hom. families to a file
     # file_name - str: the name of the file to write to
     # hom_fam_list - list of HomFam: the list to write (Default = [])
@@ -374,17 +433,121 @@ class MasterGenConstruction:
         log.flush()
     #enddef
 
-    def dealWithAdjPhase(self, species_pairs, hom_fam_list, output_directory, log, debug, all_match):
-        # For each pair of species, compare the species to find adjacencies.
-        self.adj.solveAdjacencies(species_pairs, self.gens, output_directory, log, all_match)
+    # Compares each pair of species once to find both its adjacencies and its repeat spanning intervals.
+    # workers - int: number of processes comparing species pairs (1 = no pool)
+    def compareSpeciesPairs(self, species_pairs, all_match, workers=1):
+        if workers > 1:
+            found = parallel_comparisons.compare_pairs(comparisons.find_intervals_all, species_pairs,
+                                                       self.gens, all_match, workers, self.genome_cache)
+        else:
+            found = ( comparisons.find_intervals_all( self.gens[ pair[0] ], self.gens[ pair[1] ],
+                                                      all_match, self.genome_cache )
+                      for pair in species_pairs )
+        adjacencies = comparisons.Interval_merger( self.adj.adjacencies )
+        RSIs = comparisons.Interval_merger( self.RSI.RSIs )
+        for new_adjacencies, new_RSIs in found:
+            adjacencies.add( new_adjacencies )
+            RSIs.add( new_RSIs )
+        adjacencies.finish()
+        RSIs.finish()
+        self.genome_cache.clear()
+    #enddef
+
+    # Records the species containing each adjacency and repeat spanning interval, scanning each genome once
+    # (see support.Species_support). The adjacency keys are left in the genome cache for compareSpeciesPairs.
+    def countSupport(self, all_match):
+        self.support = support.genomes_support(self.gens, all_match, self.genome_cache)
+    #enddef
+
+    # writes the support of the adjacencies and RSIs by the species pairs (see support.write_support)
+    def writeSupport(self, species_pairs, output_directory, log):
+        for ints, name in [(self.adj.adjacencies, "adjacencies_support"), (self.RSI.RSIs, "RSIs_support")]:
+            file_name = output_directory + "/" + name
+            try:
+                support.write_support(file_name, ints, self.support, species_pairs)
+            except IOError:
+                log.write( "{}  ERROR (master.py) - could not write support to file: {}\n"
+                           .format(strtime(), file_name) )
+                sys.exit()
+        #endfor
+    #enddef
+
+    # count_support - boolean: write the support of the intervals (see writeSupport)
+    # tree - TreeNode: species tree to weight the intervals by linear interpolation at its ancestor
+    #                  (see species_tree.interpolation_coefficients), None to weight them by their number of loci
+    def dealWithAdjPhase(self, species_pairs, hom_fam_list, output_directory, log, debug, all_match, workers=1,
+                         count_support=False, tree=None):
+        coefficients = None
+        if count_support or tree != None:
+            self.countSupport(all_match)
+        if tree != None:
+            coefficients = species_tree.interpolation_coefficients(tree, set(self.gens))
+            log.write( "{}  Weighting intervals by linear interpolation on the species tree ({} species).\n"
+                       .format(strtime(), len(coefficients)) )
+        # For each pair of species, compare the species to find adjacencies
+        # and repeat spanning intervals.
+        self.compareSpeciesPairs(species_pairs, all_match, workers)
+        self.adj.solveAdjacencies(output_directory, log, self.support, coefficients)
+        self.RSI.solveRSIs(output_directory, log, self.support, coefficients)
+        if count_support:
+            self.writeSupport(species_pairs, output_directory, log)
         # how many times species pairs 
 
-    def dealWithIntervalsPhase(self, species_pairs, hom_fam_list, output_directory, log, debug, all_match):
-        # Do the same for repeat spanning intervals
-        self.RSI.solveRSIs(species_pairs, self.gens, output_directory, log, all_match)
+    # Finds the common intervals of each pair of species (see common_intervals.Common_intervals), they are written
+    # to <kind>_common_intervals, weighted by their number of loci. There are too many of all the common intervals
+    # to build and merge them: they are written as each pair finds them, in range form (see
+    # common_intervals.Common_intervals.write_ranges).
+    # kinds - list of str: kinds of common intervals to find, among common_intervals.KINDS
+    def dealWithCommonIntervals(self, species_pairs, kinds, output_directory, log):
+        mergers = {}
+        for kind in kinds:
+            if kind != common_intervals.ALL:
+                self.common_intervals[kind] = intervals.IntervalDict()
+                mergers[kind] = comparisons.Interval_merger(self.common_intervals[kind])
+            #endif
+        #endfor
+        ranges = None
+        ranges_count = 0
+        if common_intervals.ALL in kinds:
+            file_name = output_directory + "/" + common_intervals.ALL + "_common_intervals"
+            try:
+                ranges = open(file_name, 'w')
+            except IOError:
+                log.write( "{}  ERROR (master.py) - could not write intervals to file: {}\n"
+                           .format(strtime(), file_name) )
+                sys.exit()
+        #endif
+        for pair in species_pairs:
+            found = common_intervals.Common_intervals([self.gens[pair[0]], self.gens[pair[1]]])
+            for kind in kinds:
+                if kind in mergers:
+                    mergers[kind].add(found.find(kind))
+                #endif
+            #endfor
+            if ranges != None:
+                ranges_count += found.write_ranges(ranges, common_intervals.ALL)
+            #endif
+        #endfor
+        if ranges != None:
+            ranges.close()
+            log.write( "{}  Found {} {} common intervals of species pairs.\n"
+                       .format(strtime(), ranges_count, common_intervals.ALL) )
+        #endif
+        for kind in kinds:
+            if kind == common_intervals.ALL:
+                continue
+            ints = mergers[kind].finish()
+            comparisons.set_interval_weights(ints)
+            log.write( "{}  Found {} {} common intervals with total weight of {}.\n"
+                       .format(strtime(), len(ints), kind, weights.to_string(ints.total_weight)) )
+            log.flush()
+            intervals.write_intervals(log, ints, output_directory + "/" + kind + "_common_intervals")
+        #endfor
+    #enddef
 
+    def dealWithIntervalsPhase(self, species_pairs, hom_fam_list, output_directory, log, debug, verify=False):
         # Select maximal subsets of adjacencies that are realizable.
-        self.adj.selectMaxAdjacencies(hom_fam_list, output_directory, log)
+        self.adj.selectMaxAdjacencies(hom_fam_list, output_directory, log, verify)
 
         # Keep track of adjacencies that have been discarded.
         self.adj.trackDiscardedAdjacencies(output_directory, log)
@@ -397,20 +560,25 @@ class MasterGenConstruction:
     #enddef
 
 
+    # The CARs of the ancestor genome in the order of their numbers (see assembly.assemble).
+    def orderedChromosomes(self, ancestor_genome):
+        return sorted(ancestor_genome.chromosomes.iteritems(), key=lambda item: int(item[0]))
+    #enddef
+
     def checkAncestralAdjacencies(self, ancestor_genome, adj_str_list, RC_adjacencies):
 
         ancestor_adjacencies = []
-        for chrom_id, chrom in ancestor_genome.chromosomes.iteritems():
+        for chrom_id, chrom in self.orderedChromosomes(ancestor_genome):
             index = 0
             car = ""
             while index < len(chrom):
-                car = car + str(chrom[index].id) + " "
+                car = car + str(chrom.ids[index]) + " "
                 # print car
                 found = False
                 if (index+1) < len(chrom):
                     save_pair = []
-                    save_pair.append(int(chrom[index].id))
-                    save_pair.append(int(chrom[index+1].id))
+                    save_pair.append(int(chrom.ids[index]))
+                    save_pair.append(int(chrom.ids[index+1]))
                     save_pair.sort()
                     if save_pair in adj_str_list or save_pair in RC_adjacencies:
                         # found adjacency in adjacencies
@@ -422,7 +590,7 @@ class MasterGenConstruction:
                 if not found:
                     print "****** not found adjacency"
                     print save_pair
-                    print car + str(chrom[index+1].id)
+                    print car + str(chrom.ids[index+1])
                     print "*****************************"
                 index = index + 1
 
@@ -451,29 +619,27 @@ class MasterGenConstruction:
         ancestor_genome = next( self.ancestor_genomes.itervalues() )
         
         # Create adjacencies list using an easier format to do the checkings
-        i = 0
         adj_str_list = []
         adj_doubled_list = []
-        for key in self.adj.realizable_adjacencies.endpoints.keys():
-            for adj_pair in self.adj.realizable_adjacencies.endpoints[key]:
-                save_pair = []
-                save_pair.append(int(adj_pair[0][:-2]))
-                save_pair.append(int(adj_pair[1][:-2]))
-                save_pair.sort()
-                if save_pair not in adj_str_list:
-                    adj_str_list.append(save_pair)
-
-                save_pair_str = []
-                save_pair_str.append(adj_pair[0])
-                save_pair_str.append(adj_pair[1])
-                adj_doubled_list.append(save_pair_str)
-            i = i + 1
+        for adj in self.adj.realizable_adjacencies.itervalues():
+            adj_pair = adj.marker_ids
+            save_pair = []
+            save_pair.append(int(markers.from_doubled(adj_pair[0])))
+            save_pair.append(int(markers.from_doubled(adj_pair[1])))
+            save_pair.sort()
+            if save_pair not in adj_str_list:
+                adj_str_list.append(save_pair)
+
+            save_pair_str = []
+            save_pair_str.append(adj_pair[0])
+            save_pair_str.append(adj_pair[1])
+            adj_doubled_list.append(save_pair_str)
 
         # Get the len of the greater RSI
         RSI_no_doubling = []
         max_RSI = 0
-        for index, markers in enumerate(self.RSI.realizable_RSIs.itervalues()):
-            RSI_no_doubling = [self.remove_head_tail(s) for s in markers.marker_ids]
+        for index, RSI in enumerate(self.RSI.realizable_RSIs.itervalues()):
+            RSI_no_doubling = [self.remove_head_tail(s) for s in RSI.marker_ids]
             self.RSI_strings.append(" ".join(self.remove_duplicates(RSI_no_doubling)))
             if len(RSI_no_doubling) > max_RSI:
                 max_RSI = len(self.remove_duplicates(RSI_no_doubling))
@@ -493,19 +659,19 @@ class MasterGenConstruction:
             RC_adjacencies = []
             CAR_total_list = []
             CAR_string_aux = ""
-            for chrom_id, chrom in ancestor_genome.chromosomes.iteritems(): # Chrom = CARs
+            for chrom_id, chrom in self.orderedChromosomes(ancestor_genome): # Chrom = CARs
                 CAR_string = ""
                 index = 0
                 previous_position = []
                 while index < len(chrom):
                     flag = False
                     for index_rc, rc in enumerate(self.adj.getRepeatClusterListInt()):
-                        if int(chrom[index].id) in rc:
+                        if int(chrom.ids[index]) in rc:
                             flag = True
                             idx_rc = str(index_rc+1)
 
                     old_len = len(CAR_string)
-                    CAR_string = CAR_string + str(chrom[index].id) + " "
+                    CAR_string = CAR_string + str(chrom.ids[index]) + " "
                     new_len = len(CAR_string)
                     rc_len = new_len - old_len
                     if flag: # check if is RSI
@@ -513,7 +679,7 @@ class MasterGenConstruction:
                         chrom_index = index + 1
                         CAR_string_aux = CAR_string
                         while i < max_RSI and chrom_index < len(chrom):
-                            CAR_string_aux = CAR_string_aux + str(chrom[chrom_index].id) + " "
+                            CAR_string_aux = CAR_string_aux + str(chrom.ids[chrom_index]) + " "
                             chrom_index = chrom_index + 1
                             i = i + 1
                         found_rsi = False
@@ -537,16 +703,16 @@ class MasterGenConstruction:
                             CAR_string = CAR_string[:-rc_len-cut] + rsi_found + " "
                             index = index + max_RSI
                     else:
-                        last_marker_id = chrom[index].id
+                        last_marker_id = chrom.ids[index]
                     index = index + 1
                 
                 # Check if is circular
                 marker_pair = []
-                marker_pair.append(chrom[0].id + "_h")
-                marker_pair.append(last_marker_id + "_t")
+                marker_pair.append(markers.to_doubled(chrom.ids[0])[0])
+                marker_pair.append(markers.to_doubled(last_marker_id)[1])
                 marker_pair2 = []
-                marker_pair2.append(chrom[0].id + "_t")
-                marker_pair2.append(last_marker_id + "_h")
+                marker_pair2.append(markers.to_doubled(chrom.ids[0])[1])
+                marker_pair2.append(markers.to_doubled(last_marker_id)[0])
                 if marker_pair in adj_doubled_list or marker_pair2 in adj_doubled_list:
                     CAR_string = "_C " + CAR_string + "C_"
                 else:
@@ -576,7 +742,7 @@ class MasterGenConstruction:
 
     #enddef
     def remove_head_tail(self, s):
-        return s[:-2]
+        return markers.from_doubled(s)
 
     def remove_duplicates(self,li):
         my_set = set()
@@ -604,6 +770,8 @@ class MasterScript:
     overlapped_pairs_list: list of overlapping pairs, populated based on the hom_fam_list, during the parse_markersPhase
     genome_construction_obj - MasterGenConstruction class object -> this object deal with adjacenciesPhase and genomeConstructionPhase and 
                                                                     has information regarding gens, adjacencies, ancestral genomes (including methods to manipulate these information)  
+    checkpoint_keys - {string : string}: key of each phase checkpoint (see checkpoint.phase_keys), empty if checkpoints are disabled
+    resumed_phase - string: latest phase restored from a checkpoint, None if the run started from scratch
     """
     def __init__(self):
         self.config_file_directory = ""
@@ -627,6 +795,9 @@ class MasterScript:
         self.received_acs = False
         self.doC1P = False
         self.doMWM = False
+
+        self.checkpoint_keys = {}
+        self.resumed_phase = None
     #enddef
 
     def setOutputStreams(self):
@@ -680,6 +851,7 @@ class MasterScript:
         self.io_dict["species_tree"]                  = config["species_tree"]
         self.io_dict["output_directory"]              = config["output_directory"]
         self.io_dict["acs_file"]                     = config["acs_file"]
+        self.io_dict["tree_file"]                    = config.get("tree_file", "")
 
         self.markers_param_dict["markers_doubled"]    = config["markers_doubled"]
         self.markers_param_dict["markers_unique"]     = config["markers_unique"]
@@ -687,8 +859,23 @@ class MasterScript:
         self.markers_param_dict["markers_overlap"]    = config["markers_overlap"]
         self.markers_param_dict["filter_copy_number"] = config["filter_copy_number"]
         self.markers_param_dict["filter_by_id"]       = config["filter_by_id"]
+        self.markers_param_dict["markers_cache"]      = config.get("markers_cache", 0)
+        self.markers_param_dict["species_pairs_from_tree"] = config.get("species_pairs_from_tree", 0)
+        self.markers_param_dict["species_pairs_per_clade"] = config.get("species_pairs_per_clade", 0)
 
         self.run_param_dict["all_match"]            = config["all_match"]
+        self.run_param_dict["checkpoint"]           = config.get("checkpoint", 0)
+        self.run_param_dict["intervals_index"]      = config.get("intervals_index", 0)
+        self.run_param_dict["comparison_workers"]   = config.get("comparison_workers", 1)
+        self.run_param_dict["comparison_cache"]     = config.get("comparison_cache", comparisons.CACHE_SIZE)
+        self.run_param_dict["interval_support"]     = config.get("interval_support", 0)
+        self.run_param_dict["acs_weight"]           = config.get("acs_weight", 1)
+        self.run_param_dict["acs_sci"]              = config.get("acs_sci", 0)
+        self.run_param_dict["acs_mci"]              = config.get("acs_mci", 0)
+        self.run_param_dict["acs_aci"]              = config.get("acs_aci", 0)
+        self.run_param_dict["exact_weights"]        = config.get("exact_weights", 0)
+        self.run_param_dict["matching_verify"]      = config.get("matching_verify", 0)
+        weights.set_exact(self.run_param_dict["exact_weights"] == 1)
 
         self.debug = config["debug"]
 
@@ -704,19 +891,109 @@ class MasterScript:
     def receivedAcsFile(self):
         return self.received_acs
 
+    def pairsFile(self):
+        """
+        pairsFile: the file the species pairs come from, the Newick tree_file when they are selected from the species tree
+        """
+        if self.markers_param_dict["species_pairs_from_tree"] == 1:
+            return self.io_dict["tree_file"]
+        return self.io_dict["species_tree"]
+    #enddef
+
+    def getState(self):
+        """
+        getState: returns the state of the run that later phases depend on, to be saved in a checkpoint.
+        """
+        return { "hom_fam_list": self.hom_fam_list,
+                 "species_pairs": self.species_pairs,
+                 "species_set": self.species_set,
+                 "overlapping_pairs_list": self.overlapping_pairs_list,
+                 "doC1P": self.doC1P,
+                 "doMWM": self.doMWM,
+                 "family_names": markers.FAMILY_NAMES,
+                 "genome_construction_obj": self.genome_construction_obj }
+    #enddef
+
+    def setState(self, state):
+        """
+        setState: restores a state returned by getState.
+        """
+        self.hom_fam_list = state["hom_fam_list"]
+        self.species_pairs = state["species_pairs"]
+        self.species_set = state["species_set"]
+        self.overlapping_pairs_list = state["overlapping_pairs_list"]
+        self.doC1P = state["doC1P"]
+        self.doMWM = state["doMWM"]
+        markers.set_family_names(state["family_names"])
+        self.genome_construction_obj = state["genome_construction_obj"]
+    #enddef
+
+    def resumeFromCheckpoint(self):
+        """
+        resumeFromCheckpoint: when checkpoints are enabled, restores the state of the latest phase that has a valid 
+        checkpoint in the output directory. Phases up to that one are then skipped.
+        """
+        if self.run_param_dict["checkpoint"] != 1:
+            return
+        options = dict(self.markers_param_dict)
+        options.update(self.run_param_dict)
+        file_names = [self.io_dict["homologous_families"], self.pairsFile()]
+        if self.treeWeights() and self.io_dict["tree_file"] not in file_names:
+            file_names.append(self.io_dict["tree_file"])
+        self.checkpoint_keys = checkpoint.phase_keys(file_names, options)
+        phase, state = checkpoint.latest_checkpoint(self.io_dict["output_directory"], self.checkpoint_keys)
+        if phase != None:
+            self.setState(state)
+            self.resumed_phase = phase
+            self.log.write( "{}  Resumed from the checkpoint of the {} phase: {}\n"
+                            .format(strtime(), phase,
+                                    checkpoint.checkpoint_file(self.io_dict["output_directory"], phase)) )
+            self.log.flush()
+    #enddef
+
+    def phaseResumed(self, phase):
+        """
+        phaseResumed: tells if phase was restored from a checkpoint (and must be skipped).
+        """
+        return (self.resumed_phase != None and
+                checkpoint.PHASE_NAMES.index(phase) <= checkpoint.PHASE_NAMES.index(self.resumed_phase))
+    #enddef
+
+    def saveCheckpoint(self, phase):
+        """
+        saveCheckpoint: saves the state of the run after phase, when checkpoints are enabled.
+        """
+        if not self.checkpoint_keys:
+            return
+        try:
+            checkpoint.write_checkpoint(self.io_dict["output_directory"], phase,
+                                        self.checkpoint_keys[phase], self.getState())
+        except (IOError, OSError):
+            self.log.write( "{}  WARNING (master.py -> process.py) - could not write the checkpoint of the {} phase.\n"
+                            .format(strtime(), phase) )
+            self.log.flush()
+    #enddef
+
     def parse_markersPhase(self):
         """
         Deal with everything realated to input (configuration, markers and species pairs) in order to take information from these files
 
         """
+        if self.phaseResumed("markers"):
+            return
         # MasterMarkers class: methods used in order to deal with input files and take information from them (populate the species_pairs list and hom_fam_list)
         markers_phase_obj = MasterMarkers() 
-        markers_phase_obj.setInputStreams(self.io_dict["species_tree"],self.io_dict["homologous_families"]) #set pairs file stream and hom fams file stream
+        markers_phase_obj.setInputStreams(self.pairsFile(),self.io_dict["homologous_families"]) #set pairs file stream and hom fams file stream
         # Parse the hom fams file.
-        self.hom_fam_list = markers_phase_obj.parseHomFamilies(self.io_dict["homologous_families"], self.log)
+        self.hom_fam_list = markers_phase_obj.parseHomFamilies(self.io_dict["homologous_families"], self.log,
+                                                               self.markers_param_dict["markers_cache"] == 1)
         self.getSpeciesList()
-        # Parse the species pair file, put result in list.
-        self.species_pairs = markers_phase_obj.parseSpeciesPairs(self.species_set, self.io_dict["species_tree"], self.log)
+        # Parse the species pair file (or select them from the species tree), put result in list.
+        if self.markers_param_dict["species_pairs_from_tree"] == 1:
+            self.species_pairs = markers_phase_obj.pairsFromSpeciesTree(self.species_set, self.io_dict["tree_file"],
+                                                                        self.markers_param_dict["species_pairs_per_clade"], self.log)
+        else:
+            self.species_pairs = markers_phase_obj.parseSpeciesPairs(self.species_set, self.io_dict["species_tree"], self.log)
         # hom_fam_list and species_pairs list are now populated
 
         # Filter by ID
@@ -745,16 +1022,96 @@ class MasterScript:
             self.doMWM = False
 
         del markers_phase_obj
+        self.saveCheckpoint("markers")
     #enddef
 
     def adjacenciesPhase(self):
+        if self.phaseResumed("adjacencies"):
+            return
         # Genome construction
+        tree = None
+        if self.treeWeights():
+            tree = self.readTreeFile()
+        self.genome_construction_obj.setGenomeCacheSize(self.run_param_dict["comparison_cache"])
         self.genome_construction_obj.constructGenomes(self.species_pairs, self.hom_fam_list, self.log)
-        self.genome_construction_obj.dealWithAdjPhase(self.species_pairs, self.hom_fam_list, self.io_dict["output_directory"], self.log, self.debug, self.run_param_dict["all_match"])
+        self.genome_construction_obj.dealWithAdjPhase(self.species_pairs, self.hom_fam_list, self.io_dict["output_directory"], self.log, self.debug, self.run_param_dict["all_match"],
+                                                      self.run_param_dict["comparison_workers"],
+                                                      self.run_param_dict["interval_support"] == 1, tree)
+        kinds = [kind for kind, option in [(common_intervals.STRONG, "acs_sci"),
+                                           (common_intervals.MAXIMAL, "acs_mci"),
+                                           (common_intervals.ALL, "acs_aci")]
+                 if self.run_param_dict[option] == 1]
+        if kinds:
+            self.genome_construction_obj.dealWithCommonIntervals(self.species_pairs, kinds,
+                                                                 self.io_dict["output_directory"], self.log)
+        self.writeIntervalIndexes(["adjacencies", "RSIs"])
+        self.saveCheckpoint("adjacencies")
+    #enddef
+
+    # Intervals are weighted by linear interpolation on the species tree with acs_weight = 1 when there is a
+    # tree_file, by their number of loci otherwise.
+    def treeWeights(self):
+        return self.run_param_dict["acs_weight"] == 1 and self.io_dict["tree_file"] != ""
+    #enddef
+
+    def readTreeFile(self):
+        """
+        readTreeFile: reads the Newick species tree of tree_file, the ancestor being marked with '@'.
+        """
+        try:
+            tree_file_stream = open(self.io_dict["tree_file"], 'r')
+        except IOError:
+            self.log.write( "{}  ERROR (master.py) - could not open species tree file: {}\n"
+                            .format(strtime(), self.io_dict["tree_file"]) )
+            sys.exit()
+        try:
+            tree = species_tree.read_newick(tree_file_stream)
+            species_tree.find_ancestor(tree)
+        except ValueError as error:
+            self.log.write( "{}  ERROR (master.py) - invalid species tree file {}: {}\n"
+                            .format(strtime(), self.io_dict["tree_file"], error))
+            sys.exit()
+        finally:
+            tree_file_stream.close()
+        return tree
     #enddef
 
     def intervalsPhase(self):
-        self.genome_construction_obj.dealWithIntervalsPhase(self.species_pairs, self.hom_fam_list, self.io_dict["output_directory"], self.log, self.debug, self.run_param_dict["all_match"])
+        if self.phaseResumed("intervals"):
+            return
+        self.genome_construction_obj.dealWithIntervalsPhase(self.species_pairs, self.hom_fam_list, self.io_dict["output_directory"], self.log, self.debug,
+                                                            self.run_param_dict["matching_verify"] == 1)
+        self.writeIntervalIndexes(["realizable_adjacencies", "discarded_adjacencies",
+                                   "realizable_RSIs", "discarded_RSIs"])
+        self.saveCheckpoint("intervals")
+    #enddef
+
+    def writeIntervalIndexes(self, names):
+        """
+        writeIntervalIndexes: when intervals_index is set, writes an indexed binary copy (<name>.idx, see interval_index)
+        of each of the given interval output files, for random access by interval id or endpoint marker.
+        names - list of string: output file names, among adjacencies, realizable_adjacencies, discarded_adjacencies, 
+                                RSIs, realizable_RSIs and discarded_RSIs
+        """
+        if self.run_param_dict["intervals_index"] != 1:
+            return
+        adj = self.genome_construction_obj.adj
+        RSI = self.genome_construction_obj.RSI
+        ints = { "adjacencies": adj.adjacencies,
+                 "realizable_adjacencies": adj.realizable_adjacencies,
+                 "discarded_adjacencies": adj.discarded_adjacencies,
+                 "RSIs": RSI.RSIs,
+                 "realizable_RSIs": RSI.realizable_RSIs,
+                 "discarded_RSIs": RSI.discarded_RSIs }
+        for name in names:
+            file_name = self.io_dict["output_directory"] + "/" + name + interval_index.INDEX_SUFFIX
+            try:
+                interval_index.write_index_file(file_name, ints[name])
+            except IOError:
+                self.log.write( "{}  ERROR (master.py) - could not write intervals to file: {}\n"
+                                .format(strtime(), file_name) )
+                sys.exit()
+    #enddef
 
     def c1pPhase(self):
         c1p_obj = process_c1p.MasterC1P()
@@ -0,0 +1,117 @@
+import random
+import sys
+
+import intervals
+
+# Check of the mask selections of stored intervals (intervals.IntervalSelection)
+# against the IntervalDict copies they replace.
+#
+# Random intervals are stored in an IntervalStore, and the same random
+# operations are applied to selections of the store and to IntervalDicts, as
+# the pipeline used to do: adding and deleting intervals, looking them up by
+# their marker IDs or their reverse, copying (then changing the copy), and
+# complementing, for which an IntervalDict of the stored intervals not in the
+# other one was built. Each selection must hold the same intervals as its
+# IntervalDict, in the order of the store, with the same endpoint queries,
+# length and total weight.
+#
+# Usage: python data_structures/selection_check.py [cases [seed]]
+
+MARKERS = 10
+
+
+# Function to build random stored intervals.
+# Output:
+#    IntervalDict
+def random_intervals():
+    ints = intervals.IntervalDict()
+    for number in xrange( random.randint( 1, 15 ) ):
+        marker_ids = random.sample( xrange( MARKERS ), random.randint( 2, 4 ) )
+        if not marker_ids in ints:
+            ints.add( intervals.Interval( str( number ), marker_ids, [], intervals.Order( 1 ),
+                                          float( random.randint( 1, 4 ) ), '' ) )
+    return ints
+
+# Function to compare a selection with the IntervalDict it stands for.
+# Arguments:
+#    selection: IntervalSelection
+#    ints: IntervalDict
+#    stored: list of Interval - the stored intervals in row order
+# Output:
+#    str - the first difference found, None if there is none
+def compare( selection, ints, stored ):
+    expected = [ interval for interval in stored if interval.marker_ids in ints ]
+    if ( list( selection.itervalues() ) != expected or
+            list( selection ) != [ intervals.interval_key( i.marker_ids ) for i in expected ] ):
+        return "intervals %s instead of %s" % ( list( selection.itervalues() ), expected )
+    if len( selection ) != len( ints ) or bool( selection ) != bool( ints ):
+        return "length %d instead of %d" % ( len( selection ), len( ints ) )
+    if selection.total_weight != ints.total_weight:
+        return "weight %s instead of %s" % ( selection.total_weight, ints.total_weight )
+    for interval in stored:
+        for ids in ( interval.marker_ids, interval.marker_ids[::-1] ):
+            if ( ids in selection ) != ( ids in ints ):
+                return "%s in the selection: %s" % ( ids, ids in selection )
+            if ids in ints and selection[ ids ] is not ints[ ids ]:
+                return "%s is another interval" % ids
+    for marker in xrange( MARKERS ):
+        if ( sorted( id( i ) for i in selection.intervals_with( marker ) ) !=
+                sorted( id( i ) for i in ints.intervals_with( marker ) ) ):
+            return "endpoint %d" % marker
+    return None
+
+# Function to check random operations on selections.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    for case in xrange( cases ):
+        source = random_intervals()
+        store = intervals.IntervalStore( source )
+        stored = list( source.itervalues() )
+        # Pairs of a selection and the IntervalDict it stands for.
+        pairs = [ ( store.select(), intervals.IntervalDict() ),
+                  ( store.select_all(), intervals.IntervalDict() ) ]
+        for interval in stored:
+            pairs[1][1].add( interval )
+        error = None
+        for _ in xrange( random.randint( 1, 30 ) ):
+            selection, ints = random.choice( pairs )
+            interval = random.choice( stored )
+            ids = random.choice( [ interval.marker_ids, interval.marker_ids[::-1] ] )
+            action = random.randrange( 4 )
+            if action == 0:
+                selection.add( interval )
+                ints.add( interval )
+            elif action == 1 and ids in ints:
+                del selection[ ids ]
+                del ints[ ids ]
+            elif action == 2:
+                copy = intervals.IntervalDict()
+                for kept in ints.itervalues():
+                    copy.add( kept )
+                pairs.append( ( selection.copy(), copy ) )
+            else:
+                other = intervals.IntervalDict()
+                for kept in stored:
+                    if not kept.marker_ids in ints:
+                        other.add( kept )
+                pairs.append( ( selection.complement(), other ) )
+            for selection, ints in pairs:
+                error = error or compare( selection, ints, stored )
+            if error != None:
+                break
+        if error != None:
+            print "case %d: %s" % ( case, error )
+            failed += 1
+    return failed
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 1000
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )
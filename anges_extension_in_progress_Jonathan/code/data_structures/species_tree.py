@@ -0,0 +1,288 @@
+# Species trees in Newick format and selection of the species pairs to
+# compare.
+#
+# The ancestor to reconstruct is marked in the tree with '@' after its clade,
+# e.g. ((A,B)@,C); Only pairs of species whose most recent common ancestor is
+# the marked ancestor or one of its ancestors are informative about it: pairs
+# with one species on each side of the ancestor (ingroup) and pairs of an
+# ingroup species with an outgroup species.
+
+# Characters that end a label or a branch length.
+DELIMITERS = "(),:;[ \t\r\n"
+
+
+# Class for the nodes of a species tree.
+class TreeNode:
+    # TreeNode constructor
+    # parent - TreeNode: the parent node, None for the root
+    def __init__( self, parent=None ):
+        self.parent = parent
+        self.children = []
+        self.name = None # species name for leaves, optional otherwise
+        self.length = None # length of the branch to the parent
+        self.ancestor = False # True if marked with '@'
+    #enddef
+
+    # Function to add a new child to the node.
+    # Output:
+    #   TreeNode - the new child
+    def add_child( self ):
+        child = TreeNode( self )
+        self.children.append( child )
+        return child
+    #enddef
+
+    def is_leaf( self ):
+        return not self.children
+    #enddef
+#endclass
+
+
+# Function to parse a tree in Newick format.
+# Arguments:
+#   string: str - the tree, ending with ';'
+# Output:
+#   TreeNode - the root of the tree
+# Raises ValueError if the string is not a valid tree.
+def parse_newick( string ):
+    root = TreeNode()
+    current = root
+    i = 0
+    n = len( string )
+    while i < n:
+        c = string[ i ]
+        if c == '(':
+            current = current.add_child()
+            i += 1
+        elif c == ',':
+            if current.parent == None:
+                raise ValueError( "unexpected ',' at position %d" % i )
+            current = current.parent.add_child()
+            i += 1
+        elif c == ')':
+            if current.parent == None:
+                raise ValueError( "unbalanced ')' at position %d" % i )
+            current = current.parent
+            i += 1
+        elif c == ':':
+            j = i + 1
+            while j < n and string[ j ] not in DELIMITERS:
+                j += 1
+            try:
+                current.length = float( string[ i + 1 : j ] )
+            except ValueError:
+                raise ValueError( "invalid branch length '%s' at position %d"
+                                  % ( string[ i + 1 : j ], i + 1 ) )
+            i = j
+        elif c == ';':
+            break
+        elif c == '[':
+            # Comment.
+            j = string.find( ']', i )
+            if j == -1:
+                raise ValueError( "unterminated comment at position %d" % i )
+            i = j + 1
+        elif c.isspace():
+            i += 1
+        else:
+            j = i
+            while j < n and string[ j ] not in DELIMITERS:
+                j += 1
+            label = string[ i : j ]
+            if label[ -1 : ] == '@':
+                current.ancestor = True
+                label = label[ : -1 ]
+            if label:
+                current.name = label
+            i = j
+    #endwhile
+    if current is not root:
+        raise ValueError( "missing ')' at the end of the tree" )
+    return root
+
+# Function to read a Newick tree from a file stream, lines starting with '#'
+# are ignored.
+# Arguments:
+#   file_stream: file - the tree file
+# Output:
+#   TreeNode - the root of the tree
+def read_newick( file_stream ):
+    lines = [ line for line in file_stream if line.lstrip()[ : 1 ] != '#' ]
+    return parse_newick( ''.join( lines ) )
+
+# Function that lists the species (leaf names) under a node, in tree order.
+# Arguments:
+#   node: TreeNode
+# Output:
+#   list of str
+def leaves( node ):
+    names = []
+    stack = [ node ]
+    while stack:
+        current = stack.pop()
+        if current.is_leaf():
+            if current.name != None:
+                names.append( current.name )
+        else:
+            stack.extend( reversed( current.children ) )
+    return names
+
+# Function that finds the node marked as the ancestor.
+# Arguments:
+#   root: TreeNode
+# Output:
+#   TreeNode - the ancestor
+# Raises ValueError if there is not exactly one marked node.
+def find_ancestor( root ):
+    found = []
+    stack = [ root ]
+    while stack:
+        current = stack.pop()
+        if current.ancestor:
+            found.append( current )
+        stack.extend( current.children )
+    if len( found ) != 1:
+        raise ValueError( "%d nodes marked as the ancestor with '@', expected 1"
+                          % len( found ) )
+    return found[0]
+
+# Function that picks at most cap species of a clade, the ones closest to the
+# root of the clade (ties broken by tree order). They are returned in tree
+# order.
+# Arguments:
+#   node: TreeNode - root of the clade
+#   cap: int - maximum number of species, 0 for all of them
+#   species: set of str - species that can be picked, None for all of them
+# Output:
+#   list of str
+def clade_representatives( node, cap, species=None ):
+    names = [ name for name in leaves( node )
+              if species == None or name in species ]
+    if cap <= 0 or len( names ) <= cap:
+        return names
+    distance = {}
+    stack = [ ( node, 0.0 ) ]
+    while stack:
+        current, d = stack.pop()
+        if current.is_leaf():
+            distance[ current.name ] = d
+        for child in current.children:
+            stack.append( ( child, d + ( child.length or 0.0 ) ) )
+    order = dict( ( name, i ) for i, name in enumerate( names ) )
+    chosen = sorted( names, key=lambda name: ( distance[ name ], order[ name ] ) )
+    chosen = set( chosen[ : cap ] )
+    return [ name for name in names if name in chosen ]
+
+# Function that selects the informative species pairs for the ancestor of a
+# tree: every pair of species from two different child clades of the ancestor,
+# then every pair of an ingroup species with an outgroup species. The outgroup
+# clades are the siblings of the ancestor and of each node above it.
+# Arguments:
+#   root: TreeNode - the species tree
+#   species: set of str - species that can be used, None for all of them
+#   per_clade: int - maximum number of species taken from each clade (child
+#              clade of the ancestor or outgroup clade), 0 for no limit
+# Output:
+#   list of [str, str] - the species pairs
+def informative_pairs( root, species=None, per_clade=0 ):
+    ancestor = find_ancestor( root )
+
+    ingroup = []
+    for child in ancestor.children:
+        names = clade_representatives( child, per_clade, species )
+        if names:
+            ingroup.append( names )
+    outgroup = []
+    node = ancestor
+    while node.parent != None:
+        for sibling in node.parent.children:
+            if sibling is not node:
+                names = clade_representatives( sibling, per_clade, species )
+                if names:
+                    outgroup.append( names )
+        node = node.parent
+
+    pairs = []
+    for a in xrange( len( ingroup ) ):
+        for b in xrange( a + 1, len( ingroup ) ):
+            for species1 in ingroup[ a ]:
+                for species2 in ingroup[ b ]:
+                    pairs.append( [ species1, species2 ] )
+    for names in outgroup:
+        for species1 in names:
+            for clade_names in ingroup:
+                for species2 in clade_names:
+                    pairs.append( [ species1, species2 ] )
+    return pairs
+
+# Shortest branch length used when weighting by branch lengths, for branches
+# of length 0.
+MIN_BRANCH_LENGTH = 1e-6
+
+# Function that computes the weights of the species in the linear
+# interpolation of a feature (e.g. an adjacency) at the ancestor of a tree.
+# The tree is seen as rooted at the ancestor: the value of a node is the
+# average of the values of its other neighbours, weighted by the inverse of
+# the branch lengths, and the value of a leaf is 1 if its species has the
+# feature, 0 otherwise. Branches without species are left out, and a node
+# with a single branch left is merged into it (their lengths add up).
+# The interpolation is linear in the values of the leaves, so the value at
+# the ancestor of any feature is the sum of the coefficients of the species
+# that have it.
+# Arguments:
+#   root: TreeNode - the species tree, the ancestor marked with '@'
+#   species: set of str - species that can have features, None for all of
+#            them
+# Output:
+#   dict of float - coefficient keyed by species, they add up to 1 (the
+#   dict is empty if the tree has none of the species)
+def interpolation_coefficients( root, species=None ):
+    ancestor = find_ancestor( root )
+    branches = branch_coefficients( ancestor, None, species )
+    return combine_branches( branches ) if branches else {}
+
+# Function that lists the branches of a node, when coming from a neighbour,
+# with the coefficients of the species in the value at their other end.
+# Arguments:
+#   node: TreeNode
+#   previous: TreeNode - the neighbour we come from, None for all branches
+#   species: set of str - see interpolation_coefficients
+# Output:
+#   list of (dict of float, float) - coefficients keyed by species and
+#   length of the branch, for the branches with species
+def branch_coefficients( node, previous, species ):
+    neighbours = [ ( child, child.length ) for child in node.children ]
+    if node.parent != None:
+        neighbours.append( ( node.parent, node.length ) )
+    branches = []
+    for neighbour, length in neighbours:
+        if neighbour is previous:
+            continue
+        if length == None:
+            length = 1.0
+        if neighbour.is_leaf():
+            if neighbour.name != None and ( species == None or neighbour.name in species ):
+                branches.append( ( { neighbour.name: 1.0 }, length ) )
+            continue
+        below = branch_coefficients( neighbour, node, species )
+        if len( below ) == 1:
+            coefficients, extra = below[0]
+            branches.append( ( coefficients, length + extra ) )
+        elif below:
+            branches.append( ( combine_branches( below ), length ) )
+    return branches
+
+# Function that averages the coefficients of branches, weighted by the
+# inverse of their lengths.
+# Arguments:
+#   branches: list of (dict of float, float) - see branch_coefficients
+# Output:
+#   dict of float - coefficients keyed by species
+def combine_branches( branches ):
+    weights = [ 1.0 / max( length, MIN_BRANCH_LENGTH ) for _, length in branches ]
+    total = sum( weights )
+    answer = {}
+    for ( coefficients, _ ), weight in zip( branches, weights ):
+        for name, coefficient in coefficients.iteritems():
+            answer[ name ] = answer.get( name, 0.0 ) + coefficient * weight / total
+    return answer
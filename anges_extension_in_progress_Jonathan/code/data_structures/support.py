@@ -0,0 +1,171 @@
+import comparisons
+import weights
+
+# Support of adjacencies and repeat spanning intervals by the species.
+#
+# Each genome is scanned once (see Species_support.add_genome): every pair
+# of neighbouring markers and every pair of unique markers spanning repeats
+# is recorded under a key of its marker IDs (see Species_support.key), with a
+# bitmask of the species that contain it, bit i standing for the i-th
+# species. The masks give the species pairs supporting each interval for the
+# support report (write_support) and the species weights of the intervals
+# for tree weighting (set_tree_weights), without comparing genomes again: a
+# species pair supports a key if both its species bits are set in the key's
+# mask, which is when the pairwise comparison of the two genomes finds the
+# interval (see support_check.py). The masks do not replace the pairwise
+# comparisons: the intervals, their loci and their weights without a species
+# tree still come from them.
+
+
+class Species_support:
+
+    # Constructor
+    # species: list of str - the species, in bit order
+    # all_match: boolean - whether intervals match regardless of the order
+    #            of their markers (see comparisons.compare_marker_intervals)
+    def __init__( self, species, all_match=False ):
+        self.species = list( species )
+        self.bits = dict( ( name, 1 << i ) for i, name in enumerate( self.species ) )
+        self.all_match = all_match
+        # Species mask keyed by interval key.
+        self.masks = {}
+
+    def __repr__(self):
+        return "Species_support {} species, {} intervals".format(
+            len( self.species ), len( self.masks ) )
+
+    def __len__( self ):
+        return len( self.masks )
+
+    # Function to get the key of an interval, the same for every interval
+    # that matches it: the smaller of its marker IDs in either order, or its
+    # end markers and its sorted marker IDs with all_match.
+    # Arguments:
+    #    marker_ids: list of int - doubled marker IDs
+    # Output:
+    #    tuple
+    def key( self, marker_ids ):
+        if self.all_match:
+            return ( comparisons.adjacency_key( marker_ids[0], marker_ids[-1] ),
+                     tuple( sorted( marker_ids ) ) )
+        return min( tuple( marker_ids ), tuple( reversed( marker_ids ) ) )
+
+    # Function to record the adjacencies and the pairs spanning repeats of a
+    # genome. Each species is added once.
+    # Arguments:
+    #    genome: Genome - the genome of one of the species
+    #    cache: Genome_cache - where to find or keep the genome's adjacency
+    #           keys, None to build them for this genome only
+    def add_genome( self, genome, cache=None ):
+        if cache == None:
+            cache = comparisons.Genome_cache( 0 )
+        keys = cache.get( genome )
+        bit = self.bits[ genome.species ]
+        masks = self.masks
+        for record in xrange( len( keys ) ):
+            key = self.key( keys.full_ids( genome,
+                                           keys.chromosome_numbers[ record ],
+                                           keys.firsts[ record ],
+                                           keys.lasts[ record ] ) )
+            masks[ key ] = masks.get( key, 0 ) | bit
+
+    # Function to get the mask of the given species.
+    # Arguments:
+    #    species: iterable of str
+    def species_mask( self, species ):
+        mask = 0
+        for name in species:
+            mask |= self.bits[ name ]
+        return mask
+
+    # Function to get the species of a mask, in bit order.
+    def species_of( self, mask ):
+        return [ name for name in self.species if mask & self.bits[ name ] ]
+
+    # Function to get the mask of the species containing an interval, 0 if
+    # none does.
+    def mask( self, marker_ids ):
+        return self.masks.get( self.key( marker_ids ), 0 )
+
+    # Function to get the masks of species pairs.
+    # Arguments:
+    #    species_pairs: list of pairs of species
+    # Output:
+    #    list of int
+    def pair_masks( self, species_pairs ):
+        return [ self.species_mask( pair ) for pair in species_pairs ]
+
+    # Function to count the species pairs supporting a species mask.
+    # Arguments:
+    #    mask: int - mask of the species containing an interval
+    #    pair_masks: list of int - see pair_masks
+    def pairs_supporting( self, mask, pair_masks ):
+        count = 0
+        for pair_mask in pair_masks:
+            if mask & pair_mask == pair_mask:
+                count += 1
+        return count
+
+    # Function to get the weight of a species mask: the sum of the
+    # coefficients of its species, e.g. their interpolation coefficients in a
+    # species tree (see species_tree.interpolation_coefficients).
+    # Arguments:
+    #    mask: int
+    #    coefficients: dict of float - keyed by species, 0 for the species
+    #                  not in it
+    def mask_weight( self, mask, coefficients ):
+        return sum( coefficients.get( name, 0.0 ) for name in self.species_of( mask ) )
+
+
+# Function to record the intervals of all the genomes of a run.
+# Arguments:
+#    gens: dict of Genome objects keyed by species
+#    all_match: boolean
+#    cache: Genome_cache - where to find or keep the genomes' adjacency keys,
+#           they are the ones comparisons.find_intervals_all uses
+# Output:
+#    Species_support, with the species in sorted order
+def genomes_support( gens, all_match, cache=None ):
+    support = Species_support( sorted( gens ), all_match )
+    for species in support.species:
+        support.add_genome( gens[ species ], cache )
+    return support
+
+# Function to write the support of intervals to a file, one line per
+# interval: its id, the number of species pairs supporting it and the
+# species containing it, separated by tabs.
+# Arguments:
+#    file_name: str - the file to write to
+#    ints: IntervalDict
+#    support: Species_support - the species of the run
+#    species_pairs: list of pairs of species
+def write_support( file_name, ints, support, species_pairs ):
+    pair_masks = support.pair_masks( species_pairs )
+    file_stream = open( file_name, 'w' )
+    try:
+        for interval in ints.itervalues():
+            mask = support.mask( interval.marker_ids )
+            count = support.pairs_supporting( mask, pair_masks )
+            file_stream.write( "{}\t{}\t{}\n".format(
+                interval.id, count, ','.join( support.species_of( mask ) ) ) )
+    finally:
+        file_stream.close()
+
+# Function to set the weights of intervals from the species containing them,
+# see Species_support.mask_weight. Each distinct mask is weighted once, the
+# intervals contained in the same species share their weight. The float
+# weights are converted with weights.parse, to Decimal in exact mode, so
+# that they can be added to the other weights of the run.
+# Arguments:
+#    ints: IntervalDict - intervals whose weights to set
+#    support: Species_support - the species of the run
+#    coefficients: dict of float - weight of each species
+def set_tree_weights( ints, support, coefficients ):
+    mask_weights = {}
+    for interval in ints.itervalues():
+        mask = support.mask( interval.marker_ids )
+        weight = mask_weights.get( mask )
+        if weight == None:
+            weight = mask_weights[ mask ] = weights.parse(
+                repr( support.mask_weight( mask, coefficients ) ) )
+        interval.weight = weight
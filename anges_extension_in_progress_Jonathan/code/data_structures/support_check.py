@@ -0,0 +1,120 @@
+import itertools
+import random
+import sys
+
+import genomes
+import markers
+import comparisons
+import support
+
+# Check of the species support of intervals against the pairwise comparisons.
+#
+# Random genomes of doubled markers are built from reversals of a common
+# order, with some markers missing and some families repeated (with the same
+# copy number in every genome, as in a run). Every pair of species is
+# compared with comparisons.find_intervals_all and the pairs finding each
+# interval are counted. The count must be the number of species pairs the
+# interval's mask supports (see support.Species_support.pairs_supporting),
+# for every interval found and every key recorded in the masks.
+#
+# Only exact matches are checked: with all_match, comparisons.add_match
+# fails on spans whose markers match in a different order, as the original
+# find_intervals did.
+#
+# Usage: python data_structures/support_check.py [cases [seed]]
+
+
+# Function to build a random genome.
+# Arguments:
+#    species: str
+#    genes: int - number of genes of the common order
+#    copy_numbers: list of int - copy number of each gene
+# Output:
+#    Genome - with the doubled markers of the genes, on 1 to 3 chromosomes
+def random_genome( species, genes, copy_numbers ):
+    order = range( genes )
+    orientations = [ 1 ] * genes
+    for _ in xrange( random.randint( 0, 3 ) ):
+        a, b = sorted( random.sample( xrange( genes + 1 ), 2 ) )
+        order[ a : b ] = reversed( order[ a : b ] )
+        orientations[ a : b ] = [ -o for o in reversed( orientations[ a : b ] ) ]
+    kept = [ ( gene, o ) for gene, o in zip( order, orientations )
+             if random.random() > 0.1 ]
+    # Extra copies of the repeated genes.
+    for gene in xrange( genes ):
+        if copy_numbers[ gene ] > 1 and random.random() < 0.5:
+            kept.insert( random.randint( 0, len( kept ) ),
+                         ( gene, random.choice( [ 1, -1 ] ) ) )
+    ids = []
+    for gene, orientation in kept:
+        pair = [ 2 * gene, 2 * gene + 1 ]
+        if orientation < 0:
+            pair.reverse()
+        ids.extend( pair )
+
+    genome = genomes.Genome( species )
+    cuts = sorted( random.sample( xrange( 1, max( len( ids ), 2 ) ),
+                                  min( max( len( ids ) - 1, 0 ), random.randint( 0, 2 ) ) ) )
+    for number, ( a, b ) in enumerate( zip( [ 0 ] + cuts, cuts + [ len( ids ) ] ) ):
+        key = "c%d" % number
+        loci = [ markers.Locus( species, key, 10 * k, 10 * k + 5, 1, '' )
+                 for k in xrange( b - a ) ]
+        genome.chromosomes[ key ] = genomes.Chromosome.from_markers(
+            ids[ a : b ], loci, [ copy_numbers[ marker_id >> 1 ] for marker_id in ids[ a : b ] ],
+            True )
+    return genome
+
+# Function to count the species pairs finding each interval by comparing
+# them.
+# Arguments:
+#    gens: dict of Genome objects keyed by species
+#    species_pairs: list of pairs of species
+#    found: Species_support - gives the keys of the intervals
+# Output:
+#    dict of int - number of pairs keyed by interval key
+def brute_force( gens, species_pairs, found ):
+    counts = {}
+    for species1, species2 in species_pairs:
+        keys = set()
+        for ints in comparisons.find_intervals_all( gens[ species1 ], gens[ species2 ], False ):
+            for interval in ints.itervalues():
+                keys.add( found.key( interval.marker_ids ) )
+        for key in keys:
+            counts[ key ] = counts.get( key, 0 ) + 1
+    return counts
+
+# Function to check the support of the intervals of random genomes.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    for case in xrange( cases ):
+        genes = random.randint( 1, 10 )
+        copy_numbers = [ random.choice( [ 1, 1, 1, 2, 3 ] ) for _ in xrange( genes ) ]
+        markers.set_family_names( [ str( gene ) for gene in xrange( genes ) ] )
+        gens = {}
+        for k in xrange( random.randint( 2, 5 ) ):
+            gens[ "S%d" % k ] = random_genome( "S%d" % k, genes, copy_numbers )
+        species_pairs = list( itertools.combinations( sorted( gens ), 2 ) )
+
+        found = support.genomes_support( gens, False )
+        pair_masks = found.pair_masks( species_pairs )
+        expected = brute_force( gens, species_pairs, found )
+        for key in set( expected ) | set( found.masks ):
+            count = found.pairs_supporting( found.masks.get( key, 0 ), pair_masks )
+            if count != expected.get( key, 0 ):
+                print "case %d, %s: %d pairs instead of %d" % (
+                    case, key, count, expected.get( key, 0 ) )
+                failed += 1
+                break
+    return failed
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 1000
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )
@@ -0,0 +1,76 @@
+import array
+from decimal import Decimal, getcontext
+
+# Weights of intervals and of the rows of C1P matrices.
+#
+# Weights are floats by default, so that adding and comparing them is native
+# arithmetic: the branch and bound of c1p_files/bab.py does both on every node
+# of its search tree. In exact mode (set_exact, the exact_weights option) they
+# are decimal.Decimal with PRECISION significant digits instead.
+#
+# Float weights read from files are exact up to their 17th significant digit
+# and a sum of n of them is off by at most about n * 2**-53 relative to the
+# exact sum. Comparisons of sums (see greater) treat weights closer than
+# TOLERANCE, relative to the larger one, as equal, so the branch and bound
+# keeps the same rows as in exact mode unless two solutions score within the
+# tolerance of each other.
+
+PRECISION = 20
+TOLERANCE = 1e-9
+
+exact = False
+
+
+# Function to choose the type of the weights. It must be called before any
+# weight is read.
+# Arguments:
+#    value: boolean - True for decimal.Decimal weights, False for floats
+def set_exact( value ):
+    global exact
+    exact = value
+    if exact:
+        getcontext().prec = PRECISION
+
+# Function to read a weight.
+# Arguments:
+#    string: str - e.g. "12", "0.25"
+# Output:
+#    float, or Decimal in exact mode. Raises ValueError (or
+#    decimal.InvalidOperation in exact mode) if string is not a number.
+def parse( string ):
+    if exact:
+        return Decimal( string )
+    return float( string )
+
+# Function to get a zero weight.
+def zero():
+    return parse( '0' )
+
+# Function to get the string of a weight, for files: whole float weights are
+# written without decimals, and other floats with as many digits as needed to
+# read them back unchanged.
+# Arguments:
+#    weight: float, Decimal or int
+# Output:
+#    str
+def to_string( weight ):
+    if isinstance( weight, float ):
+        if weight.is_integer():
+            return "%d" % weight
+        return repr( weight )
+    return str( weight )
+
+# Function to compare sums of weights, see TOLERANCE.
+# Output:
+#    True if a is greater than b, by more than the tolerance for floats
+def greater( a, b ):
+    if exact:
+        return a > b
+    return a - b > TOLERANCE * max( 1.0, abs( a ), abs( b ) )
+
+# Function to get an empty column of weights: an array of doubles, or a list
+# in exact mode.
+def column():
+    if exact:
+        return []
+    return array.array( 'd' )
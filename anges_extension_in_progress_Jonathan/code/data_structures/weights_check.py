@@ -0,0 +1,117 @@
+import random
+import sys
+from decimal import Decimal
+
+import intervals
+import species_tree
+import support
+import weights
+
+# Check of the tree weights of intervals in exact mode (the exact_weights
+# option).
+#
+# Random species trees are built, with the ancestor marked on a random
+# clade, and random intervals are given random species masks. The weights
+# set by support.set_tree_weights in exact mode must be Decimal, equal to the
+# float weights of the default mode read back with weights.parse, and add up
+# with the other exact weights of a run (weights.zero and the columns of an
+# IntervalStore).
+#
+# Usage: python data_structures/weights_check.py [cases [seed]]
+
+MARKERS = 20
+
+
+# Function to build a random species tree in Newick format.
+# Arguments:
+#    species: list of str - the leaves, at least 2
+# Output:
+#    str - the tree, one of its clades (not the root) marked with '@'
+def random_newick( species ):
+    clades = list( species )
+    while len( clades ) > 1:
+        a, b = random.sample( xrange( len( clades ) ), 2 )
+        clade = "(%s:%s,%s:%s)" % ( clades[ a ], repr( random.uniform( 0.0, 0.2 ) ),
+                                    clades[ b ], repr( random.uniform( 0.0, 0.2 ) ) )
+        clades = [ c for k, c in enumerate( clades ) if k != a and k != b ] + [ clade ]
+    tree = clades[0]
+    # Mark a clade other than the root: the one closing at a random ')'.
+    closing = [ k for k, c in enumerate( tree ) if c == ')' ][:-1]
+    if not closing:
+        return "(%s@:0.1,X:0.1);" % tree
+    k = random.choice( closing )
+    return tree[ : k + 1 ] + "@" + tree[ k + 1 : ] + ";"
+
+# Function to build random intervals.
+# Output:
+#    IntervalDict
+def random_intervals():
+    ints = intervals.IntervalDict()
+    for number in xrange( random.randint( 1, 30 ) ):
+        marker_ids = random.sample( xrange( MARKERS ), random.randint( 2, 5 ) )
+        if not marker_ids in ints:
+            ints.add( intervals.Interval(
+                id=str( number ),
+                marker_ids=marker_ids,
+                loci=[],
+                order=intervals.Order( 1 ),
+                weight=1,
+                comment='',
+                ) )
+    return ints
+
+# Function to get the tree weights of intervals.
+# Arguments:
+#    exact: boolean - the mode of the weights
+# Output:
+#    list of weights, in interval order
+def tree_weights( ints, found, coefficients, exact ):
+    weights.set_exact( exact )
+    try:
+        support.set_tree_weights( ints, found, coefficients )
+    finally:
+        weights.set_exact( False )
+    return [ interval.weight for interval in ints.itervalues() ]
+
+# Function to check the exact tree weights of random intervals.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    for case in xrange( cases ):
+        species = [ "S%d" % k for k in xrange( random.randint( 2, 6 ) ) ]
+        coefficients = species_tree.interpolation_coefficients(
+            species_tree.parse_newick( random_newick( species ) ), set( species ) )
+        found = support.Species_support( species )
+        ints = random_intervals()
+        for interval in ints.itervalues():
+            found.masks[ found.key( interval.marker_ids ) ] = random.randrange( 1 << len( species ) )
+
+        expected = tree_weights( ints, found, coefficients, False )
+        exact = tree_weights( ints, found, coefficients, True )
+        try:
+            weights.set_exact( True )
+            ok = ( all( isinstance( weight, Decimal ) for weight in exact ) and
+                   exact == [ weights.parse( repr( weight ) ) for weight in expected ] )
+            total = sum( exact, weights.zero() )
+            store = intervals.IntervalStore( ints )
+            ok = ok and store.select_all().total_weight == total == ints.total_weight
+        except TypeError, error:
+            ok = False
+            print "case %d: %s" % ( case, error )
+        finally:
+            weights.set_exact( False )
+        if not ok:
+            print "case %d: exact weights %s, float weights %s" % ( case, exact, expected )
+            failed += 1
+    return failed
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 300
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )
@@ -19,6 +19,8 @@ def main():
     """
     master_script_obj = process.MasterScript()
     master_script_obj.setConfigParams(sys.argv[1], len(sys.argv))
+    # Skip the phases already done by a previous run with the same inputs.
+    master_script_obj.resumeFromCheckpoint()
 
 
     # ------------------------ PARSE_MARKERS PHASE -------------------------------
@@ -1,4 +1,9 @@
+import itertools
+from collections import defaultdict
+
 from data_structures import intervals
+from data_structures import markers
+from data_structures import weights
 
 import decisions
 import networkx
@@ -9,45 +14,182 @@ import networkx
 # Arguments:
 #   hom_fams: list of HomFam objects - the doubled markers to consider.
 #   adjacencies: IntervalDict - the adjacencies to optimize
+#   verify: boolean - check the result against the reduction of the b-matching
+#           to a plain matching (see verify_b_matching), slow
 # Output:
 #   max_adjacencies: IntervalDict - the maximal subset of adjacencies that are
 #                                   realizable.
-def opt_adjacencies( hom_fams, adjacencies ):
-
-
-    #import pdb; pdb.set_trace()
-
+#   rc_total_list, rc_total_list_int: the repeat clusters, as strings and lists
+#                                     of family names (ints), largest first
+def opt_adjacencies( hom_fams, adjacencies, verify=False ):
     # We need to find a 2m-matching of the markers, but since we assume that we
     # are working with doubled markers, in this case we need an m-matching.
     # Create a dictionary that maps markers to their multiplicity:
     multiplicity = {}
-    # multiplicity_high = []
     for hom_fam in hom_fams:
         multiplicity[ hom_fam.id ] = hom_fam.copy_number
-        # if hom_fam.copy_number > 1:
-            # multiplicity_high.append(hom_fam.id)
-    # print multiplicity_high
 
+    adjacency_list = list( adjacencies.itervalues() )
+    selected = b_matching( multiplicity, adjacency_list )
+    if verify:
+        verify_b_matching( multiplicity, adjacency_list, selected )
+
+    # Translate the b-matching back to adjacencies, and link the repeats that
+    # the chosen adjacencies join.
+    G_8 = networkx.Graph()
+    max_adjacencies = intervals.IntervalDict()
+    for index in selected:
+        adjacency = adjacency_list[ index ]
+        m1, m2 = adjacency.marker_ids[0], adjacency.marker_ids[-1]
+        max_adjacencies.add( adjacency )
+        if multiplicity[m1] > 1:
+            if multiplicity[m2] > 1:
+                G_8.add_edge(m1,m2, weight=adjacency.weight, adj= adjacency)
+            else:
+                G_8.add_edge(m1,m1, weight=1, adj= adjacency)
+        elif multiplicity[m2] > 1:
+            G_8.add_edge(m2,m2,weight=1, adj= adjacency)
+
+    # Repeat clusters, largest first, then in the order of their first marker; their markers in order.
+    high_cp_graph = [sorted(c) for c in networkx.connected_components(G_8)]
+    high_cp_graph.sort(key=lambda c: (-len(c), c[0]))
+    # print high_cp_graph
+    
+    rc_total_list = []
+    rc_total_list_int = []
+    dont_print = []
+    for rc in high_cp_graph:
+        rc_elements = ""
+        rc_elements_int = []
+        for rc_elem in rc:
+            rc_name = markers.from_doubled(rc_elem)
+            if int(rc_name) not in dont_print:
+                dont_print.append(int(rc_name))
+                rc_elements = rc_elements + rc_name + " "
+                rc_elements_int.append(int(rc_name))
+        if rc_elements:
+            rc_total_list.append(rc_elements[:-1])
+            rc_total_list_int.append(rc_elements_int)
+
+    return max_adjacencies, rc_total_list, rc_total_list_int
+
+
+# Function to find a maximum weight b-matching of the markers: a subset of the
+# adjacencies in which each marker m is an endpoint at most multiplicity[m]
+# times (twice for an adjacency between two copies of the same extremity).
+# Each connected component of the marker graph is solved exactly as a maximum
+# weight matching of a graph built from it:
+#  - a marker of multiplicity 1 is a single vertex;
+#  - a marker of degree d and multiplicity b < d has one port vertex per
+#    adjacency, and d - b blocker vertices joined to all its ports;
+#  - a marker with b >= d is not constrained, each adjacency gets its own
+#    vertex.
+# The edges to the blockers weigh more than all the adjacencies together, so a
+# maximum matching matches every blocker, leaving at most b ports of the
+# marker to adjacencies.
+# Arguments:
+#   multiplicity: dict of int - copy number keyed by doubled marker ID
+#   adjacency_list: list of Interval - the adjacencies
+# Output:
+#   list of int - the indices in adjacency_list of the chosen adjacencies, in
+#                 increasing order
+def b_matching( multiplicity, adjacency_list ):
+    degree = defaultdict( int )
+    G_0 = networkx.Graph()
+    for index, adjacency in enumerate( adjacency_list ):
+        id1, id2 = adjacency.marker_ids[0], adjacency.marker_ids[-1]
+        degree[ id1 ] += 1
+        degree[ id2 ] += 1
+        G_0.add_edge( id1, id2 )
+        G_0[ id1 ][ id2 ].setdefault( 'indices', [] ).append( index )
+
+    selected = []
+    for component in networkx.connected_components( G_0 ):
+        indices = []
+        for id1, id2, attr in G_0.subgraph( component ).edges( data = True ):
+            indices.extend( attr[ 'indices' ] )
+        indices.sort()
+        bonus = 1 + sum( abs( adjacency_list[ i ].weight ) for i in indices )
+
+        G = networkx.Graph()
+        vertices = itertools.count()
+        single = {}
+        blockers = {}
+        ends = []
+        for index in indices:
+            adjacency = adjacency_list[ index ]
+            pair = []
+            for m in ( adjacency.marker_ids[0], adjacency.marker_ids[-1] ):
+                if multiplicity[ m ] == 1:
+                    if m not in single:
+                        single[ m ] = next( vertices )
+                    pair.append( single[ m ] )
+                    continue
+                port = next( vertices )
+                if multiplicity[ m ] < degree[ m ]:
+                    if m not in blockers:
+                        blockers[ m ] = [ next( vertices )
+                                          for i in xrange( degree[ m ] - multiplicity[ m ] ) ]
+                    for blocker in blockers[ m ]:
+                        G.add_edge( port, blocker, weight = bonus )
+                pair.append( port )
+            # Two copies of an extremity of a unique marker never join.
+            if pair[0] != pair[1]:
+                G.add_edge( pair[0], pair[1], weight = adjacency.weight )
+                ends.append( ( index, pair[0], pair[1] ) )
+
+        mate = networkx.max_weight_matching( G )
+        selected.extend( index for index, u, v in ends if mate.get( u ) == v )
+
+    selected.sort()
+    return selected
+
+# Function to check a b-matching found by b_matching: that no marker is in
+# more adjacencies than its multiplicity, and that its weight is the weight
+# of the b-matching found with the reduction to a plain matching of Tutte's
+# gadget graph (gadget_b_matching), up to weights.TOLERANCE.
+# Arguments:
+#   multiplicity, adjacency_list: see b_matching
+#   selected: list of int - the b-matching to check
+# Raises ValueError if the check fails.
+def verify_b_matching( multiplicity, adjacency_list, selected ):
+    used = defaultdict( int )
+    for index in selected:
+        adjacency = adjacency_list[ index ]
+        used[ adjacency.marker_ids[0] ] += 1
+        used[ adjacency.marker_ids[-1] ] += 1
+    for m, count in used.iteritems():
+        if count > multiplicity[ m ]:
+            raise ValueError( "marker %s is in %d chosen adjacencies, its multiplicity is %d"
+                              % ( markers.extremity_name( m ), count, multiplicity[ m ] ) )
+
+    weight = sum( adjacency_list[ index ].weight for index in selected )
+    expected = sum( adjacency_list[ index ].weight
+                    for index in gadget_b_matching( multiplicity, adjacency_list ) )
+    if weights.greater( weight, expected ) or weights.greater( expected, weight ):
+        raise ValueError( "chosen adjacencies weigh %s, the gadget matching finds %s"
+                          % ( weights.to_string( weight ), weights.to_string( expected ) ) )
+
+# Function to find a maximum weight b-matching of the markers (see b_matching)
+# by a reduction to a plain maximum weight matching: each marker of
+# multiplicity b has b marker_vertices, each of its adjacencies has an
+# edge_vertex at both ends joined to all the marker_vertices of that end, and
+# the two edge_vertices of an adjacency are joined together. An adjacency
+# between two copies of the same extremity has two loop_vertices instead.
+# Arguments, output: see b_matching
+def gadget_b_matching( multiplicity, adjacency_list ):
     # First, create a networkx graph to encode the markers and adjacencies in
     # the arguments, to make further processing easier.
     G_0 = networkx.Graph()
-    G_0.add_nodes_from( [ hom_fam.id for hom_fam in hom_fams ] )
-    for adjacency in adjacencies.itervalues():
+    loops = []
+    for index, adjacency in enumerate( adjacency_list ):
         id1, id2 = adjacency.marker_ids[0], adjacency.marker_ids[-1]
-        G_0.add_edge( id1, id2, weight=adjacency.weight, adj=adjacency )
-        # if id1 in multiplicity_high:
-        #     if id2 in multiplicity_high:
-        #         G_9.add_edge(id1,id2, weight=adjacency.weight, adj=adjacency)
-        #     else:
-        #         G_9.add_edge(id1,id1, weight=-1, adj=adjacency)
-        # elif id2 in multiplicity_high:
-        #     G_9.add_edge(id2,id2, weight=-1,adj=adjacency)
-    # G_9.add_edge('179_t','16_t',weight=-1)
-    # edges_list = G_9.edges()
-    # print edges_list
+        if id1 == id2:
+            G_0.add_node( id1 )
+            loops.append( ( id1, adjacency.weight, index ) )
+        else:
+            G_0.add_edge( id1, id2, weight=adjacency.weight, index=index )
 
-    
-    
     # Make a new networkx graph, and create structure required for the matching
     # algorithm to work.
     G = networkx.Graph()
@@ -73,6 +215,13 @@ def opt_adjacencies( hom_fams, adjacencies ):
         G.add_edge( to_edge_vertex( m1, m2 ),
                     to_edge_vertex( m2, m1 ),
                     weight = attr[ 'weight' ] )
+    # A loop takes two marker_vertices of its marker.
+    for m, w, index in loops:
+        loop_vertices = to_loop_vertices( index )
+        for loop_vertex in loop_vertices:
+            for marker_vertex in to_marker_vertices( m, multiplicity[ m ] ):
+                G.add_edge( loop_vertex, marker_vertex, weight = w )
+        G.add_edge( loop_vertices[0], loop_vertices[1], weight = w )
 
     # Find optimal set of adjacencies.
     # The matching is a dictionary such that dict[v]==u iff the nodes v,u in G
@@ -81,8 +230,7 @@ def opt_adjacencies( hom_fams, adjacencies ):
 
     # Translate the matching solution back to the m-matching we want on the
     # given markers.
-    G_8 = networkx.Graph()
-    max_adjacencies = intervals.IntervalDict()
+    selected = set()
     for u, v in matching.iteritems():
         # If an edge in G_0 is part of the m-matching, it will be 'caught' four
         # times in this loop, namely, twice (once for each direction) for each
@@ -91,47 +239,21 @@ def opt_adjacencies( hom_fams, adjacencies ):
         # Two cases: u,v form a vertex/edge pair or u,v are both edge_vertices.
         # Only the first case indicates an edge that is part of the m-matching
         # of G_0.
-        if is_marker_vertex( u ) and not is_marker_vertex( v ):
+        if is_marker_vertex( u ) and is_edge_vertex( v ):
             m1, m2 = from_edge_vertex( v )
             # Check that the adjacency between m1 and m2 is in the matching at
             # the other marker as well.
             marker_vertices_2 = to_marker_vertices( m2, multiplicity[ m2 ] )
             edge_vertex_2 = to_edge_vertex( m2, m1 )
-            adj_at_other_marker = (
-                edge_vertex_2 in matching and
-                any( [ matching[ edge_vertex_2 ] == m
-                     for m in marker_vertices_2 ] )
-                )
-            if edge_vertex_2 in matching and adj_at_other_marker:
-                adjacency = G_0[ m1 ][ m2 ][ 'adj' ]
-                max_adjacencies.add( adjacency )
-                if multiplicity[m1] > 1:
-                    if multiplicity[m2] > 1:
-                        G_8.add_edge(m1,m2, weight=adjacency.weight, adj= adjacency)
-                    else:
-                        G_8.add_edge(m1,m1, weight=1, adj= adjacency)
-                elif multiplicity[m2] > 1:
-                    G_8.add_edge(m2,m2,weight=1, adj= adjacency)
-
-    high_cp_graph = [c for c in sorted(networkx.connected_components(G_8), key=len, reverse=True)]
-    # print high_cp_graph
-    
-    rc_total_list = []
-    rc_total_list_int = []
-    dont_print = []
-    for rc in high_cp_graph:
-        rc_elements = ""
-        rc_elements_int = []
-        for rc_elem in rc:
-            if int(rc_elem[:-2]) not in dont_print:
-                dont_print.append(int(rc_elem[:-2]))
-                rc_elements = rc_elements + (rc_elem[:-2]) + " "
-                rc_elements_int.append(int(rc_elem[:-2]))
-        if rc_elements:
-            rc_total_list.append(rc_elements[:-1])
-            rc_total_list_int.append(rc_elements_int)
-
-    return max_adjacencies, rc_total_list, rc_total_list_int
+            if ( edge_vertex_2 in matching and
+                    any( [ matching[ edge_vertex_2 ] == m
+                           for m in marker_vertices_2 ] ) ):
+                selected.add( G_0[ m1 ][ m2 ][ 'index' ] )
+    for m, w, index in loops:
+        if all( [ is_marker_vertex( matching.get( v, ( "" , ) ) )
+                  for v in to_loop_vertices( index ) ] ):
+            selected.add( index )
+    return sorted( selected )
 
 
 # Function to find maximal subset (w.r.t weight) of RSIs between given markers,
@@ -142,9 +264,10 @@ def opt_adjacencies( hom_fams, adjacencies ):
 #   adjacencies: IntervalDict - the adjacencies between markers.
 #   RSIs: IntervalDict - the RSIs to optimize over.
 # Output:
-#   realizable_RSIs: IntervalDict - the RSIs that are realizable.
+#   realizable_RSIs: IntervalSelection - the RSIs that are realizable, a
+#                    selection of the stored RSIs (see intervals.IntervalStore).
 def opt_RSIs_greedy( hom_fams, adjacencies, RSIs, genome_model, debug=None ):
-    realizable_RSIs = intervals.IntervalDict()
+    realizable_RSIs = intervals.IntervalStore( RSIs ).select()
     # Sort the given RSIs in reversed order by weight.
     sorted_RSIs = sorted( list( RSIs.itervalues() ),
                           key = lambda RSI: - RSI.weight )
@@ -155,7 +278,8 @@ def opt_RSIs_greedy( hom_fams, adjacencies, RSIs, genome_model, debug=None ):
         realizable_RSIs.add( RSI )
         # Check if the genome is still realizable.
         if debug:
-            debug.write( "opt_RSIs_greedy: added RSI %s.\n" %RSI.marker_ids )
+            debug.write( "opt_RSIs_greedy: added RSI %s.\n"
+                         % map( markers.extremity_name, RSI.marker_ids ) )
         if not decisions.decision_RSIs(
                 hom_fams,
                 adjacencies,
@@ -176,23 +300,27 @@ def opt_RSIs_greedy( hom_fams, adjacencies, RSIs, genome_model, debug=None ):
 
 # Functions to map a pair of vertices to an edge_vertex and back.
 # The edge_vertex will be at the first marker given/returned.
+# Vertices of the matching graph are tuples tagged with their kind.
 def to_edge_vertex( u, v ):
-    return "edgevertex_" + u + "_to_" + v
+    return ( "edgevertex", u, v )
 def from_edge_vertex( e_v ):
-    pair = e_v.split( "_to_" )
-    u = pair[0][11:]
-    v = pair[1]
-    return u, v
+    return e_v[1], e_v[2]
 
 # Functions to map a vertex to a marker_vertex and back.
 def to_marker_vertices( v, n ):
-    return [ "markervertex_" + v + "_" + str(i) for i in range( n ) ]
+    return [ ( "markervertex", v, i ) for i in range( n ) ]
 def from_marker_vertex( v ):
-    return v[13:-2]
+    return v[1]
+
+# Function to map an adjacency between two copies of the same extremity to
+# its two loop_vertices.
+def to_loop_vertices( index ):
+    return [ ( "loopvertex", index, i ) for i in range( 2 ) ]
 
 # Function to check if a vertex is a marker_vertex
 def is_marker_vertex( v ):
-    if v[:13] == "markervertex_":
-        return True
-    else:
-        return False
+    return v[0] == "markervertex"
+
+# Function to check if a vertex is an edge_vertex
+def is_edge_vertex( v ):
+    return v[0] == "edgevertex"
@@ -0,0 +1,100 @@
+import random
+import sys
+
+from data_structures import intervals
+from data_structures import weights
+
+import optimization
+
+# Check of the adjacency b-matching (optimization.b_matching) against brute
+# force.
+#
+# Random adjacencies are drawn between the doubled markers of a few
+# families of copy number 1 to 3, some of them between two copies of the
+# same extremity, with random weights. The b-matchings of b_matching and of
+# the gadget reduction (optimization.gadget_b_matching) must not put a marker
+# in more adjacencies than its copy number and must weigh as much as the
+# heaviest subset of the adjacencies that does not, found by trying them all.
+#
+# Usage: python optimization_check.py [cases [seed]]
+
+# Largest number of adjacencies of a case, all their subsets are tried.
+ADJACENCIES = 12
+
+
+# Function to build random adjacencies.
+# Arguments:
+#    families: int - number of marker families
+# Output:
+#    multiplicity: dict of int - copy number keyed by doubled marker ID
+#    adjacency_list: list of Interval - distinct pairs of markers
+def random_adjacencies( families ):
+    multiplicity = {}
+    for family in xrange( families ):
+        copy_number = random.choice( [ 1, 1, 2, 3 ] )
+        multiplicity[ 2 * family ] = copy_number
+        multiplicity[ 2 * family + 1 ] = copy_number
+    pairs = set()
+    for _ in xrange( random.randint( 1, ADJACENCIES ) ):
+        id1 = random.randrange( 2 * families )
+        id2 = id1 if random.random() < 0.1 else random.randrange( 2 * families )
+        pairs.add( ( min( id1, id2 ), max( id1, id2 ) ) )
+    adjacency_list = [ intervals.Interval(
+        id=str( number ),
+        marker_ids=list( pair ),
+        loci=[],
+        order=intervals.Order( 1 ),
+        weight=float( random.randint( 1, 6 ) ) if random.random() < 0.5 else random.random(),
+        comment='',
+        ) for number, pair in enumerate( sorted( pairs ) ) ]
+    return multiplicity, adjacency_list
+
+# Function to check that the chosen adjacencies do not use a marker more
+# times than its copy number.
+def feasible( multiplicity, adjacency_list, selected ):
+    used = {}
+    for index in selected:
+        for m in ( adjacency_list[ index ].marker_ids[0], adjacency_list[ index ].marker_ids[-1] ):
+            used[ m ] = used.get( m, 0 ) + 1
+            if used[ m ] > multiplicity[ m ]:
+                return False
+    return True
+
+# Function to find the weight of a maximum weight b-matching by trying every
+# subset of the adjacencies.
+def brute_force( multiplicity, adjacency_list ):
+    best = 0.0
+    for subset in xrange( 1 << len( adjacency_list ) ):
+        selected = [ index for index in xrange( len( adjacency_list ) ) if subset >> index & 1 ]
+        if feasible( multiplicity, adjacency_list, selected ):
+            best = max( best, sum( adjacency_list[ index ].weight for index in selected ) )
+    return best
+
+# Function to check the b-matchings of random adjacencies.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    for case in xrange( cases ):
+        multiplicity, adjacency_list = random_adjacencies( random.randint( 1, 5 ) )
+        expected = brute_force( multiplicity, adjacency_list )
+        for function in ( optimization.b_matching, optimization.gadget_b_matching ):
+            selected = function( multiplicity, adjacency_list )
+            weight = sum( adjacency_list[ index ].weight for index in selected )
+            if ( not feasible( multiplicity, adjacency_list, selected ) or
+                    weights.greater( weight, expected ) or weights.greater( expected, weight ) ):
+                print "case %d, %s: %s weighs %s instead of %s" % (
+                    case, function.__name__, selected, weight, expected )
+                failed += 1
+                break
+    return failed
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 500
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )
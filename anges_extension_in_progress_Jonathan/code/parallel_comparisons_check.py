@@ -0,0 +1,83 @@
+import itertools
+import random
+import sys
+
+from data_structures import markers
+from data_structures import comparisons
+from data_structures import process
+from data_structures import support_check
+
+# Check of the pooled comparison of species pairs
+# (MasterGenConstruction.compareSpeciesPairs with comparison_workers above 1)
+# against the serial one.
+#
+# Random genomes with repeated families are built as in
+# data_structures/support_check.py and all their species pairs are compared
+# twice, once serially and once with a pool of worker processes, after a
+# support count in some cases so that the genome cache is filled as in a run
+# with interval_support. Both runs must merge the same adjacencies and RSIs,
+# with the same ids, marker IDs, orders, weights and loci, in the same order.
+#
+# Usage: python parallel_comparisons_check.py [cases [seed]]
+
+WORKERS = 3
+
+
+# Function to list the intervals of an IntervalDict in a comparable form.
+# Output:
+#    list of tuples, in iteration order
+def interval_list( ints ):
+    return [ ( interval.id, interval.marker_ids, str( interval.order ), interval.weight,
+               [ comparisons.locus_key( locus ) for locus in interval.loci ] )
+             for interval in ints.itervalues() ]
+
+# Function to compare the species pairs of genomes.
+# Arguments:
+#    gens: dict of Genome objects keyed by species
+#    count_support: boolean - count the support of the intervals first
+#    workers: int - number of worker processes
+# Output:
+#    adjacencies, RSIs: lists of interval_list
+def compare( gens, species_pairs, all_match, count_support, workers ):
+    master = process.MasterGenConstruction()
+    master.gens = gens
+    if count_support:
+        master.countSupport( all_match )
+    master.compareSpeciesPairs( species_pairs, all_match, workers )
+    return interval_list( master.adj.adjacencies ), interval_list( master.RSI.RSIs )
+
+# Function to check the pooled comparisons of random genomes.
+# Arguments:
+#    cases: int - number of random cases
+# Output:
+#    int - number of cases that failed, they are printed
+def check( cases ):
+    failed = 0
+    for case in xrange( cases ):
+        genes = random.randint( 1, 12 )
+        copy_numbers = [ random.choice( [ 1, 1, 1, 2, 3 ] ) for _ in xrange( genes ) ]
+        markers.set_family_names( [ str( gene ) for gene in xrange( genes ) ] )
+        gens = {}
+        for k in xrange( random.randint( 2, 5 ) ):
+            gens[ "S%d" % k ] = support_check.random_genome( "S%d" % k, genes, copy_numbers )
+        species_pairs = list( itertools.combinations( sorted( gens ), 2 ) )
+        random.shuffle( species_pairs )
+        # Exact matches only, see data_structures/support_check.py.
+        count_support = random.random() < 0.5
+
+        expected = compare( gens, species_pairs, False, count_support, 1 )
+        found = compare( gens, species_pairs, False, count_support, WORKERS )
+        for kind, found_ints, expected_ints in zip( [ "adjacencies", "RSIs" ], found, expected ):
+            if found_ints != expected_ints:
+                print "case %d, %s: %s instead of %s" % ( case, kind, found_ints, expected_ints )
+                failed += 1
+                break
+    return failed
+
+
+if __name__ == "__main__":
+    cases = int( sys.argv[1] ) if len( sys.argv ) > 1 else 100
+    random.seed( int( sys.argv[2] ) if len( sys.argv ) > 2 else 1 )
+    failed = check( cases )
+    print "%d of %d cases failed" % ( failed, cases )
+    sys.exit( 1 if failed else 0 )